@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Benchmark find_bw_duplicates.py and delete_bw_duplicates.py on synthetic vaults.
+
+Generates fake `bw list items` exports with a controlled number of items,
+URIs per item, hot hosts (many logins on one SSO host), exact and
+near-duplicate rates, and notes/attachment/password-history payload size.
+For each size it times loading the export, grouping duplicates and writing
+potential_duplicates.json, recording wall time, CPU time and peak RSS.
+
+Deletions are timed against stubs, so no real vault is touched: a stub
+`bw` executable that sleeps for a configurable startup time (standing in
+for Node startup and vault decryption) for the subprocess path, and a
+local stub `bw serve` HTTP server for --serve, at several worker counts.
+
+Usage:
+    python3 benchmark-bw-duplicates.py [--sizes 1000,50000,500000] [--workdir DIR]
+                                       [--output FILE] [--seed N]
+    python3 benchmark-bw-duplicates.py --generate-only bw_items.json --sizes 10000
+"""
+
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+
+ITEM_TYPE_LOGIN = 1
+USERNAMES = ['admin', 'root', 'alice', 'alice@example.com', 'service', 'backup', 'media', 'ops']
+
+
+def load_tools():
+    """Import find_bw_duplicates and delete_bw_duplicates from next to this script."""
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    return importlib.import_module('find_bw_duplicates'), importlib.import_module('delete_bw_duplicates')
+
+
+def generate_vault(path: Path, items: int, uris_per_item: int = 2, hot_hosts: int = 3,
+                   hot_host_rate: float = 0.05, duplicate_rate: float = 0.05,
+                   near_duplicate_rate: float = 0.05, non_login_rate: float = 0.1,
+                   payload_bytes: int = 512, seed: int = 0) -> Dict:
+    """
+    Write a synthetic `bw list items` export of `items` items to path.
+
+    Items are written one at a time, so generating a 500k item vault does
+    not hold it in memory.
+
+    Args:
+        path: File to write
+        items: Number of items to generate
+        uris_per_item: Maximum URIs per login (each login gets 1 to this many)
+        hot_hosts: Number of shared hosts (e.g. an internal SSO) many logins point at
+        hot_host_rate: Share of logins with a URI on a hot host
+        duplicate_rate: Share of logins that copy an earlier login exactly (new id and revision date)
+        near_duplicate_rate: Share of logins that copy an earlier login's credentials
+                             with a URI variant (www., :443, subdomain, Android app)
+        non_login_rate: Share of secure notes and cards, which are never grouped
+        payload_bytes: Size of each item's notes, plus attachments and password
+                       history of about the same size
+        seed: Random seed, so a given configuration always writes the same export
+
+    Returns:
+        Counts of what was generated
+    """
+    rng = random.Random(seed)
+    counts = Counter()
+    domain_count = max(10, items // 4)
+    hot = [f'sso{i}.corp.example' for i in range(hot_hosts)]
+    logins = []
+
+    def new_id() -> str:
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    def revision() -> str:
+        return f'20{rng.randint(18, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T' \
+               f'{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00.000Z'
+
+    def payload() -> str:
+        return ''.join(rng.choices('abcdefghijklmnopqrstuvwxyz ', k=payload_bytes)) if payload_bytes else ''
+
+    def new_item(item_type: int, name: str) -> Dict:
+        item = {
+            'object': 'item', 'id': new_id(), 'organizationId': None, 'folderId': None,
+            'type': item_type, 'reprompt': 0, 'name': name, 'notes': payload() or None,
+            'favorite': False, 'collectionIds': [], 'revisionDate': revision(),
+            'creationDate': revision(), 'deletedDate': None, 'passwordHistory': None
+        }
+        if payload_bytes:
+            item['passwordHistory'] = [{'lastUsedDate': revision(), 'password': payload()[:32]}
+                                       for _ in range(max(1, payload_bytes // 256))]
+            item['attachments'] = [{'id': new_id(), 'fileName': 'export.txt', 'size': str(payload_bytes),
+                                    'sizeName': f'{payload_bytes} Bytes', 'url': 'https://vault.example/' + payload()}]
+        return item
+
+    def login(name: str, username: str, password: str, uris: List[str]) -> Dict:
+        item = new_item(ITEM_TYPE_LOGIN, name)
+        item['login'] = {'fido2Credentials': [], 'uris': [{'match': None, 'uri': uri} for uri in uris],
+                         'username': username, 'password': password, 'totp': None,
+                         'passwordRevisionDate': None}
+        return item
+
+    def uri_variant(uri: str) -> str:
+        host = uri.split('://', 1)[-1].split('/', 1)[0]
+        variant = rng.choice(['www', 'port', 'subdomain', 'android'])
+        if variant == 'www':
+            return f'https://www.{host}/'
+        if variant == 'port':
+            return f'{host}:443'
+        if variant == 'subdomain':
+            return f'https://login.{host}/sign-in'
+        return 'androidapp://' + '.'.join(reversed(host.split('.'))) + '.android'
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for i in range(items):
+            roll = rng.random()
+            if roll < non_login_rate:
+                item = new_item(rng.choice([2, 3]), f'Note {i}')
+                counts['non_logins'] += 1
+            elif logins and roll < non_login_rate + duplicate_rate:
+                name, username, password, uris = rng.choice(logins)
+                item = login(name, username, password, uris)
+                counts['exact_duplicates'] += 1
+            elif logins and roll < non_login_rate + duplicate_rate + near_duplicate_rate:
+                name, username, password, uris = rng.choice(logins)
+                item = login(f'{name} (copy)', username, password, [uri_variant(uris[0])] + uris[1:])
+                counts['near_duplicates'] += 1
+            else:
+                uris = [f'https://{rng.randrange(domain_count)}.example-{rng.randrange(domain_count)}.com/login'
+                        for _ in range(rng.randint(1, max(1, uris_per_item)))]
+                if rng.random() < hot_host_rate:
+                    uris[0] = f'https://{rng.choice(hot)}/auth?app={i}'
+                    counts['hot_host_logins'] += 1
+                entry = (f'Site {i}', rng.choice(USERNAMES), f'pw-{rng.getrandbits(48):012x}', uris)
+                if len(logins) < 100000:
+                    logins.append(entry)
+                else:
+                    logins[rng.randrange(len(logins))] = entry
+                item = login(*entry)
+                counts['unique_logins'] += 1
+            if i:
+                f.write(',')
+            json.dump(item, f, separators=(',', ':'))
+            counts['items'] += 1
+        f.write(']')
+
+    counts['bytes'] = path.stat().st_size
+    return dict(counts)
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter (Linux only); returns False if unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes() -> int:
+    """Return peak RSS since the last reset (or since process start)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is bytes on macOS and KiB on Linux
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def measure(phase: str, func, results: Dict):
+    """Run func once, recording wall/CPU time and peak RSS under results[phase]."""
+    per_phase_rss = reset_peak_rss()
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    value = func()
+    results[phase] = {
+        'wall_seconds': round(time.perf_counter() - wall_started, 4),
+        'cpu_seconds': round(time.process_time() - cpu_started, 4),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'peak_rss_is_per_phase': per_phase_rss
+    }
+    return value
+
+
+def write_stub_bw(bin_dir: Path, startup_seconds: float) -> Path:
+    """Write a stub `bw` that sleeps for startup_seconds and reports success."""
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    stub = bin_dir / 'bw'
+    stub.write_text(f"#!{sys.executable}\nimport time\ntime.sleep({startup_seconds!r})\n")
+    stub.chmod(0o755)
+    return stub
+
+
+@contextlib.contextmanager
+def stub_serve(latency_seconds: float):
+    """Run a stub `bw serve` (GET /status, DELETE /object/item/<id>) on a free local port."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; without TCP_NODELAY,
+        # delayed ACKs would add ~40ms to every keep-alive request
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, body: Dict):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self.reply({'success': True, 'data': {'object': 'template', 'template': {'status': 'unlocked'}}})
+
+        def do_DELETE(self):
+            time.sleep(latency_seconds)
+            self.reply({'success': True})
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def benchmark_deletions(deleter, workdir: Path, args) -> Dict:
+    """Time process_deletions through the stub `bw` binary and the stub `bw serve`."""
+    report = [{'reason': 'benchmark', 'items': [{'id': str(uuid.UUID(int=i)), 'name': f'Item {i}', 'action': 'delete'}
+                                                 for i in range(args.deletions)]}]
+    phases = {}
+
+    write_stub_bw(workdir / 'bin', args.stub_startup)
+    path = os.environ.get('PATH', '')
+    os.environ['PATH'] = f"{workdir / 'bin'}{os.pathsep}{path}"
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            measure('delete_subprocess', lambda: deleter.process_deletions(report), phases)
+    finally:
+        os.environ['PATH'] = path
+
+    with stub_serve(args.stub_latency) as url:
+        for workers in sorted({1, args.serve_workers}):
+            backend = deleter.ServeBackend(url)
+            with contextlib.redirect_stdout(io.StringIO()):
+                measure(f'delete_serve_{workers}_workers',
+                        lambda: deleter.process_deletions(report, backend.delete_item, workers=workers), phases)
+
+    for stats in phases.values():
+        stats['deletions_per_second'] = round(args.deletions / stats['wall_seconds'], 2) if stats['wall_seconds'] else None
+    return {'deletions': args.deletions, 'stub_startup_seconds': args.stub_startup,
+            'stub_latency_seconds': args.stub_latency, 'phases': phases}
+
+
+def benchmark_size(finder, workdir: Path, items: int, args) -> Dict:
+    """Generate one export and time loading, grouping and writing the report."""
+    export = workdir / f'bw_items-{items}.json'
+    report = workdir / f'potential_duplicates-{items}.json'
+
+    started = time.perf_counter()
+    generated = generate_vault(export, items, uris_per_item=args.uris_per_item, hot_hosts=args.hot_hosts,
+                               hot_host_rate=args.hot_host_rate, duplicate_rate=args.duplicate_rate,
+                               near_duplicate_rate=args.near_duplicate_rate, payload_bytes=args.payload_bytes,
+                               seed=args.seed)
+    generate_seconds = time.perf_counter() - started
+
+    phases = {}
+    logins = measure('load', lambda: finder.load_items(str(export)), phases)
+    dupes = measure('group', lambda: finder.find_duplicates(logins, match=args.match), phases)
+
+    def write_report():
+        with open(report, 'w') as f:
+            json.dump(dupes, f, indent=2)
+
+    measure('write_report', write_report, phases)
+
+    if not args.keep:
+        export.unlink()
+        report.unlink()
+
+    return {
+        'items': items,
+        'generated': generated,
+        'generate_seconds': round(generate_seconds, 3),
+        'logins': len(logins),
+        'groups': len(dupes),
+        'grouped_items': sum(len(group['items']) for group in dupes),
+        'phases': phases
+    }
+
+
+def print_table(results: List[Dict], deletions: Dict = None):
+    """Print a short human-readable summary to stderr."""
+    print(f"{'items':>8}  {'phase':<26} {'wall s':>9} {'cpu s':>9} {'peak RSS MB':>12}", file=sys.stderr)
+    rows = [(result['items'], result['phases']) for result in results]
+    if deletions:
+        rows.append((deletions['deletions'], deletions['phases']))
+    for count, phases in rows:
+        for phase, stats in phases.items():
+            print(f"{count:>8}  {phase:<26} {stats['wall_seconds']:>9.3f} {stats['cpu_seconds']:>9.3f} "
+                  f"{stats['peak_rss_bytes'] / (1024 * 1024):>12.1f}", file=sys.stderr)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Bitwarden duplicate tools on synthetic vault exports'
+    )
+    parser.add_argument(
+        '--sizes',
+        type=str,
+        default='1000,50000,500000',
+        help='Comma-separated vault sizes in items (default: 1000,50000,500000)'
+    )
+    parser.add_argument(
+        '--workdir',
+        type=str,
+        help='Directory to write exports in (default: a temporary directory; tmpfs recommended)'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        help='Write JSON results to this file instead of stdout'
+    )
+    parser.add_argument(
+        '--generate-only',
+        type=str,
+        metavar='FILE',
+        help='Only write an export of the first size to FILE and exit'
+    )
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--uris-per-item', type=int, default=2, help='Maximum URIs per login (default: 2)')
+    parser.add_argument('--hot-hosts', type=int, default=3, help='Shared hosts many logins point at (default: 3)')
+    parser.add_argument('--hot-host-rate', type=float, default=0.05,
+                        help='Share of logins on a hot host (default: 0.05)')
+    parser.add_argument('--duplicate-rate', type=float, default=0.05,
+                        help='Share of exact duplicate logins (default: 0.05)')
+    parser.add_argument('--near-duplicate-rate', type=float, default=0.05,
+                        help='Share of near-duplicate logins with a URI variant (default: 0.05)')
+    parser.add_argument('--payload-bytes', type=int, default=512,
+                        help='Notes, attachment and password history size per item (default: 512)')
+    parser.add_argument('--match', choices=['exact', 'host', 'domain'], default='host',
+                        help='URI matching level passed to find_duplicates (default: host)')
+    parser.add_argument('--deletions', type=int, default=50,
+                        help='Items to delete in the deletion benchmark, 0 to skip it (default: 50)')
+    parser.add_argument('--stub-startup', type=float, default=0.2,
+                        help='Seconds the stub `bw` sleeps per invocation (default: 0.2)')
+    parser.add_argument('--stub-latency', type=float, default=0.01,
+                        help='Seconds the stub `bw serve` takes per DELETE (default: 0.01)')
+    parser.add_argument('--serve-workers', type=int, default=4,
+                        help='Concurrent requests for the --serve deletion run (default: 4)')
+    parser.add_argument('--keep', action='store_true', help='Keep generated exports and reports after the run')
+
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    if args.generate_only:
+        generated = generate_vault(Path(args.generate_only), sizes[0], uris_per_item=args.uris_per_item,
+                                   hot_hosts=args.hot_hosts, hot_host_rate=args.hot_host_rate,
+                                   duplicate_rate=args.duplicate_rate,
+                                   near_duplicate_rate=args.near_duplicate_rate,
+                                   payload_bytes=args.payload_bytes, seed=args.seed)
+        print(json.dumps(generated, indent=2))
+        return
+
+    finder, deleter = load_tools()
+
+    with contextlib.ExitStack() as stack:
+        if args.workdir:
+            workdir = Path(args.workdir)
+            workdir.mkdir(parents=True, exist_ok=True)
+        else:
+            workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix='bw-duplicates-bench-')))
+
+        results = []
+        for items in sizes:
+            print(f"⏱️  Benchmarking {items} item(s) in {workdir}...", file=sys.stderr)
+            results.append(benchmark_size(finder, workdir, items, args))
+
+        deletions = None
+        if args.deletions:
+            print(f"⏱️  Benchmarking {args.deletions} deletion(s) against stub bw / bw serve...", file=sys.stderr)
+            deletions = benchmark_deletions(deleter, workdir, args)
+
+    output = {
+        'benchmark': 'bw-duplicates',
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'workdir': str(workdir),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'generate_only')},
+        'results': results,
+        'deletions': deletions
+    }
+
+    print_table(results, deletions)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"\n✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
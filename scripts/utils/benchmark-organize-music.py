@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Benchmark organize-music.py on synthetic music libraries.
+
+Generates an Artist/Album/Track tree with controlled rates of split albums,
+"A & B" folders, compilations, numbering gaps and unnumbered tracks, then
+times each stage of organize-music.py against it: scanning (with and without
+the library index), planning, JSON output and executing the moves. For every
+stage it records wall time, CPU time, filesystem calls and peak RSS, and
+writes the results as JSON so runs can be compared.
+
+Generate on local disk or tmpfs (e.g. --workdir /dev/shm) so the numbers
+measure the organizer rather than the disk.
+
+Usage:
+    python3 benchmark-organize-music.py [--sizes 1000,10000,100000] [--workdir DIR]
+                                        [--output FILE] [--seed N]
+    python3 benchmark-organize-music.py --generate-only DIR --sizes 10000
+"""
+
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+
+def load_organizer():
+    """Import the organize_music package that sits next to this script."""
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    return importlib.import_module('organize_music')
+
+
+def generate_library(root: Path, albums: int, albums_per_artist: int = 5,
+                     tracks_per_album: int = 10, split_rate: float = 0.05,
+                     multi_artist_rate: float = 0.03, compilation_rate: float = 0.02,
+                     gap_rate: float = 0.1, unnumbered_rate: float = 0.05,
+                     track_bytes: int = 0, seed: int = 0) -> Dict:
+    """
+    Build a synthetic library of roughly `albums` album folders under root.
+
+    Args:
+        root: Directory to create the library in (created if missing)
+        albums: Number of albums to generate
+        albums_per_artist: Albums per regular artist folder
+        tracks_per_album: Tracks per album before gaps are applied
+        split_rate: Share of albums split between "Artist" and "Artist & Guest"
+        multi_artist_rate: Share of albums under an "A & B" folder with no main artist
+        compilation_rate: Share of albums spread across several unrelated artists
+        gap_rate: Share of albums missing one track number
+        unnumbered_rate: Share of albums with an extra track without a number
+        track_bytes: Size of each (sparse) track file
+        seed: Random seed, so a given configuration always builds the same tree
+
+    Returns:
+        Counts of what was generated
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    counts = Counter()
+    artist_count = max(1, albums // albums_per_artist)
+
+    def write_track(artist: str, album: str, track: str):
+        album_dir = root / artist / album
+        album_dir.mkdir(parents=True, exist_ok=True)
+        with open(album_dir / track, 'wb') as f:
+            if track_bytes:
+                f.truncate(track_bytes)
+        counts['tracks'] += 1
+
+    for i in range(albums):
+        artist = f'Artist {i % artist_count:06d}'
+        album = f'Album {i:07d}'
+
+        numbers = list(range(1, tracks_per_album + 1))
+        if rng.random() < gap_rate and len(numbers) > 2:
+            numbers.remove(rng.choice(numbers[1:-1]))
+            counts['gaps'] += 1
+        tracks = [f'{n:02d} Track {n}.flac' for n in numbers]
+        if rng.random() < unnumbered_rate:
+            tracks.append('Hidden Track.flac')
+            counts['unnumbered'] += 1
+
+        roll = rng.random()
+        if roll < compilation_rate:
+            album = f'Compilation {i:07d}'
+            contributors = rng.sample(range(artist_count), min(artist_count, rng.randint(2, 4)))
+            for position, track in enumerate(tracks):
+                write_track(f'Artist {contributors[position % len(contributors)]:06d}', album, track)
+            counts['compilations'] += 1
+        elif roll < compilation_rate + split_rate:
+            guest = f'{artist} & Guest {i:07d}'
+            cut = rng.randint(1, len(tracks) - 1)
+            for track in tracks[:cut]:
+                write_track(artist, album, track)
+            for track in tracks[cut:]:
+                write_track(guest, album, track)
+            counts['split_albums'] += 1
+        elif roll < compilation_rate + split_rate + multi_artist_rate:
+            for track in tracks:
+                write_track(f'Duo {i:07d} & Partner', album, track)
+            counts['multi_artist_albums'] += 1
+        else:
+            for track in tracks:
+                write_track(artist, album, track)
+
+        counts['albums'] += 1
+
+    return dict(counts)
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter (Linux only); returns False if unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes() -> int:
+    """Return peak RSS since the last reset (or since process start)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is bytes on macOS and KiB on Linux
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def measure(phase: str, func, results: Dict):
+    """Run func once, recording wall/CPU time, filesystem calls and peak RSS under results[phase]."""
+    from organize_music.profiling import FsCallCounter
+
+    counter = FsCallCounter()
+    per_phase_rss = reset_peak_rss()
+
+    with counter.active():
+        cpu_started = time.process_time()
+        wall_started = time.perf_counter()
+        value = func()
+        wall = time.perf_counter() - wall_started
+        cpu = time.process_time() - cpu_started
+
+    results[phase] = {
+        'wall_seconds': round(wall, 4),
+        'cpu_seconds': round(cpu, 4),
+        'fs_calls': dict(counter.counts),
+        'fs_calls_total': sum(counter.counts.values()),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'peak_rss_is_per_phase': per_phase_rss
+    }
+    return value
+
+
+def benchmark_size(organizer, workdir: Path, albums: int, args) -> Dict:
+    """Generate one library and time every organizer stage against it."""
+    library = workdir / f'library-{albums}'
+    index_path = workdir / f'index-{albums}.sqlite3'
+    if library.exists():
+        shutil.rmtree(library)
+    if index_path.exists():
+        index_path.unlink()
+
+    started = time.perf_counter()
+    generated = generate_library(library, albums, tracks_per_album=args.tracks_per_album,
+                                 split_rate=args.split_rate, multi_artist_rate=args.multi_artist_rate,
+                                 compilation_rate=args.compilation_rate, gap_rate=args.gap_rate,
+                                 unnumbered_rate=args.unnumbered_rate, seed=args.seed)
+    generate_seconds = time.perf_counter() - started
+
+    phases = {}
+    structure = measure('scan', lambda: organizer.get_artists_and_albums(
+        library, workers=args.scan_workers), phases)
+    measure('scan_index_cold', lambda: organizer.get_artists_and_albums(
+        library, workers=args.scan_workers, index_path=index_path), phases)
+    measure('scan_index_warm', lambda: organizer.get_artists_and_albums(
+        library, workers=args.scan_workers, index_path=index_path), phases)
+    operations = measure('plan', lambda: organizer.plan_consolidations(library, structure), phases)
+    measure('operations_to_json', lambda: json.dumps(
+        organizer.operations_to_json(operations, library), indent=2), phases)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        measure('execute', lambda: organizer.execute_operations(
+            library, operations, dry_run=False, structure=structure), phases)
+
+    if not args.keep:
+        shutil.rmtree(library)
+        index_path.unlink()
+
+    return {
+        'albums': albums,
+        'generated': generated,
+        'generate_seconds': round(generate_seconds, 3),
+        'operations': len(operations),
+        'phases': phases
+    }
+
+
+def print_table(results: List[Dict]):
+    """Print a short human-readable summary to stderr."""
+    print(f"{'albums':>8}  {'phase':<20} {'wall s':>9} {'cpu s':>9} {'fs calls':>10} {'peak RSS MB':>12}",
+          file=sys.stderr)
+    for result in results:
+        for phase, stats in result['phases'].items():
+            print(f"{result['albums']:>8}  {phase:<20} {stats['wall_seconds']:>9.3f} {stats['cpu_seconds']:>9.3f} "
+                  f"{stats['fs_calls_total']:>10} {stats['peak_rss_bytes'] / (1024 * 1024):>12.1f}",
+                  file=sys.stderr)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark organize-music.py on synthetic music libraries'
+    )
+    parser.add_argument(
+        '--sizes',
+        type=str,
+        default='1000,10000,100000',
+        help='Comma-separated library sizes in albums (default: 1000,10000,100000)'
+    )
+    parser.add_argument(
+        '--workdir',
+        type=str,
+        help='Directory to generate libraries in (default: a temporary directory; tmpfs recommended)'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        help='Write JSON results to this file instead of stdout'
+    )
+    parser.add_argument(
+        '--generate-only',
+        type=str,
+        metavar='DIR',
+        help='Only generate a library of the first size into DIR and exit'
+    )
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--tracks-per-album', type=int, default=10, help='Tracks per album (default: 10)')
+    parser.add_argument('--split-rate', type=float, default=0.05, help='Share of split albums (default: 0.05)')
+    parser.add_argument('--multi-artist-rate', type=float, default=0.03,
+                        help='Share of "A & B" albums without a main artist (default: 0.03)')
+    parser.add_argument('--compilation-rate', type=float, default=0.02,
+                        help='Share of compilations (default: 0.02)')
+    parser.add_argument('--gap-rate', type=float, default=0.1,
+                        help='Share of albums with a missing track (default: 0.1)')
+    parser.add_argument('--unnumbered-rate', type=float, default=0.05,
+                        help='Share of albums with an unnumbered track (default: 0.05)')
+    parser.add_argument('--scan-workers', type=int, default=8, help='Scanner threads (default: 8)')
+    parser.add_argument('--keep', action='store_true', help='Keep generated libraries after the run')
+
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    if args.generate_only:
+        generated = generate_library(Path(args.generate_only), sizes[0], tracks_per_album=args.tracks_per_album,
+                                     split_rate=args.split_rate, multi_artist_rate=args.multi_artist_rate,
+                                     compilation_rate=args.compilation_rate, gap_rate=args.gap_rate,
+                                     unnumbered_rate=args.unnumbered_rate, seed=args.seed)
+        print(json.dumps(generated, indent=2))
+        return
+
+    organizer = load_organizer()
+
+    with contextlib.ExitStack() as stack:
+        if args.workdir:
+            workdir = Path(args.workdir)
+            workdir.mkdir(parents=True, exist_ok=True)
+        else:
+            workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix='organize-music-bench-')))
+
+        results = []
+        for albums in sizes:
+            print(f"⏱️  Benchmarking {albums} album(s) in {workdir}...", file=sys.stderr)
+            results.append(benchmark_size(organizer, workdir, albums, args))
+
+    output = {
+        'benchmark': 'organize-music',
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'workdir': str(workdir),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'generate_only')},
+        'results': results
+    }
+
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"\n✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
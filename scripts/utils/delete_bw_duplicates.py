@@ -1,6 +1,36 @@
+import argparse
+import http.client
 import json
 import subprocess
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlparse
+
+# `bw serve` default address (bw serve --hostname localhost --port 8087)
+DEFAULT_SERVE_URL = "http://localhost:8087"
+# Concurrent DELETE requests against bw serve; it decrypts nothing per request,
+# so a handful of keep-alive connections is enough to saturate the server
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+# Seconds before the first retry, doubled after each further attempt
+RETRY_BACKOFF = 0.5
+# Checkpoint records written between fsyncs; a killed run retries at most one batch
+CHECKPOINT_BATCH = 20
+
+# Error classes for the summary, matched against bw's message or the HTTP status
+ERROR_CLASSES = [
+    ("session", re.compile(r"not logged in|vault is locked|session key|HTTP 401|HTTP 403", re.IGNORECASE)),
+    ("not-found", re.compile(r"not found|HTTP 404", re.IGNORECASE)),
+    ("throttled", re.compile(r"HTTP 429")),
+    ("server", re.compile(r"HTTP 5\d\d")),
+    ("connection", re.compile(r"^connection error")),
+    ("cli-unavailable", re.compile(r"^cannot run bw")),
+]
+# Every remaining item would fail the same way, so the run stops
+FATAL_ERROR_CLASSES = {"session", "cli-unavailable"}
 
 def load_duplicates(filepath):
     with open(filepath, 'r') as f:
@@ -11,38 +41,251 @@ def delete_item(item_id):
     # We need to make sure BW_SESSION is in env if running from python subprocess,
     # but usually we assume the shell environment has it or we pass it.
     # The agent runs this, so the agent will ensure BW_SESSION is set.
+    # Returns None once deleted, otherwise the error message.
 
     cmd = ["bw", "delete", "item", item_id]
     try:
         subprocess.run(cmd, check=True, capture_output=True, text=True)
-        return True
+        return None
     except subprocess.CalledProcessError as e:
-        print(f"Error deleting {item_id}: {e.stderr}")
-        return False
+        return e.stderr.strip() or f"bw exited with status {e.returncode}"
+    except OSError as e:
+        return f"cannot run bw: {e}"
+
+def error_class(message):
+    for name, pattern in ERROR_CLASSES:
+        if pattern.search(message):
+            return name
+    return "other"
+
+class Checkpoint:
+    # Append-only log of finished items, one JSON line per item:
+    # {"id": ..., "status": "deleted" | "gone" | "failed", "error": ...}.
+    # The latest line for an id wins. Lines are fsynced every `batch`
+    # records and on close, so a killed run loses at most one batch, whose
+    # items are simply attempted again.
+
+    def __init__(self, path, batch=CHECKPOINT_BATCH):
+        self.path = path
+        self.batch = batch
+        self.status = {}
+        self.lock = threading.Lock()
+        self.pending = 0
+        torn = False
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    torn = not line.endswith('\n')
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Last line cut off by a kill
+                    # Skip anything else that parses (null, [], hand edits)
+                    if not isinstance(record, dict):
+                        continue
+                    item_id, status = record.get('id'), record.get('status')
+                    if isinstance(item_id, str) and isinstance(status, str):
+                        self.status[item_id] = status
+        self.file = open(path, 'a')
+        if torn:
+            self.file.write('\n')
+
+    def record(self, item_id, status, error=None):
+        line = json.dumps({"id": item_id, "status": status, "error": error})
+        with self.lock:
+            self.status[item_id] = status
+            self.file.write(line + '\n')
+            self.pending += 1
+            if self.pending >= self.batch:
+                self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def close(self):
+        with self.lock:
+            self.sync()
+            self.file.close()
+
+class ServeBackend:
+    # Deletes through the Vault Management API of a running `bw serve`.
+    # Each worker thread keeps one keep-alive HTTP connection, so the pool
+    # is bounded by the number of workers and no request pays CLI startup.
+
+    def __init__(self, url=DEFAULT_SERVE_URL, retries=DEFAULT_RETRIES, timeout=30):
+        parsed = urlparse(url)
+        # bw serve only speaks plain HTTP; anything else (https, a missing
+        # scheme) would silently be sent somewhere else
+        if parsed.scheme != "http":
+            raise ValueError(f"unsupported URL {url!r}; bw serve needs http://host:port")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 80
+        # Behind a reverse proxy the API may live under a path prefix
+        self.prefix = parsed.path.rstrip("/")
+        self.retries = retries
+        self.timeout = timeout
+        self.local = threading.local()
 
-def process_deletions(duplicates):
-    deleted_count = 0
-    errors = 0
+    def request(self, method, path):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request(method, self.prefix + path)
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            # Drop the broken connection; the next request reconnects
+            conn.close()
+            self.local.conn = None
+            raise
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            payload = {}
+        return response.status, payload
 
+    def available(self):
+        try:
+            status, payload = self.request("GET", "/status")
+        except (OSError, http.client.HTTPException):
+            return False
+        # bw serve only deletes once the vault is unlocked
+        template = (payload.get('data') or {}).get('template') or {}
+        return status == 200 and template.get('status', 'unlocked') == 'unlocked'
+
+    def delete_item(self, item_id):
+        delay = RETRY_BACKOFF
+        for attempt in range(self.retries + 1):
+            try:
+                status, payload = self.request("DELETE", f"/object/item/{quote(item_id, safe='')}")
+            except (OSError, http.client.HTTPException) as e:
+                error = f"connection error: {str(e) or type(e).__name__}"
+            else:
+                if 200 <= status < 300 and payload.get('success', True):
+                    return None
+                error = f"HTTP {status}: {payload.get('message') or 'no message'}"
+                # Only server errors and throttling are worth retrying
+                if status < 500 and status != 429:
+                    break
+            if attempt < self.retries:
+                time.sleep(delay)
+                delay *= 2
+        return error
+
+def process_deletions(duplicates, delete=delete_item, workers=1, checkpoint=None, retry_failed=False):
+    # Each item is deleted once, even if several groups mark it. With a
+    # checkpoint, items it records as deleted (or already gone) are skipped,
+    # and with retry_failed only the items it records as failed are tried.
+    # Returns counts: deleted, gone, errors, skipped, remaining,
+    # error_classes {class: n} and stopped (the fatal error class, if any).
+    done = checkpoint.status if checkpoint else {}
+    to_delete = []
+    seen_ids = set()
+    skipped = 0
     for group in duplicates:
         items = group.get('items', [])
         for item in items:
-            if item.get('action') == 'delete':
-                print(f"Deleting item: {item.get('name')} (ID: {item.get('id')})")
-                if delete_item(item.get('id')):
-                    deleted_count += 1
+            if item.get('action') == 'delete' and item.get('id') not in seen_ids:
+                seen_ids.add(item.get('id'))
+                status = done.get(item.get('id'))
+                if status in ('deleted', 'gone') or (retry_failed and status != 'failed'):
+                    skipped += 1
                 else:
-                    errors += 1
+                    to_delete.append(item)
+
+    counts = {"deleted": 0, "gone": 0, "errors": 0, "skipped": skipped, "remaining": 0,
+              "error_classes": {}, "stopped": None}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def run(item):
+        if stop.is_set():
+            with lock:
+                counts["remaining"] += 1
+            return
+        print(f"Deleting item: {item.get('name')} (ID: {item.get('id')})")
+        error = delete(item.get('id'))
+        kind = error_class(error) if error else None
+        if error and kind != "not-found":
+            print(f"Error deleting {item.get('id')}: {error}")
+        if kind in FATAL_ERROR_CLASSES:
+            # Not recorded: the item is attempted again on the next run
+            with lock:
+                counts["stopped"] = counts["stopped"] or kind
+                counts["remaining"] += 1
+            stop.set()
+            return
+        # An item that no longer exists needs no further attempts
+        status = "deleted" if not error else "gone" if kind == "not-found" else "failed"
+        if checkpoint:
+            checkpoint.record(item.get('id'), status, kind)
+        with lock:
+            if status == "failed":
+                counts["errors"] += 1
+                counts["error_classes"][kind] = counts["error_classes"].get(kind, 0) + 1
+            else:
+                counts[status] += 1
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(run, to_delete))
 
-    return deleted_count, errors
+    return counts
 
 if __name__ == "__main__":
-    filepath = "potential_duplicates.json"
+    parser = argparse.ArgumentParser(description="Delete the items marked \"delete\" in potential_duplicates.json")
+    parser.add_argument("filepath", nargs="?", default="potential_duplicates.json")
+    parser.add_argument("--serve", nargs="?", const=DEFAULT_SERVE_URL, metavar="URL",
+                        help=f"Delete through a running `bw serve` (default URL: {DEFAULT_SERVE_URL}) "
+                             "instead of one `bw delete` process per item")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Concurrent requests with --serve (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help=f"Retries per item with --serve, with exponential backoff (default: {DEFAULT_RETRIES})")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="Append-only log of finished and failed ids; items it records as deleted are skipped "
+                             "on the next run (default: <filepath>.checkpoint)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Only retry the items the checkpoint records as failed")
+    args = parser.parse_args()
+
+    filepath = args.filepath
     if not os.path.exists(filepath):
         print(f"File {filepath} not found.")
         exit(1)
 
     dupes = load_duplicates(filepath)
-    deleted, errors = process_deletions(dupes)
+    checkpoint = Checkpoint(args.checkpoint or f"{filepath}.checkpoint")
+
+    delete = delete_item
+    workers = 1
+    if args.serve:
+        try:
+            backend = ServeBackend(args.serve, retries=args.retries)
+        except ValueError as e:
+            print(f"Error: {e}")
+            exit(1)
+        if backend.available():
+            delete, workers = backend.delete_item, args.workers
+        else:
+            print(f"bw serve at {args.serve} is not reachable or not unlocked; falling back to `bw delete`.")
 
-    print(f"Operation complete. Deleted {deleted} items. Errors: {errors}.")
+    try:
+        counts = process_deletions(dupes, delete, workers=workers, checkpoint=checkpoint,
+                                   retry_failed=args.retry_failed)
+    finally:
+        checkpoint.close()
+
+    print(f"Operation complete. Deleted {counts['deleted']} items. Errors: {counts['errors']}.")
+    if counts['skipped']:
+        print(f"Skipped {counts['skipped']} items already handled according to {checkpoint.path}.")
+    if counts['gone']:
+        print(f"{counts['gone']} items were already deleted.")
+    for kind, count in sorted(counts['error_classes'].items(), key=lambda entry: -entry[1]):
+        print(f"  {kind}: {count}")
+    if counts['stopped']:
+        print(f"Stopped early ({counts['stopped']} error): {counts['remaining']} items left. "
+              f"Fix the session (e.g. `bw unlock`) and rerun to resume.")
+        exit(1)
@@ -1,76 +1,502 @@
+import argparse
+import hashlib
+import ipaddress
 import json
-from urllib.parse import urlparse
+import os
+import subprocess
+from functools import lru_cache
+from urllib.parse import urlparse, urlsplit
 from collections import defaultdict
 import sys
 
+CHUNK_SIZE = 1 << 16
+
+# Bundled copy of https://publicsuffix.org/list/public_suffix_list.dat (MPL 2.0);
+# replace the file with a fresh download to update it
+PUBLIC_SUFFIX_LIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'public_suffix_list.dat')
+
+# How far login URIs are canonicalized before they are compared (--match)
+MATCH_LEVELS = ('exact', 'host', 'domain')
+DEFAULT_PORTS = {80, 443}
+
+# Entries in each of the per-URI caches (get_host, canonicalize_uri). URIs
+# repeat across a vault (hot hosts, near duplicates), but a bounded cache
+# keeps memory flat on huge vaults whose URIs are mostly distinct
+URI_CACHE_SIZE = 1 << 16
+
+# Incremental runs (--state): bump when the state layout or grouping changes
+STATE_VERSION = 3
+
+@lru_cache(maxsize=URI_CACHE_SIZE)
 def get_host(uri):
     try:
         return urlparse(uri).netloc
     except:
         return uri
 
+@lru_cache(maxsize=None)
+def public_suffixes():
+    # (rules, wildcard parents, exceptions) from the public suffix list
+    rules, wildcards, exceptions = set(), set(), set()
+    try:
+        with open(PUBLIC_SUFFIX_LIST, 'r', encoding='utf-8') as f:
+            for line in f:
+                rule = line.split(None, 1)[0].lower() if line.strip() else ''
+                if not rule or rule.startswith('//'):
+                    continue
+                if rule.startswith('!'):
+                    exceptions.add(rule[1:])
+                elif rule.startswith('*.'):
+                    wildcards.add(rule[2:])
+                else:
+                    rules.add(rule)
+    except OSError:
+        print(f"Warning: {PUBLIC_SUFFIX_LIST} not found; hosts are not reduced to their registrable domain.",
+              file=sys.stderr)
+    return rules, wildcards, exceptions
+
+def registrable_domain(host):
+    # The public suffix plus one label ('login.example.co.uk' -> 'example.co.uk'),
+    # or the host itself if it is a public suffix or no listed rule matches.
+    # The list's implicit '*' rule is not applied: it would fold every
+    # internal host ('nas.home.lan', 'wiki.home.lan') into one domain.
+    rules, wildcards, exceptions = public_suffixes()
+    labels = host.split('.')
+    suffix_start = None
+    for i in range(len(labels)):
+        candidate = '.'.join(labels[i:])
+        if candidate in exceptions:
+            suffix_start = i + 1
+            break
+        if candidate in rules or (i + 1 < len(labels) and '.'.join(labels[i + 1:]) in wildcards):
+            suffix_start = i
+            break
+    if not suffix_start:
+        return host
+    return '.'.join(labels[suffix_start - 1:])
+
+def idna_to_unicode(hostname):
+    # Punycode labels ('xn--bcher-kva') in their Unicode form, as the public
+    # suffix list writes them, so both spellings of a host meet
+    labels = []
+    for label in hostname.split('.'):
+        if label.startswith('xn--'):
+            try:
+                label = label.encode('ascii').decode('idna')
+            except UnicodeError:
+                pass
+        labels.append(label)
+    return '.'.join(labels)
+
+@lru_cache(maxsize=URI_CACHE_SIZE)
+def canonicalize_uri(uri):
+    # (host, domain, app) keys for a login URI, or None without a host:
+    # host ignores scheme, default ports (80/443), case, a leading 'www.' and
+    # punycode; domain is the registrable domain of that host. Android app URIs
+    # (androidapp://com.example.app) map to the domain of the reversed package.
+    scheme, sep, rest = uri.strip().partition('://')
+    if not sep:
+        scheme, rest = '', uri.strip()  # Bare 'example.com/login'
+    if scheme.lower() == 'androidapp':
+        package = rest.split('/', 1)[0].lower()
+        if not package:
+            return None
+        reversed_host = '.'.join(reversed(package.split('.')))
+        return f"androidapp://{package}", registrable_domain(reversed_host), True
+
+    try:
+        parts = urlsplit('//' + rest)
+        hostname = parts.hostname
+        port = parts.port
+    except ValueError:
+        return None
+    if not hostname:
+        return None
+    hostname = hostname.rstrip('.')
+    if 'xn--' in hostname:
+        hostname = idna_to_unicode(hostname)
+    if hostname.startswith('www.') and '.' in hostname[4:]:
+        hostname = hostname[4:]
+
+    try:
+        ipaddress.ip_address(hostname)
+        domain = hostname
+    except ValueError:
+        domain = registrable_domain(hostname) if '.' in hostname else hostname
+
+    if port is not None and port not in DEFAULT_PORTS:
+        if ':' in hostname:
+            hostname = domain = f"[{hostname}]"  # IPv6
+        return f"{hostname}:{port}", f"{domain}:{port}", False
+    return hostname, domain, False
+
+def iter_json_array(f):
+    # Yield the elements of a top-level JSON array one at a time, reading the
+    # file in chunks, so only one raw item (notes, attachments, password
+    # history and all) is in memory at once. A `bw export` object is accepted
+    # too; its "items" array is streamed and the other keys are skipped.
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill(min_size):
+        nonlocal buf, pos, eof
+        # Read at least as much as is buffered, so an item larger than the
+        # chunk size is re-decoded a logarithmic number of times, not per chunk
+        data = f.read(max(CHUNK_SIZE, min_size))
+        if not data:
+            eof = True
+        buf = buf[pos:] + data
+        pos = 0
+
+    def next_char():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buf) or eof:
+                return buf[pos] if pos < len(buf) else ''
+            fill(0)
+
+    def decode():
+        nonlocal pos
+        while True:
+            next_char()
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill(len(buf) - pos)
+                continue
+            if end == len(buf) and not eof and isinstance(value, (int, float)):
+                # A number cut off by the chunk boundary also decodes
+                fill(len(buf) - pos)
+                continue
+            pos = end
+            return value
+
+    def expect(chars):
+        nonlocal pos
+        char = next_char()
+        if char not in chars:
+            raise json.JSONDecodeError(f"Expected one of {chars!r}", buf, pos)
+        pos += 1
+        return char
+
+    if expect('[{') == '{':
+        # Export object: find the "items" key
+        while True:
+            if next_char() == '}':
+                return
+            key = decode()
+            expect(':')
+            if key == 'items':
+                expect('[')
+                break
+            decode()
+            if expect(',}') == '}':
+                return
+
+    if next_char() == ']':
+        return
+    while True:
+        yield decode()
+        if expect(',]') == ']':
+            return
+
+def slim_item(item):
+    # The fields grouping and the report need; everything else is dropped
+    login = item.get('login') or {}
+    password = login.get('password')
+    uris = [u.get('uri') for u in login.get('uris') or []]
+    return {
+        "id": item.get('id'),
+        "name": item.get('name'),
+        "username": login.get('username'),
+        "uris": uris,
+        "password_digest": hashlib.sha256(password.encode('utf-8')).digest() if password else None,
+        "password_preview": password[:5] + "..." if password else None,
+        "revisionDate": item.get('revisionDate')
+    }
+
+def iter_login_items(f):
+    # Slim projections of the login items in a `bw list items` stream
+    for item in iter_json_array(f):
+        if item.get('type') == 1:  # 1 is Login
+            yield slim_item(item)
+
 def load_items(filepath):
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return list(iter_login_items(f))
 
-def find_duplicates(items):
-    name_groups = defaultdict(list)
-    login_groups = defaultdict(list)
+def iter_bw_items(bw="bw"):
+    # Run `bw list items` and parse its stdout as the CLI writes it, so
+    # grouping overlaps with the CLI's output and the decrypted vault is
+    # never written to disk. stdin/stderr stay attached to the terminal for
+    # bw's own prompts and messages.
+    proc = subprocess.Popen([bw, "list", "items"], stdout=subprocess.PIPE, encoding='utf-8')
 
-    for item in items:
-        if item.get('type') != 1: # 1 is Login
+    def finish():
+        # Drain whatever bw still writes so it can exit, then reap it
+        while proc.stdout.read(CHUNK_SIZE):
+            pass
+        return proc.wait()
+
+    try:
+        try:
+            yield from iter_login_items(proc.stdout)
+        except json.JSONDecodeError:
+            # A failing bw prints nothing (or an error) on stdout
+            if finish() == 0:
+                raise
+        if finish() != 0:
+            raise RuntimeError(f"`{bw} list items` exited with status {proc.returncode}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
+
+def find_duplicates(items, match='host'):
+    return [group_record(reasons, members) for reasons, members in find_clusters(items, match)]
+
+def group_record(reasons, members):
+    return {
+        "reason": "; ".join(reason for _, reason in reasons),
+        "rules": list(dict.fromkeys(rule for rule, _ in reasons)),
+        "items": process_group(members)
+    }
+
+def login_keys(item, match='host'):
+    # (key, exact host, canonical host, is app URI) for each login URI of an
+    # item with a username, where key is (username, host or domain per --match)
+    username = item.get('username')
+    for uri in item['uris'] if username else ():
+        if not uri:
             continue
+        netloc = get_host(uri)
+        if match == 'exact':
+            canonical = (netloc, netloc, False) if netloc else None
+        else:
+            canonical = canonicalize_uri(uri)
+        if canonical is None:
+            continue
+        host, domain, app = canonical
+        yield (username, host if match != 'domain' else domain), netloc, host, app
+
+def item_keys_record(item, keys):
+    # (revisionDate, digest of the grouping keys, digests of each key) as kept
+    # in the state file, which holds no names, usernames or hosts
+    name = item.get('name')
+    digest = repr((name, sorted(set(keys)))).encode('utf-8', 'surrogatepass')
+    key_digests = [("name", name)] if name else []
+    key_digests += [("login", *key) for key in sorted(set(keys))]
+    return (item.get('revisionDate'), hashlib.sha256(digest).hexdigest()[:32],
+            [hashlib.sha256(repr(key).encode('utf-8', 'surrogatepass')).hexdigest()[:16] for key in key_digests])
+
+def find_clusters(items, match='host', item_keys=None):
+    # Union-find over item ids: items sharing a name, or a username on the
+    # same login URI key (see --match), are joined into one connected
+    # cluster, which comes out once. Login keys go through an inverted
+    # index of (username, canonical host) -> ids, so near-duplicate URIs
+    # meet by lookup rather than by comparing items pairwise.
+    # Returns [(reasons, members)]; item_keys, if given, receives
+    # id -> item_keys_record(item).
+    parent = {}
+
+    def find(item_id):
+        while parent[item_id] != item_id:
+            parent[item_id] = parent[parent[item_id]]
+            item_id = parent[item_id]
+        return item_id
+
+    def union(a, b):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    # First item seen for each name, and the names shared by more than one item
+    name_first = {}
+    name_dupes = {}
+
+    # (username, key) -> [ids, {exact host: ids}, {canonical host: ids}, app URI seen]
+    login_index = {}
+
+    # items are login items from load_items; any iterable works
+    logins = []
+    for item in items:
+        item_id = item['id']
+        parent.setdefault(item_id, item_id)
+        logins.append(item)
 
         # Group by Name
         name = item.get('name')
         if name:
-            name_groups[name].append(item)
+            first_id = name_first.setdefault(name, item_id)
+            if first_id != item_id:
+                union(first_id, item_id)
+                name_dupes[name] = True
 
         # Group by Username + Host
-        login = item.get('login', {})
-        username = login.get('username')
-        uris = login.get('uris', [])
-
-        if username and uris:
-            for uri_obj in uris:
-                uri_val = uri_obj.get('uri')
-                if uri_val:
-                    host = get_host(uri_val)
-                    if host:
-                        key = (username, host)
-                        if not any(i['id'] == item['id'] for i in login_groups[key]):
-                            login_groups[key].append(item)
+        keys = []
+        for key, netloc, host, app in login_keys(item, match):
+            keys.append(key)
+            entry = login_index.get(key)
+            if entry is None:
+                entry = login_index[key] = [{}, {}, {}, False]
+            entry[0][item_id] = True
+            if netloc:
+                entry[1].setdefault(netloc, set()).add(item_id)
+            entry[2].setdefault(host, set()).add(item_id)
+            entry[3] = entry[3] or app
+
+        if item_keys is not None:
+            item_keys[item_id] = item_keys_record(item, keys)
+
+    clusters = {}
+    for name in name_dupes:
+        clusters.setdefault(find(name_first[name]), []).append(("name", f"Same Name: '{name}'"))
+
+    for (username, key), (ids, by_netloc, by_host, app) in login_index.items():
+        if len(ids) < 2:
+            continue
+        ids = list(ids)
+        for item_id in ids[1:]:
+            union(ids[0], item_id)
+
+        # Report the strictest rule that covers every item of the key
+        netloc = next((h for h, members in by_netloc.items() if len(members) == len(ids)), None)
+        host = next((h for h, members in by_host.items() if len(members) == len(ids)), None)
+        if netloc is not None:
+            rule = ("host", f"Same Username '{username}' on Host '{netloc}'")
+        elif host is not None:
+            rule = ("normalized-host",
+                    f"Same Username '{username}' on Host '{host}' (ignoring scheme, port and www.)")
+        elif app:
+            rule = ("android-app", f"Same Username '{username}' on Domain '{key}' (Android app and web URIs)")
+        else:
+            rule = ("registrable-domain", f"Same Username '{username}' on Domain '{key}' (registrable domain)")
+        clusters.setdefault(ids[0], []).append(rule)
+
+    # Unions above may have merged clusters keyed by a former root
+    merged = {}
+    for root, reasons in clusters.items():
+        merged.setdefault(find(root), []).extend(reasons)
+
+    members = defaultdict(list)
+    for item in logins:
+        root = find(item['id'])
+        if root in merged:
+            members[root].append(item)
+
+    return [(reasons, members[root]) for root, reasons in merged.items()]
+
+def load_state(path):
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        # e.g. truncated by a crash; the state only saves work, so start over
+        state = None
+    if not isinstance(state, dict):
+        print(f"Warning: {path} is not a valid state file; starting from an empty state "
+              f"(every group is reported as new).", file=sys.stderr)
+        return None
+    return state if state.get('version') == STATE_VERSION else None
 
+def save_state(path, state):
+    # Written next to the target and renamed, readable only by the owner
+    temp = f"{path}.partial"
+    fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(temp, path)
+
+def find_changed_duplicates(items, state, match='host', include_unchanged=False):
+    # Incremental run against the state of the previous one: every item's
+    # revisionDate, a digest of its grouping keys and of each key, and the
+    # fingerprint of the group it was in. Items whose revisionDate is
+    # unchanged keep their recorded keys without canonicalizing their URIs.
+    # Only the new and changed items, the items sharing a key with them or
+    # with a deleted item, and the whole previous groups of all of those are
+    # grouped again; every other group is unchanged by construction. Of the
+    # regrouped groups, those whose fingerprint (members, their revisions
+    # and keys) is new are reported, each with a "status" of "new" (no
+    # member was in a group before) or "changed". With include_unchanged,
+    # everything is regrouped and unchanged groups are reported too.
+    # Returns (duplicates, new_state, counts).
+    items = list(items)
+    previous = state['items'] if state and state.get('match') == match else {}
+
+    new_items = {}
+    regroup = set()
+    touched_keys = set()
+    touched_groups = set()
+    counts = {"new": 0, "changed": 0, "unchanged": 0, "new_items": 0, "changed_items": 0}
+    for item in items:
+        item_id = item['id']
+        old = previous.get(item_id)
+        if old is not None and old[0] is not None and old[0] == item.get('revisionDate'):
+            new_items[item_id] = list(old)
+            continue
+        revision, digest, key_digests = item_keys_record(item, [key for key, *_ in login_keys(item, match)])
+        new_items[item_id] = [revision, digest, None, key_digests]
+        if old is None:
+            counts["new_items"] += 1
+        elif [revision, digest] != old[:2]:
+            counts["changed_items"] += 1
+        else:
+            new_items[item_id][2] = old[2]
+            continue
+        regroup.add(item_id)
+        touched_keys.update(key_digests)
+        if old is not None:
+            touched_keys.update(old[3])
+            touched_groups.add(old[2])
+
+    deleted = [entry for item_id, entry in previous.items() if item_id not in new_items]
+    counts["deleted_items"] = len(deleted)
+    for entry in deleted:
+        touched_keys.update(entry[3])
+        touched_groups.add(entry[2])
+
+    # Items that may join or leave a group, and the whole groups they were in
+    for item_id, entry in new_items.items():
+        if include_unchanged or not touched_keys.isdisjoint(entry[3]):
+            regroup.add(item_id)
+            touched_groups.add(entry[2])
+    touched_groups.discard(None)
+    regroup.update(item_id for item_id, entry in new_items.items() if entry[2] in touched_groups)
+
+    previous_groups = {entry[2] for entry in previous.values() if entry[2]}
+    for item_id in regroup:
+        new_items[item_id][2] = None
+    counts["unchanged"] = len({entry[2] for entry in new_items.values() if entry[2]})
+
+    item_keys = {}
     duplicates = []
-    seen_ids = set()
-
-    # Process Name Duplicates
-    for name, group in name_groups.items():
-        if len(group) > 1:
-            group_ids = sorted([i['id'] for i in group])
-            group_key = tuple(group_ids)
-            if group_key in seen_ids:
-                continue
-            seen_ids.add(group_key)
-            duplicates.append({
-                "reason": f"Same Name: '{name}'",
-                "items": process_group(group)
-            })
-
-    # Process Login Duplicates
-    for (username, host), group in login_groups.items():
-        if len(group) > 1:
-            group_ids = sorted([i['id'] for i in group])
-            group_key = tuple(group_ids)
-            if group_key in seen_ids:
-                continue
-            seen_ids.add(group_key)
-            duplicates.append({
-                "reason": f"Same Username '{username}' on Host '{host}'",
-                "items": process_group(group)
-            })
+    for reasons, members in find_clusters([item for item in items if item['id'] in regroup], match, item_keys):
+        member_keys = sorted([item['id'], *item_keys[item['id']][:2]] for item in members)
+        rules = [rule for rule, _ in reasons]
+        fingerprint = hashlib.sha256(json.dumps([rules, member_keys]).encode('utf-8')).hexdigest()[:32]
+        for item in members:
+            new_items[item['id']][2] = fingerprint
+
+        if fingerprint in previous_groups:
+            status = "unchanged"
+        elif any(previous.get(item['id'], [None, None, None])[2] for item in members):
+            status = "changed"
+        else:
+            status = "new"
+        counts[status] += 1
+        if status != "unchanged" or include_unchanged:
+            duplicates.append({"status": status, **group_record(reasons, members)})
 
-    return duplicates
+    return duplicates, {"version": STATE_VERSION, "match": match, "items": new_items}, counts
 
 def process_group(items):
     # Sort by revision date descending (newest first)
@@ -80,37 +506,32 @@ def process_group(items):
     simple_items = []
 
     # Check for exact content matches (username, password, uris)
-    # The first item is the newest, we keep it by default.
-    # If older items match the newest item's sensitive data, mark them for deletion.
+    # Items are newest first and the newest copy of each credential is kept.
+    # A cluster can join several different credentials, so an older item is
+    # marked for deletion when it matches any newer item's sensitive data.
+    newer_content = set()
 
-    newest = items[0]
-    newest_login = newest.get('login', {})
-    newest_user = newest_login.get('username')
-    newest_pass = newest_login.get('password')
-    newest_uris = sorted([u.get('uri') for u in newest_login.get('uris', [])])
-
-    for i, item in enumerate(items):
-        login = item.get('login', {})
-        username = login.get('username')
-        password = login.get('password')
-        uris = sorted([u.get('uri') for u in login.get('uris', [])])
+    for item in items:
+        username = item.get('username')
+        password = item.get('password_digest')
+        uris = sorted(item['uris'])
+        content = (username, password, tuple(uris))
 
         action = "keep"
 
-        # Heuristic: If it's not the newest, AND it has same username/password/uris as newest, mark delete
         # Only if we actually have values to compare (don't delete empty stuff based on empty matches)
         has_content = (username or password or uris)
 
-        if i > 0 and has_content:
-            if username == newest_user and password == newest_pass and uris == newest_uris:
-                action = "delete"
+        if has_content and content in newer_content:
+            action = "delete"
+        newer_content.add(content)
 
         simple_items.append({
             "id": item.get('id'),
             "name": item.get('name'),
             "username": username,
-            "password_preview": password[:5] + "..." if password else None,
-            "uris": [u.get('uri') for u in login.get('uris', [])],
+            "password_preview": item.get('password_preview'),
+            "uris": item['uris'],
             "revisionDate": item.get('revisionDate'),
             "action": action
         })
@@ -118,10 +539,41 @@ def process_group(items):
     return simple_items
 
 if __name__ == "__main__":
-    items = load_items("bw_items.json")
-    dupes = find_duplicates(items)
+    parser = argparse.ArgumentParser(description="Find potential duplicate logins in a Bitwarden export")
+    parser.add_argument("--match", choices=MATCH_LEVELS, default="host",
+                        help="How login URIs are compared: exact host, host ignoring scheme/default port/www., "
+                             "or registrable domain per the public suffix list (default: host)")
+    parser.add_argument("--state", metavar="FILE",
+                        help="Remember this run in FILE and report only groups that are new or changed since the "
+                             "previous run with the same FILE")
+    parser.add_argument("--all", action="store_true",
+                        help="With --state, also report unchanged groups (status \"unchanged\")")
+    parser.add_argument("--from-bw", action="store_true",
+                        help="Read the items from `bw list items` directly instead of bw_items.json")
+    args = parser.parse_args()
+
+    previous_state = load_state(args.state) if args.state else None
+    source = "bw" if args.from_bw else "bw_items.json"
+    try:
+        items = iter_bw_items() if args.from_bw else load_items("bw_items.json")
+        if args.state:
+            dupes, state, counts = find_changed_duplicates(items, previous_state, match=args.match,
+                                                           include_unchanged=args.all)
+        else:
+            dupes = find_duplicates(items, match=args.match)
+    except (OSError, RuntimeError, ValueError) as e:
+        # ValueError covers malformed JSON (json.JSONDecodeError)
+        print(f"Error reading items from {source}: {e}")
+        exit(1)
 
     with open("potential_duplicates.json", "w") as f:
         json.dump(dupes, f, indent=2)
 
-    print(f"Found {len(dupes)} sets of potential duplicates.")
+    if args.state:
+        save_state(args.state, state)
+        print(f"Items since last run: {counts['new_items']} new, {counts['changed_items']} changed, "
+              f"{counts['deleted_items']} deleted.")
+        print(f"Found {counts['new'] + counts['changed']} new or changed sets of potential duplicates "
+              f"({counts['new']} new, {counts['changed']} changed, {counts['unchanged']} unchanged).")
+    else:
+        print(f"Found {len(dupes)} sets of potential duplicates.")
@@ -0,0 +1,66 @@
+"""
+Organize Apple Music folder structure by consolidating split albums.
+
+The command-line tool is scripts/utils/organize-music.py (or
+``python3 -m organize_music`` from scripts/utils); the same pipeline can be
+driven from Python:
+
+    from pathlib import Path
+    import organize_music
+
+    music_dir = Path('/mnt/video/Music')
+    structure = organize_music.get_artists_and_albums(music_dir)
+    operations = organize_music.plan_consolidations(music_dir, structure)
+    organize_music.execute_operations(music_dir, operations, dry_run=True, structure=structure)
+
+The scanned structure is a Library, an {artist: {album: tracks}} dict whose
+track lists are TrackLists backed by one compact table. Operations are
+MergeToMain / MergeToVarious dataclasses. Importing the package is cheap:
+each name below loads its submodule on first access, so scanning never
+pulls in the JSON, SQLite, tag, watch or file-moving code it doesn't use.
+"""
+
+from importlib import import_module
+
+_EXPORTS = {
+    'get_artists_and_albums': 'scan',
+    'Library': 'library',
+    'TrackList': 'library',
+    'DEFAULT_SCAN_WORKERS': 'scan',
+    'read_library_tags': 'tags',
+    'default_index_path': 'index',
+    'write_library_snapshot': 'snapshot',
+    'read_library_snapshot': 'snapshot',
+    'plan_consolidations': 'plan',
+    'iter_consolidations': 'plan',
+    'operation_artists': 'plan',
+    'MergeToMain': 'plan',
+    'MergeToVarious': 'plan',
+    'Operation': 'plan',
+    'print_operation_summary': 'report',
+    'operations_to_json': 'report',
+    'write_ndjson_plan': 'report',
+    'execute_operations': 'execute',
+    'run_pipeline': 'pipeline',
+    'resume_operations': 'execute',
+    'undo_operations': 'execute',
+    'default_journal_path': 'journal',
+    'RunProfile': 'profiling',
+    'watch_library': 'watch',
+    'main': 'cli',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,418 @@
+"""Command-line interface for organize-music."""
+
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .content import DEFAULT_HASH_WORKERS
+from .defaults import DEFAULT_PIPELINE_DEPTH, DEFAULT_POLL_INTERVAL, DEFAULT_WATCH_DEBOUNCE
+from .execute import execute_operations, resume_operations, undo_operations
+from .journal import default_journal_path
+from .moves import DEFAULT_MOVE_WORKERS
+from .names import DEFAULT_FUZZY_THRESHOLD
+from .plan import Operation, iter_consolidations, operation_artists, plan_consolidations
+from .profiling import RunProfile, cprofile_to, profile_phase
+from .report import operations_to_json, write_ndjson_plan
+from .scan import DEFAULT_SCAN_WORKERS, get_artists_and_albums
+
+
+def finish_run(args, music_dir: Path, structure: Dict[str, Dict[str, List[str]]],
+               operations: List[Operation], journal_path: Path, index_path: Optional[Path],
+               profile: Optional[RunProfile]):
+    """Report the profile, then either keep watching the library or print the dry-run hint."""
+    if profile is not None:
+        profile.print_table()
+        profile.stop()
+    if args.profile_plan:
+        print(f"\n🧪 Planner cProfile stats written to {args.profile_plan} "
+              f"(python3 -m pstats {args.profile_plan})")
+
+    if args.watch:
+        from .watch import refresh_artists, watch_library
+
+        print()
+        if not args.dry_run and operations:
+            # The initial run moved tracks; bring the in-memory structure up to date
+            album_artists = {}
+            for artist, albums in structure.items():
+                for album in albums:
+                    album_artists.setdefault(album, set()).add(artist)
+            refresh_artists(music_dir, structure, album_artists, operation_artists(operations),
+                            workers=args.scan_workers)
+        watch_library(music_dir, structure, dry_run=args.dry_run, use_polling=args.poll,
+                      debounce=args.debounce, poll_interval=args.poll_interval,
+                      scan_workers=args.scan_workers, move_workers=args.move_workers,
+                      journal_path=journal_path, content_hash=args.content_hash,
+                      hash_workers=args.hash_workers, tags=args.tags, index_path=index_path,
+                      fuzzy_threshold=args.fuzzy, journal_started=not args.dry_run and bool(operations))
+        return
+
+    if args.dry_run and operations:
+        print("\n💡 To apply these changes, run without --dry-run flag")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Organize Apple Music folder structure by consolidating split albums'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Preview changes without making them'
+    )
+    parser.add_argument(
+        '--music-dir',
+        type=str,
+        default='/Volumes/media/TuneFab/Apple Music',
+        help='Path to Apple Music directory (default: /Volumes/media/TuneFab/Apple Music)'
+    )
+    output_group = parser.add_mutually_exclusive_group()
+    output_group.add_argument(
+        '--json',
+        action='store_true',
+        help='Output results in JSON format (useful for piping to other tools)'
+    )
+    output_group.add_argument(
+        '--ndjson',
+        action='store_true',
+        help='Stream one JSON record per consolidation as it is planned, then a summary record'
+    )
+    parser.add_argument(
+        '--scan-workers',
+        type=int,
+        default=DEFAULT_SCAN_WORKERS,
+        help=f'Number of artist directories to scan in parallel (default: {DEFAULT_SCAN_WORKERS})'
+    )
+    parser.add_argument(
+        '--move-workers',
+        type=int,
+        default=DEFAULT_MOVE_WORKERS,
+        help=f'Number of cross-device copies to run in parallel (default: {DEFAULT_MOVE_WORKERS})'
+    )
+    parser.add_argument(
+        '--journal',
+        type=str,
+        help='Path to the operation journal (default: ~/.cache/organize-music/<hash>.journal.ndjson)'
+    )
+    journal_group = parser.add_mutually_exclusive_group()
+    journal_group.add_argument(
+        '--resume',
+        action='store_true',
+        help='Finish the moves of an interrupted run from the journal, without rescanning'
+    )
+    journal_group.add_argument(
+        '--undo',
+        action='store_true',
+        help='Move every track moved by the last journaled run back to where it came from'
+    )
+    parser.add_argument(
+        '--content-hash',
+        action='store_true',
+        help='Identify duplicate tracks by file content instead of track number or filename'
+    )
+    parser.add_argument(
+        '--hash-workers',
+        type=int,
+        default=DEFAULT_HASH_WORKERS,
+        help=f'Number of files hashed in parallel with --content-hash (default: {DEFAULT_HASH_WORKERS})'
+    )
+    parser.add_argument(
+        '--tags',
+        action='store_true',
+        help='Read FLAC/MP3/M4A tag headers to match albums by tagged title and album artist '
+             'and check completeness per disc'
+    )
+    parser.add_argument(
+        '--fuzzy',
+        nargs='?',
+        type=float,
+        const=DEFAULT_FUZZY_THRESHOLD,
+        metavar='THRESHOLD',
+        help='Match album and artist names after normalization (case, accents, punctuation, '
+             'edition suffixes, feat.) and merge album names scoring at least THRESHOLD '
+             f'(0-1, default: {DEFAULT_FUZZY_THRESHOLD:g})'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Keep running and consolidate albums as they land in the library'
+    )
+    parser.add_argument(
+        '--poll',
+        action='store_true',
+        help='With --watch, poll directory mtimes instead of using inotify (automatic on network mounts)'
+    )
+    parser.add_argument(
+        '--debounce',
+        type=float,
+        default=DEFAULT_WATCH_DEBOUNCE,
+        help=f'With --watch, seconds without new events before replanning (default: {DEFAULT_WATCH_DEBOUNCE:g})'
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help=f'With --watch --poll, seconds between polls (default: {DEFAULT_POLL_INTERVAL:g})'
+    )
+    index_group = parser.add_mutually_exclusive_group()
+    index_group.add_argument(
+        '--rebuild-index',
+        action='store_true',
+        help='Ignore the cached library index and rescan every directory'
+    )
+    index_group.add_argument(
+        '--no-index',
+        action='store_true',
+        help='Scan without reading or updating the library index'
+    )
+    parser.add_argument(
+        '--index-db',
+        type=str,
+        help='Path to the library index (default: ~/.cache/organize-music/<hash>.sqlite3)'
+    )
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help='Start moving each artist group as soon as its folders are scanned, instead of '
+             'after the whole scan (not with --tags, --fuzzy, --content-hash, the index options or --json/--ndjson)'
+    )
+    parser.add_argument(
+        '--pipeline-depth',
+        type=int,
+        default=DEFAULT_PIPELINE_DEPTH,
+        metavar='N',
+        help=f'With --pipeline, scanned folders and planned groups allowed to queue up '
+             f'between stages (default: {DEFAULT_PIPELINE_DEPTH}); the whole scan is still kept '
+             f'in memory for compilations'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Record wall/CPU time, filesystem calls and bytes moved per phase '
+             '(a table at the end, or a "profile" block with --json/--ndjson)'
+    )
+    parser.add_argument(
+        '--profile-plan',
+        type=str,
+        metavar='FILE',
+        help='Write cProfile stats for the planning phase to FILE (view with python3 -m pstats FILE)'
+    )
+    snapshot_group = parser.add_mutually_exclusive_group()
+    snapshot_group.add_argument(
+        '--write-index',
+        type=str,
+        metavar='FILE',
+        help="Only scan (and read tags with --tags), then write a compressed index of the library "
+             "to FILE ('-' for stdout); run this on the NAS and plan from it with --index"
+    )
+    snapshot_group.add_argument(
+        '--index',
+        type=str,
+        metavar='FILE',
+        help="Plan from an index written by --write-index ('-' for stdin) instead of scanning "
+             "--music-dir; only the moves touch the library"
+    )
+
+    args = parser.parse_args()
+
+    if args.watch and (args.json or args.ndjson or args.resume or args.undo):
+        parser.error('--watch cannot be combined with --json, --ndjson, --resume or --undo')
+    if args.fuzzy is not None and not 0 < args.fuzzy <= 1:
+        parser.error('--fuzzy THRESHOLD must be between 0 and 1')
+    if args.ndjson and (args.resume or args.undo):
+        parser.error('--ndjson cannot be combined with --resume or --undo')
+    if args.write_index and (args.json or args.ndjson or args.resume or args.undo or args.watch):
+        parser.error('--write-index cannot be combined with --json, --ndjson, --resume, --undo or --watch')
+    if args.index and (args.resume or args.undo or args.watch):
+        parser.error('--index cannot be combined with --resume, --undo or --watch')
+    if args.pipeline and (args.json or args.ndjson or args.resume or args.undo or args.tags
+                          or args.fuzzy is not None or args.content_hash or args.index or args.write_index
+                          or args.rebuild_index or args.no_index or args.index_db or args.profile_plan):
+        parser.error('--pipeline cannot be combined with --json, --ndjson, --resume, --undo, --tags, '
+                     '--fuzzy, --content-hash, --index, --write-index, --rebuild-index, --no-index, '
+                     '--index-db or --profile-plan')
+    # With the index on stdout, progress goes to stderr instead
+    machine_output = args.json or args.ndjson or args.write_index == '-'
+
+    music_dir = Path(args.music_dir)
+
+    if not music_dir.exists():
+        print(f"❌ Error: Music directory not found: {music_dir}")
+        sys.exit(1)
+
+    journal_path = Path(args.journal) if args.journal else default_journal_path(music_dir)
+
+    profile = None
+    if args.profile:
+        profile = RunProfile()
+        profile.start()
+
+    if args.resume:
+        resume_operations(music_dir, journal_path, dry_run=args.dry_run, move_workers=args.move_workers,
+                          profile=profile)
+        if profile is not None:
+            profile.print_table()
+        return
+
+    if args.undo:
+        undo_operations(music_dir, journal_path, dry_run=args.dry_run, move_workers=args.move_workers,
+                        profile=profile)
+        if profile is not None:
+            profile.print_table()
+        return
+
+    if args.no_index:
+        index_path = None
+    else:
+        from .index import default_index_path
+        index_path = Path(args.index_db) if args.index_db else default_index_path(music_dir)
+
+    if args.pipeline:
+        from .pipeline import run_pipeline
+
+        print(f"📂 Scanning music directory: {music_dir}")
+        print("   Moving each artist's albums as soon as its folders are scanned...")
+        scan_stats = {}
+        structure, operations = run_pipeline(music_dir, dry_run=args.dry_run, scan_workers=args.scan_workers,
+                                             move_workers=args.move_workers, journal_path=journal_path,
+                                             depth=args.pipeline_depth, stats=scan_stats, profile=profile)
+        finish_run(args, music_dir, structure, operations, journal_path, index_path, profile)
+        return
+
+    snapshot = None
+    if args.index:
+        # Structure (and maybe tags) come from an index written on the NAS
+        from .snapshot import read_library_snapshot
+        started = time.perf_counter()
+        with profile_phase(profile, 'scan'):
+            snapshot = read_library_snapshot(args.index)
+        structure = snapshot['structure']
+        scan_summary = {
+            'seconds': round(time.perf_counter() - started, 3),
+            'directories_read': 0,
+            'directories_cached': 0,
+            'index': {'file': args.index, 'host': snapshot['host'], 'created': snapshot['created'],
+                      'music_dir': snapshot['music_dir']}
+        }
+        if not machine_output:
+            written = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot['created']))
+            source = 'stdin' if args.index == '-' else args.index
+            print(f"📦 Loaded index {source} (scanned {snapshot['music_dir']} on {snapshot['host']} at {written})")
+            print(f"✅ Found {len(structure)} artist(s) with albums\n")
+    else:
+        if not machine_output:
+            print(f"📂 Scanning music directory: {music_dir}")
+            print("   This may take a moment...\n")
+
+        # Scan structure
+        scan_stats = {}
+        with profile_phase(profile, 'scan'):
+            structure = get_artists_and_albums(music_dir, workers=args.scan_workers, stats=scan_stats,
+                                               index_path=index_path, rebuild_index=args.rebuild_index)
+
+        if not machine_output:
+            print(f"✅ Found {len(structure)} artist(s) with albums")
+            print(f"   Scanned {scan_stats['directories_read']} director(ies) "
+                  f"({scan_stats['directories_cached']} unchanged from index) in {scan_stats['seconds']:.2f}s\n")
+
+        scan_summary = {
+            'seconds': round(scan_stats['seconds'], 3),
+            'directories_read': scan_stats['directories_read'],
+            'directories_cached': scan_stats['directories_cached']
+        }
+
+    tags = None
+    tag_stats = {}
+    if args.tags and snapshot is not None and snapshot['tags'] is not None:
+        tags = snapshot['tags']
+        tag_stats = {
+            'seconds': 0.0,
+            'files': sum(len(tracks) for albums in structure.values() for tracks in albums.values()),
+            'cached': 0,
+            'read': 0,
+            'tagged': len(tags)
+        }
+        if not machine_output:
+            print(f"🏷️  Tags: {tag_stats['tagged']} of {tag_stats['files']} track(s) tagged, from the index\n")
+    elif args.tags:
+        from .tags import read_library_tags
+        with profile_phase(profile, 'tags'):
+            tags = read_library_tags(music_dir, structure, workers=args.scan_workers, index_path=index_path,
+                                     rebuild_index=args.rebuild_index, stats=tag_stats)
+        tag_stats['seconds'] = round(tag_stats['seconds'], 3)
+        if not machine_output:
+            print(f"🏷️  Tags: {tag_stats['tagged']} of {tag_stats['files']} track(s) tagged, "
+                  f"{tag_stats['read']} header(s) read, {tag_stats['cached']} from index "
+                  f"in {tag_stats['seconds']:.2f}s\n")
+
+    if args.write_index:
+        from .snapshot import write_library_snapshot
+        with profile_phase(profile, 'write'):
+            size = write_library_snapshot(args.write_index, music_dir, structure, tags)
+        track_count = sum(len(tracks) for albums in structure.values() for tracks in albums.values())
+        destination = 'stdout' if args.write_index == '-' else args.write_index
+        log = sys.stderr if args.write_index == '-' else sys.stdout
+        print(f"📦 Wrote index of {len(structure)} artist(s), {track_count} track(s) "
+              f"to {destination} ({size / 1024:.1f} KiB)", file=log)
+        if profile is not None:
+            profile.print_table(out=log)
+        return
+
+    # Plan consolidations
+    hash_stats = {}
+
+    if args.ndjson:
+        import json
+
+        # Planning and writing are interleaved, so they are one phase here
+        with profile_phase(profile, 'plan'), cprofile_to(args.profile_plan):
+            summary = write_ndjson_plan(
+                iter_consolidations(music_dir, structure, content_hash=args.content_hash,
+                                    hash_workers=args.hash_workers, hash_stats=hash_stats, tags=tags,
+                                    fuzzy_threshold=args.fuzzy),
+                music_dir, content_hash=args.content_hash
+            )
+        summary_record = {'record': 'summary', **summary, 'dry_run': args.dry_run, 'scan': scan_summary}
+        if args.content_hash:
+            summary_record['content_hash'] = hash_stats
+        if args.tags:
+            summary_record['tags'] = tag_stats
+        if profile is not None:
+            summary_record['profile'] = profile.to_json()
+        print(json.dumps(summary_record))
+        return
+
+    with profile_phase(profile, 'plan'), cprofile_to(args.profile_plan):
+        operations = plan_consolidations(music_dir, structure, content_hash=args.content_hash,
+                                         hash_workers=args.hash_workers, hash_stats=hash_stats, tags=tags,
+                                         fuzzy_threshold=args.fuzzy)
+
+    if args.content_hash and not args.json:
+        print(f"🔁 Content identity: {hash_stats['files_sized']} file(s) sized, "
+              f"{hash_stats['partial_hashed']} partially hashed, {hash_stats['full_hashed']} fully hashed\n")
+
+    # Output JSON if requested
+    if args.json:
+        import json
+
+        json_output = operations_to_json(operations, music_dir, content_hash=args.content_hash)
+        json_output['dry_run'] = args.dry_run
+        json_output['scan'] = scan_summary
+        if args.content_hash:
+            json_output['content_hash'] = hash_stats
+        if args.tags:
+            json_output['tags'] = tag_stats
+        if profile is not None:
+            json_output['profile'] = profile.to_json()
+        print(json.dumps(json_output, indent=2))
+        return
+
+    # Execute (or dry-run)
+    execute_operations(music_dir, operations, dry_run=args.dry_run,
+                       move_workers=args.move_workers, journal_path=journal_path,
+                       structure=structure, profile=profile)
+
+    finish_run(args, music_dir, structure, operations, journal_path, index_path, profile)
@@ -0,0 +1,179 @@
+"""Content identity hashing for matching tracks across differently named files."""
+
+import hashlib
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional
+
+# Content identity hashes this much from each end of a file first; only files
+# that still collide after that are hashed in full.
+PARTIAL_HASH_BYTES = 2 * 1024 * 1024
+HASH_CHUNK_BYTES = 1024 * 1024
+DEFAULT_HASH_WORKERS = os.cpu_count() or 4
+
+
+def partial_file_hash(path: str) -> Tuple[str, bool]:
+    """
+    Hash the first and last PARTIAL_HASH_BYTES of a file.
+
+    Returns:
+        (digest, covers_whole_file) - small files are hashed completely, in
+        which case the digest equals full_file_hash() of the same file
+    """
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= 2 * PARTIAL_HASH_BYTES:
+            digest.update(f.read())
+            return digest.hexdigest(), True
+
+        digest.update(f.read(PARTIAL_HASH_BYTES))
+        f.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+        digest.update(f.read(PARTIAL_HASH_BYTES))
+    return digest.hexdigest(), False
+
+
+def full_file_hash(path: str) -> str:
+    """Hash the complete contents of a file."""
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_identities(groups: List[List[Path]], workers: int = DEFAULT_HASH_WORKERS,
+                       stats: Optional[Dict] = None) -> Dict[Path, str]:
+    """
+    Find files with identical content within each group of candidate files.
+
+    Files are bucketed by size first, then by a hash of their head and tail,
+    and only files that still collide are hashed in full on a process pool.
+    Unique files are never read, so the cost tracks the number of real
+    collisions rather than the size of the library.
+
+    Args:
+        groups: Lists of files that could plausibly be duplicates of each other
+        workers: Maximum number of files stat'ed or hashed in parallel
+        stats: Optional dict that receives 'files_sized', 'partial_hashed'
+               and 'full_hashed'
+
+    Returns:
+        {path: digest} for every file that shares its content with another
+        file in the same group; unique files are absent
+    """
+    candidates = [(group_index, path) for group_index, group in enumerate(groups) for path in group]
+
+    def file_size(path: Path) -> Optional[int]:
+        try:
+            return path.stat().st_size
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        sizes = list(pool.map(file_size, [path for _, path in candidates]))
+
+    by_size = defaultdict(list)
+    for (group_index, path), size in zip(candidates, sizes):
+        if size is not None:
+            by_size[(group_index, size)].append(path)
+    size_collisions = [(key, paths) for key, paths in by_size.items() if len(paths) > 1]
+
+    to_partial = [path for _, paths in size_collisions for path in paths]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        partials = dict(zip(to_partial, pool.map(lambda path: partial_file_hash(str(path)), to_partial)))
+
+    by_partial = defaultdict(list)
+    for key, paths in size_collisions:
+        for path in paths:
+            by_partial[key + (partials[path][0],)].append(path)
+    partial_collisions = [(key, paths) for key, paths in by_partial.items() if len(paths) > 1]
+
+    to_full = [path for _, paths in partial_collisions for path in paths if not partials[path][1]]
+    # Full hashes are CPU-bound, so they run in processes; multiprocessing is slow to import
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        fulls = dict(zip(to_full, pool.map(full_file_hash, [str(path) for path in to_full])))
+
+    by_content = defaultdict(list)
+    for (group_index, _, _), paths in partial_collisions:
+        for path in paths:
+            digest = fulls.get(path) or partials[path][0]
+            by_content[(group_index, digest)].append(path)
+
+    identities = {}
+    for (_, digest), paths in by_content.items():
+        if len(paths) > 1:
+            for path in paths:
+                identities[path] = digest
+
+    if stats is not None:
+        stats['files_sized'] = len(candidates)
+        stats['partial_hashed'] = len(to_partial)
+        stats['full_hashed'] = len(to_full)
+
+    return identities
+
+
+def match_tracks_by_content(music_dir: Path, identities: Dict[Path, str],
+                            source_artist: str, source_album: str, source_tracks: List[str],
+                            target_artist: str, target_album: str,
+                            target_tracks: List[str]) -> Tuple[List[str], List[List[Tuple[str, str, str]]]]:
+    """
+    Decide which source tracks to move using content identity instead of track numbers.
+
+    A source track is a duplicate if its content matches a target track,
+    whatever either file is called. Otherwise it is moved unless a different
+    file with the same name already exists in the target.
+
+    Returns:
+        (tracks_to_move, duplicate_tracks) where each duplicate is
+        [(artist, album, track) in target, (artist, album, track) in source]
+    """
+    target_by_digest = {}
+    for track in target_tracks:
+        digest = identities.get(music_dir / target_artist / target_album / track)
+        if digest:
+            target_by_digest.setdefault(digest, track)
+
+    target_names = set(target_tracks)
+    tracks_to_move = []
+    duplicate_tracks = []
+
+    for track in source_tracks:
+        digest = identities.get(music_dir / source_artist / source_album / track)
+        if digest in target_by_digest:
+            duplicate_tracks.append([(target_artist, target_album, target_by_digest[digest]),
+                                     (source_artist, source_album, track)])
+        elif track not in target_names:
+            tracks_to_move.append(track)
+
+    return tracks_to_move, duplicate_tracks
+
+
+def group_tracks_by_content(music_dir: Path, identities: Dict[Path, str],
+                            structure: Dict[str, Dict[str, List[str]]],
+                            locations: List[Tuple[str, str]]) -> Tuple[List[str], List[List[Tuple[str, str, str]]]]:
+    """
+    Collect the tracks of a compilation, keeping one copy of identical files.
+
+    Returns:
+        (unique_tracks, duplicate_tracks) where each duplicate group lists the
+        kept copy first, followed by the copies that will be left in place
+    """
+    by_digest = defaultdict(list)
+    all_tracks = []
+
+    for artist, album in locations:
+        for track in structure[artist][album]:
+            digest = identities.get(music_dir / artist / album / track)
+            if digest:
+                by_digest[digest].append((artist, album, track))
+                if len(by_digest[digest]) > 1:
+                    continue
+            all_tracks.append(track)
+
+    duplicate_tracks = [copies for copies in by_digest.values() if len(copies) > 1]
+    return sorted(set(all_tracks)), duplicate_tracks
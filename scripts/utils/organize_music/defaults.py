@@ -0,0 +1,10 @@
+"""Defaults of the optional modes, kept here so the CLI can show them without importing those modes."""
+
+# --watch waits for this many seconds without new events before replanning,
+# so a download landing track by track is handled once.
+DEFAULT_WATCH_DEBOUNCE = 5.0
+DEFAULT_POLL_INTERVAL = 30.0
+
+# Scanned artist folders and planned groups allowed to wait for the next
+# stage of --pipeline; this bounds what is in flight, not the size of the library.
+DEFAULT_PIPELINE_DEPTH = 16
@@ -0,0 +1,444 @@
+"""Execute, resume and undo consolidation plans."""
+
+import os
+from pathlib import Path
+from typing import Dict, List, Set, Optional
+
+from .journal import OperationJournal, load_journal_for
+from .plan import Operation
+from .profiling import RunProfile, profile_phase
+from .moves import DEFAULT_MOVE_WORKERS, move_files, print_move_results, print_move_throughput
+from .report import print_operation_summary
+from .scan import is_audio_file
+
+
+def count_audio_files(directory: Path) -> int:
+    """Count audio files in directory and all of its subdirectories."""
+    total = 0
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir():
+                    total += count_audio_files(Path(entry.path))
+                elif entry.is_file() and is_audio_file(entry.name):
+                    total += 1
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return total
+
+
+class AudioFileCounts:
+    """
+    In-memory count of the audio files under each directory a run touches.
+
+    Counts are seeded from the scanned structure and updated as each move
+    completes, so deciding whether a directory is empty never re-walks it.
+    Directories missing from the scan (e.g. when resuming without a rescan)
+    are counted once, on first use. Directories whose count drops to zero
+    are remembered and removed in a single bottom-up pass at the end.
+    """
+
+    def __init__(self, music_dir: Path, structure: Optional[Dict[str, Dict[str, List[str]]]] = None):
+        self.music_dir = music_dir
+        self.counts = {}
+        self.emptied = set()
+
+        for artist, albums in (structure or {}).items():
+            self.add_artist(artist, albums)
+
+    def add_artist(self, artist: str, albums: Dict[str, List[str]]):
+        """Seed the counts of one scanned artist folder and its albums."""
+        artist_total = 0
+        for album, tracks in albums.items():
+            self.counts[self.music_dir / artist / album] = len(tracks)
+            artist_total += len(tracks)
+        self.counts[self.music_dir / artist] = artist_total
+
+    def ancestors(self, directory: Path) -> List[Path]:
+        """Return directory and its parents, stopping below the music directory."""
+        chain = []
+        while directory != self.music_dir and self.music_dir in directory.parents:
+            chain.append(directory)
+            directory = directory.parent
+        return chain
+
+    def prepare(self, directory: Path):
+        """Make sure directory and its parents have a count before files leave them."""
+        for ancestor in self.ancestors(directory):
+            if ancestor not in self.counts:
+                self.counts[ancestor] = count_audio_files(ancestor)
+
+    def check_emptied(self, directory: Path):
+        """Schedule directory and its parents for removal if they hold no audio files."""
+        self.prepare(directory)
+        for ancestor in self.ancestors(directory):
+            if self.counts[ancestor] <= 0:
+                self.emptied.add(ancestor)
+
+    def moved(self, source_file: Path, target_file: Path):
+        """Record that an audio file moved from source_file to target_file."""
+        for ancestor in self.ancestors(source_file.parent):
+            self.counts[ancestor] = self.counts.get(ancestor, 1) - 1
+            if self.counts[ancestor] <= 0:
+                self.emptied.add(ancestor)
+
+        for ancestor in self.ancestors(target_file.parent):
+            self.counts[ancestor] = self.counts.get(ancestor, 0) + 1
+            self.emptied.discard(ancestor)
+
+    def remove_empty_directories(self, verbose: bool = True):
+        """
+        Remove every directory whose audio file count reached zero, deepest first.
+
+        rmdir only succeeds on directories that are really empty, so folders
+        still holding artwork or other non-audio files are left alone.
+        """
+        for directory in sorted(self.emptied, key=lambda d: len(d.parts), reverse=True):
+            try:
+                directory.rmdir()
+            except OSError:
+                # Directory might not be empty (non-audio files) or permission issue
+                continue
+            if verbose:
+                print(f"  🗑️  Removed empty directory: {directory}")
+        self.emptied.clear()
+
+
+def expand_operations(music_dir: Path, operations: List[Operation]) -> List[Dict]:
+    """
+    Turn planned operations into batches of concrete file moves.
+
+    Target directories are listed once, and names claimed by earlier batches
+    in this run are tracked, so a track is only scheduled if nothing will
+    occupy its target name by the time the batch runs.
+
+    Returns:
+        [{'messages': [...], 'moves': [(source_file, target_file)],
+          'indent': str, 'after': [...]}, ...]
+    """
+    batches = []
+    target_names = {}
+
+    def names_in(target_dir: Path) -> Set[str]:
+        if target_dir not in target_names:
+            try:
+                target_names[target_dir] = set(os.listdir(target_dir))
+            except FileNotFoundError:
+                target_names[target_dir] = set()
+        return target_names[target_dir]
+
+    for op in operations:
+        if op.type == 'merge_to_main':
+            source_dir = music_dir / op.source_artist / op.source_album
+            target_dir = music_dir / op.target_artist / op.target_album
+            existing = names_in(target_dir)
+
+            messages = [f"Moving tracks from {op.source_artist}/{op.source_album} to {op.target_artist}/{op.target_album}"]
+            moves = []
+            for track in op.tracks_to_move:
+                if track in existing:
+                    messages.append(f"  ⚠️  Skipping {track} - already exists in target")
+                else:
+                    existing.add(track)
+                    moves.append((source_dir / track, target_dir / track))
+
+            batches.append({
+                'messages': messages,
+                'moves': moves,
+                'indent': '  ',
+                'after': []
+            })
+
+        elif op.type == 'merge_to_various':
+            target_dir = music_dir / op.target_artist / op.target_album
+            existing = names_in(target_dir)
+
+            # Identical copies found by --content-hash stay where they are
+            leave_in_place = {copy for copies in op.duplicate_tracks for copy in copies[1:]}
+
+            messages = [f"Consolidating {op.target_album} to {op.target_artist}/"]
+            op_batches = []
+
+            for artist, album in op.source_locations:
+                source_dir = music_dir / artist / album
+
+                try:
+                    with os.scandir(source_dir) as it:
+                        track_names = sorted(entry.name for entry in it
+                                             if entry.is_file() and is_audio_file(entry.name))
+                except FileNotFoundError:
+                    continue
+
+                messages.append(f"  Moving from {artist}/{album}")
+                moves = []
+                for track in track_names:
+                    if (artist, album, track) in leave_in_place:
+                        messages.append(f"    🔁 Leaving {track} - identical copy is being moved")
+                    elif track in existing:
+                        messages.append(f"    ⚠️  Skipping {track} - already exists")
+                    else:
+                        existing.add(track)
+                        moves.append((source_dir / track, target_dir / track))
+
+                op_batches.append({
+                    'messages': messages,
+                    'moves': moves,
+                    'indent': '    ',
+                    'after': []
+                })
+                messages = []
+
+            if not op_batches:
+                op_batches.append({'messages': messages, 'moves': [], 'indent': '    ', 'after': []})
+            op_batches[-1]['after'].append('')
+            batches.extend(op_batches)
+
+    return batches
+
+
+def run_move_batches(music_dir: Path, batches: List[Dict], journal: Optional[OperationJournal],
+                     audio_counts: AudioFileCounts, move_workers: int, move_stats: Dict,
+                     move_ids: Optional[List[int]] = None):
+    """
+    Execute batches of moves, recording each completed move in the journal
+    and in audio_counts.
+
+    Move ids are assigned in batch order, matching the order the moves were
+    written with OperationJournal.start(), unless move_ids lists them
+    explicitly (as when resuming).
+    """
+    next_id = 0
+    position = 0
+
+    for batch in batches:
+        for line in batch['messages']:
+            print(line)
+
+        for directory in {target.parent for _, target in batch['moves']}:
+            directory.mkdir(parents=True, exist_ok=True)
+        for directory in {source.parent for source, _ in batch['moves']}:
+            audio_counts.prepare(directory)
+
+        results = move_files(batch['moves'], workers=move_workers, stats=move_stats)
+
+        for source_file, target_file, error in results:
+            if error is None:
+                audio_counts.moved(source_file, target_file)
+
+            if move_ids is not None:
+                move_id = move_ids[position]
+                position += 1
+            else:
+                move_id = next_id
+                next_id += 1
+            if journal is not None and error is None:
+                journal.append({'event': 'done', 'id': move_id})
+        if journal is not None:
+            journal.sync()
+
+        print_move_results(results, indent=batch['indent'])
+
+        for line in batch['after']:
+            print(line)
+
+
+def cleanup_emptied_directories(audio_counts: AudioFileCounts):
+    """Single cleanup pass over the directories this run left without audio files."""
+    print("🧹 Cleaning up emptied directories...")
+    audio_counts.remove_empty_directories(verbose=True)
+
+
+def execute_operations(music_dir: Path, operations: List[Operation], dry_run: bool = True,
+                       move_workers: int = DEFAULT_MOVE_WORKERS, journal_path: Optional[Path] = None,
+                       structure: Optional[Dict[str, Dict[str, List[str]]]] = None,
+                       profile: Optional[RunProfile] = None, journal: Optional[OperationJournal] = None):
+    """
+    Execute the consolidation operations.
+
+    structure is the scan the operations were planned from; it seeds the
+    per-directory audio file counts used to find emptied directories.
+    If journal_path is given, every planned move is written to the journal
+    before anything moves, so an interrupted run can be finished with
+    resume_operations() or reversed with undo_operations(). An already
+    started journal is appended to instead and left open, so watch mode
+    keeps every batch of a session in one journal. With profile, the moves
+    and the cleanup pass are timed as separate phases.
+    """
+    if dry_run:
+        print("\n🔍 DRY RUN MODE - No files will be moved\n")
+        with profile_phase(profile, 'report'):
+            print_operation_summary(operations, dry_run=True)
+        return
+
+    print("\n🚀 EXECUTING OPERATIONS\n")
+
+    batches = expand_operations(music_dir, operations)
+
+    moves = [move for batch in batches for move in batch['moves']]
+    move_ids = None
+    own_journal = journal is None and journal_path is not None
+    if own_journal:
+        journal = OperationJournal(journal_path, music_dir)
+        journal.start(moves)
+    elif journal is not None:
+        move_ids = journal.plan(moves)
+
+    move_stats = {}
+    audio_counts = AudioFileCounts(music_dir, structure)
+    with profile_phase(profile, 'move') as phase:
+        run_move_batches(music_dir, batches, journal, audio_counts, move_workers, move_stats,
+                         move_ids=move_ids)
+        phase['bytes_moved'] = phase.get('bytes_moved', 0) + move_stats.get('bytes', 0)
+
+    # Remove directories the moves left without audio files
+    with profile_phase(profile, 'cleanup'):
+        cleanup_emptied_directories(audio_counts)
+
+    if journal is not None:
+        journal.append({'event': 'end'})
+        if own_journal:
+            journal.close()
+        else:
+            journal.sync()
+
+    print()
+    print_move_throughput(move_stats)
+    print("\n✅ Consolidation complete!")
+
+
+def resume_operations(music_dir: Path, journal_path: Path, dry_run: bool = True,
+                      move_workers: int = DEFAULT_MOVE_WORKERS, profile: Optional[RunProfile] = None):
+    """
+    Replay the moves an interrupted run planned but never finished.
+
+    No rescan or replan happens. A move whose source is gone and whose target
+    exists completed before it could be journaled and is just marked done. If
+    both exist with the same size, a cross-device copy finished but the
+    source was never unlinked, so the source is removed.
+    """
+    journal = load_journal_for(music_dir, journal_path)
+    pending = [(move_id, music_dir / source, music_dir / target)
+               for move_id, (source, target) in sorted(journal['moves'].items())
+               if move_id not in journal['done']]
+
+    if not pending:
+        print("✅ Nothing to resume - every journaled move already finished")
+        return
+
+    print(f"\n{'🔍 DRY RUN - ' if dry_run else '🚀 '}Resuming {len(pending)} unfinished move(s) "
+          f"of {len(journal['moves'])} from {journal_path}\n")
+
+    if dry_run:
+        for _, source, target in pending:
+            print(f"  {source.relative_to(music_dir)} → {target.relative_to(music_dir)}")
+        return
+
+    ops_journal = OperationJournal(journal_path, music_dir)
+    ops_journal.reopen()
+
+    # Group consecutive moves between the same pair of directories
+    batches = []
+    move_ids = []
+    for move_id, source, target in pending:
+        if target.exists():
+            try:
+                source_size = source.stat().st_size
+            except FileNotFoundError:
+                ops_journal.append({'event': 'done', 'id': move_id})
+                continue
+            if source_size == target.stat().st_size:
+                source.unlink()
+                print(f"  ✅ Finished interrupted move of {source.name}")
+                ops_journal.append({'event': 'done', 'id': move_id})
+            else:
+                print(f"  ⚠️  Skipping {source.name} - a different file exists at {target.relative_to(music_dir)}")
+            continue
+
+        if not batches or batches[-1]['key'] != (source.parent, target.parent):
+            batches.append({
+                'key': (source.parent, target.parent),
+                'messages': [f"Moving tracks from {source.parent.relative_to(music_dir)} to {target.parent.relative_to(music_dir)}"],
+                'moves': [],
+                'indent': '  ',
+                'after': []
+            })
+        batches[-1]['moves'].append((source, target))
+        move_ids.append(move_id)
+    ops_journal.sync()
+
+    # Moves that finished before the interruption may have emptied directories
+    # the interrupted run never got to clean up
+    audio_counts = AudioFileCounts(music_dir)
+    for move_id in journal['done']:
+        audio_counts.check_emptied((music_dir / journal['moves'][move_id][0]).parent)
+
+    move_stats = {}
+    with profile_phase(profile, 'move') as phase:
+        run_move_batches(music_dir, batches, ops_journal, audio_counts, move_workers, move_stats,
+                         move_ids=move_ids)
+        phase['bytes_moved'] = phase.get('bytes_moved', 0) + move_stats.get('bytes', 0)
+    with profile_phase(profile, 'cleanup'):
+        cleanup_emptied_directories(audio_counts)
+
+    ops_journal.append({'event': 'end'})
+    ops_journal.close()
+
+    print()
+    print_move_throughput(move_stats)
+    print("\n✅ Resume complete!")
+
+
+def undo_operations(music_dir: Path, journal_path: Path, dry_run: bool = True,
+                    move_workers: int = DEFAULT_MOVE_WORKERS, profile: Optional[RunProfile] = None):
+    """Move every journaled track that was moved back to where it came from."""
+    journal = load_journal_for(music_dir, journal_path)
+    to_undo = [(move_id, music_dir / journal['moves'][move_id][1], music_dir / journal['moves'][move_id][0])
+               for move_id in sorted(journal['done'] - journal['undone'], reverse=True)]
+
+    if not to_undo:
+        print("✅ Nothing to undo")
+        return
+
+    if not journal['finished']:
+        print("⚠️  The journaled run did not finish; only its completed moves will be reversed\n")
+
+    print(f"\n{'🔍 DRY RUN - ' if dry_run else '⏪ '}Undoing {len(to_undo)} move(s) from {journal_path}\n")
+
+    if dry_run:
+        for _, current, original in to_undo:
+            print(f"  {current.relative_to(music_dir)} → {original.relative_to(music_dir)}")
+        return
+
+    ops_journal = OperationJournal(journal_path, music_dir)
+    ops_journal.reopen()
+
+    moves = []
+    for move_id, current, original in to_undo:
+        if original.exists():
+            print(f"  ⚠️  Skipping {original.name} - something already exists at {original.relative_to(music_dir)}")
+            continue
+        original.parent.mkdir(parents=True, exist_ok=True)
+        moves.append((move_id, current, original))
+
+    audio_counts = AudioFileCounts(music_dir)
+    for directory in {current.parent for _, current, _ in moves}:
+        audio_counts.prepare(directory)
+
+    move_stats = {}
+    with profile_phase(profile, 'move') as phase:
+        results = move_files([(current, original) for _, current, original in moves],
+                             workers=move_workers, stats=move_stats)
+        phase['bytes_moved'] = phase.get('bytes_moved', 0) + move_stats.get('bytes', 0)
+    for (move_id, _, _), (current, original, error) in zip(moves, results):
+        if error is None:
+            ops_journal.append({'event': 'undone', 'id': move_id})
+            audio_counts.moved(current, original)
+    ops_journal.close()
+
+    print_move_results(results)
+    with profile_phase(profile, 'cleanup'):
+        cleanup_emptied_directories(audio_counts)
+
+    print()
+    print_move_throughput(move_stats)
+    print("\n✅ Undo complete!")
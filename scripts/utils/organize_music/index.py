@@ -0,0 +1,128 @@
+"""Persistent SQLite library index used to skip unchanged artist folders."""
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Set
+
+from .scan import cache_file_path
+
+# Bump when the library index schema changes; older index files are rebuilt.
+INDEX_SCHEMA_VERSION = 2
+
+# Artist/album names and the music directory are stored as BLOBs of their
+# filesystem bytes (os.fsencode), so names that aren't valid UTF-8 (which
+# Python holds as surrogate-escaped str) can be bound and read back intact.
+INDEX_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS artists (
+        name BLOB PRIMARY KEY,
+        mtime_ns INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS albums (
+        artist BLOB NOT NULL,
+        name BLOB NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        tracks TEXT NOT NULL,
+        PRIMARY KEY (artist, name)
+    );
+    CREATE TABLE IF NOT EXISTS track_tags (
+        inode INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        tags TEXT NOT NULL,
+        PRIMARY KEY (inode, size, mtime_ns)
+    );
+'''
+
+
+def default_index_path(music_dir: Path) -> Path:
+    """Return the default library index location under the user's cache dir."""
+    return cache_file_path(music_dir, '.sqlite3')
+
+
+def open_library_index(index_path: Path) -> sqlite3.Connection:
+    """Open (creating if needed) the SQLite library index."""
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(index_path))
+    conn.executescript(INDEX_SCHEMA)
+
+    # Tables of an older schema are dropped rather than mixed with new rows
+    row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+    if row is not None and row[0] != str(INDEX_SCHEMA_VERSION):
+        with conn:
+            for table in ('meta', 'artists', 'albums', 'track_tags'):
+                conn.execute(f'DROP TABLE {table}')
+        conn.executescript(INDEX_SCHEMA)
+    return conn
+
+
+def load_library_index(conn: sqlite3.Connection, music_dir: Path) -> Dict:
+    """
+    Load the cached library snapshot from the index.
+
+    An index written for a different music directory or schema version is
+    treated as empty, which forces a full scan.
+
+    Returns:
+        {'root_mtime': ns or None, 'artists': {artist: artist_entry}}
+    """
+    snapshot = {'root_mtime': None, 'artists': {}}
+    meta = dict(conn.execute('SELECT key, value FROM meta'))
+
+    if (meta.get('schema_version') != str(INDEX_SCHEMA_VERSION)
+            or meta.get('music_dir') != os.fsencode(music_dir.resolve())):
+        return snapshot
+
+    snapshot['root_mtime'] = int(meta['root_mtime_ns']) if 'root_mtime_ns' in meta else None
+    artists = snapshot['artists']
+
+    for name, mtime_ns in conn.execute('SELECT name, mtime_ns FROM artists'):
+        artists[os.fsdecode(name)] = {'mtime': mtime_ns, 'albums': {}}
+
+    for artist, name, mtime_ns, tracks in conn.execute(
+            'SELECT artist, name, mtime_ns, tracks FROM albums'):
+        artist = os.fsdecode(artist)
+        if artist in artists:
+            artists[artist]['albums'][os.fsdecode(name)] = {'mtime': mtime_ns, 'tracks': json.loads(tracks)}
+
+    return snapshot
+
+
+def save_library_index(conn: sqlite3.Connection, music_dir: Path, snapshot: Dict,
+                       changed_artists: Set[str], removed_artists: Set[str], rebuild: bool = False):
+    """
+    Write changed and removed artists back to the index in one transaction.
+
+    A rebuild starts from empty artist and album tables, as its scan did not
+    compare against the index and so cannot name the artists that are gone.
+    """
+    with conn:
+        if rebuild:
+            conn.execute('DELETE FROM artists')
+            conn.execute('DELETE FROM albums')
+        conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', [
+            ('schema_version', str(INDEX_SCHEMA_VERSION)),
+            ('music_dir', os.fsencode(music_dir.resolve())),
+            ('root_mtime_ns', str(snapshot['root_mtime'])),
+        ])
+
+        for artist in removed_artists | changed_artists:
+            conn.execute('DELETE FROM artists WHERE name = ?', (os.fsencode(artist),))
+            conn.execute('DELETE FROM albums WHERE artist = ?', (os.fsencode(artist),))
+
+        for artist in changed_artists:
+            entry = snapshot['artists'][artist]
+            conn.execute('INSERT INTO artists (name, mtime_ns) VALUES (?, ?)',
+                         (os.fsencode(artist), entry['mtime']))
+            # Track lists are JSON with ASCII escapes, which round-trip surrogates
+            conn.executemany(
+                'INSERT INTO albums (artist, name, mtime_ns, tracks) VALUES (?, ?, ?, ?)',
+                [(os.fsencode(artist), os.fsencode(album), album_entry['mtime'],
+                  json.dumps(album_entry['tracks']))
+                 for album, album_entry in entry['albums'].items()]
+            )
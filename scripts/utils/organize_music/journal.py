@@ -0,0 +1,148 @@
+"""Append-only operation journal used by --resume and --undo."""
+
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .scan import cache_file_path
+
+# The operation journal is fsynced after every batch of moves, or sooner once
+# this many records are pending.
+JOURNAL_SYNC_EVERY = 64
+
+
+def default_journal_path(music_dir: Path) -> Path:
+    """Return the default operation journal location under the user's cache dir."""
+    return cache_file_path(music_dir, '.journal.ndjson')
+
+
+class OperationJournal:
+    """
+    Append-only NDJSON write-ahead log of the moves in one run.
+
+    Every planned move is written (and fsynced) before the first file is
+    touched; each completed move is then recorded as 'done' and later as
+    'undone' by --undo. Runs that plan in batches (--pipeline, --watch)
+    keep appending to one journal. Paths are stored relative to the music
+    directory.
+    """
+
+    def __init__(self, path: Path, music_dir: Path):
+        self.path = path
+        self.music_dir = music_dir
+        self.file = None
+        self.pending = 0
+        self.next_id = 0
+
+    def start(self, moves: List[Tuple[Path, Path]]):
+        """Start a new journal (replacing any previous run) with the planned moves."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.append({
+            'event': 'begin',
+            'music_dir': str(self.music_dir.resolve()),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'moves': len(moves)
+        })
+        self.plan(moves)
+
+    def plan(self, moves: List[Tuple[Path, Path]]) -> List[int]:
+        """
+        Journal more planned moves, numbered after the ones already written.
+
+        Pipelined runs plan batch by batch; each batch is fsynced here before
+        any of its files move.
+
+        Returns:
+            The ids assigned to moves, in order
+        """
+        move_ids = list(range(self.next_id, self.next_id + len(moves)))
+        for move_id, (source, target) in zip(move_ids, moves):
+            self.append({
+                'event': 'planned',
+                'id': move_id,
+                'source': str(source.relative_to(self.music_dir)),
+                'target': str(target.relative_to(self.music_dir))
+            })
+        self.next_id += len(moves)
+        self.sync()
+        return move_ids
+
+    def reopen(self, next_id: int = 0):
+        """Reopen an existing journal to append to it, numbering further planned moves from next_id."""
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.next_id = next_id
+
+    def append(self, record: Dict):
+        # ASCII escapes keep surrogate-escaped (non-UTF-8) filenames intact;
+        # json.loads turns them back into the same str
+        import json
+        self.file.write(json.dumps(record) + '\n')
+        self.pending += 1
+        if self.pending >= JOURNAL_SYNC_EVERY:
+            self.sync()
+
+    def sync(self):
+        if self.pending:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = 0
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+
+def read_journal(path: Path) -> Dict:
+    """
+    Read an operation journal.
+
+    A torn final line (the process died mid-write) is ignored. A journal
+    appended to batch by batch is finished only if its last planned moves
+    were followed by an 'end'.
+
+    Returns:
+        {'music_dir': str, 'moves': {id: (source, target)}, 'done': set of ids,
+         'undone': set of ids, 'finished': bool}
+    """
+    import json
+
+    journal = {'music_dir': None, 'moves': {}, 'done': set(), 'undone': set(), 'finished': False}
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+
+            event = record.get('event')
+            if event == 'begin':
+                journal['music_dir'] = record['music_dir']
+            elif event == 'planned':
+                journal['moves'][record['id']] = (record['source'], record['target'])
+                journal['finished'] = False
+            elif event == 'done':
+                journal['done'].add(record['id'])
+            elif event == 'undone':
+                journal['undone'].add(record['id'])
+            elif event == 'end':
+                journal['finished'] = True
+
+    return journal
+
+
+def load_journal_for(music_dir: Path, journal_path: Path) -> Dict:
+    """Read a journal and check it belongs to music_dir, exiting with an error otherwise."""
+    if not journal_path.exists():
+        print(f"❌ Error: No operation journal found: {journal_path}")
+        sys.exit(1)
+
+    journal = read_journal(journal_path)
+    if journal['music_dir'] != str(music_dir.resolve()):
+        print(f"❌ Error: Journal {journal_path} was written for {journal['music_dir']}, not {music_dir}")
+        sys.exit(1)
+
+    return journal
@@ -0,0 +1,180 @@
+"""Compact in-memory library: track names packed into one shared table."""
+
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from .scan import extract_track_number
+
+# Track number array markers: no leading number, or one too large to store
+NO_TRACK_NUMBER = -1
+UNSTORED_TRACK_NUMBER = -2
+MAX_STORED_TRACK_NUMBER = 2 ** 31 - 1
+
+
+class TrackTable:
+    """
+    Every track filename of a library, packed into a single UTF-8 buffer.
+
+    A track is an integer ID: its name is the slice of the buffer between
+    two offsets, and its leading track number is parsed once when it is
+    added. Compared to a str object per filename in a list per album, this
+    keeps a library of a million tracks in tens of MB instead of hundreds.
+
+    The table only grows; albums rescanned by --watch are appended again and
+    the space of their previous listing is not reclaimed.
+    """
+
+    __slots__ = ('_names', '_offsets', 'numbers')
+
+    def __init__(self):
+        self._names = bytearray()
+        self._offsets = array('Q', [0])
+        self.numbers = array('i')
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def add(self, tracks: Iterable[str]) -> range:
+        """Append track names, returning their (consecutive) IDs."""
+        start = len(self.numbers)
+        for track in tracks:
+            # surrogateescape round-trips filenames that aren't valid UTF-8
+            self._names += track.encode('utf-8', 'surrogateescape')
+            self._offsets.append(len(self._names))
+            number = extract_track_number(track)
+            if number is None:
+                number = NO_TRACK_NUMBER
+            elif number > MAX_STORED_TRACK_NUMBER:
+                number = UNSTORED_TRACK_NUMBER
+            self.numbers.append(number)
+        return range(start, len(self.numbers))
+
+    def encoded(self, track_id: int) -> bytes:
+        return bytes(self._names[self._offsets[track_id]:self._offsets[track_id + 1]])
+
+    def name(self, track_id: int) -> str:
+        return self.encoded(track_id).decode('utf-8', 'surrogateescape')
+
+    def number(self, track_id: int) -> Optional[int]:
+        number = self.numbers[track_id]
+        if number == NO_TRACK_NUMBER:
+            return None
+        if number == UNSTORED_TRACK_NUMBER:
+            return extract_track_number(self.name(track_id))
+        return number
+
+
+class TrackList(Sequence[str]):
+    """
+    A read-only list of track names backed by IDs in a TrackTable.
+
+    Albums are ranges of IDs; operations hold arrays of the IDs they move,
+    so neither copies a name. Names are only decoded when the list is
+    iterated or indexed, e.g. to print a plan, write JSON or move files.
+    """
+
+    __slots__ = ('table', 'ids')
+
+    def __init__(self, table: TrackTable, ids: Union[range, array]):
+        self.table = table
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TrackList(self.table, self.ids[index])
+        return self.table.name(self.ids[index])
+
+    def __iter__(self) -> Iterator[str]:
+        name = self.table.name
+        return (name(track_id) for track_id in self.ids)
+
+    def __contains__(self, track) -> bool:
+        if not isinstance(track, str):
+            return False
+        encoded = track.encode('utf-8', 'surrogateescape')
+        return any(self.table.encoded(track_id) == encoded for track_id in self.ids)
+
+    def __add__(self, other):
+        if isinstance(other, TrackList) and other.table is self.table:
+            return TrackList(self.table, array('I', self.ids) + array('I', other.ids))
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, tuple, TrackList)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def track_numbers(self) -> List[Optional[int]]:
+        """Leading track number of each track (None if unnumbered), without decoding names."""
+        number = self.table.number
+        return [number(track_id) for track_id in self.ids]
+
+    def take(self, indexes: Iterable[int]) -> 'TrackList':
+        """Return the tracks at the given positions, sharing this list's table."""
+        return TrackList(self.table, array('I', (self.ids[index] for index in indexes)))
+
+
+class Library(dict):
+    """
+    Scanned structure, {artist: {album: TrackList}}, with one shared TrackTable.
+
+    Behaves like the plain {artist: {album: [tracks]}} dict everywhere a
+    structure is accepted. Artist and album names are interned, so the copies
+    held by indexes and operations share one string per name.
+    """
+
+    def __init__(self, tracks: Optional[TrackTable] = None):
+        super().__init__()
+        self.tracks = tracks if tracks is not None else TrackTable()
+
+    def add_artist(self, artist: str, albums: Dict[str, Sequence[str]]) -> Dict[str, TrackList]:
+        """Store an artist's {album: [tracks]}, replacing any previous scan of it."""
+        compact = {sys.intern(album): (tracks if isinstance(tracks, TrackList) and tracks.table is self.tracks
+                                       else TrackList(self.tracks, self.tracks.add(tracks)))
+                   for album, tracks in albums.items()}
+        self[sys.intern(artist)] = compact
+        return compact
+
+
+def track_numbers(tracks: Sequence[str]) -> List[Optional[int]]:
+    """Leading track number of each track, read from the TrackTable when there is one."""
+    if isinstance(tracks, TrackList):
+        return tracks.track_numbers()
+    return [extract_track_number(track) for track in tracks]
+
+
+def take_tracks(tracks: Sequence[str], indexes: List[int]) -> Sequence[str]:
+    """Select tracks by position, as track IDs when tracks is a TrackList."""
+    if isinstance(tracks, TrackList):
+        return tracks.take(indexes)
+    return [tracks[index] for index in indexes]
+
+
+def unique_tracks(track_lists: List[Sequence[str]]) -> Sequence[str]:
+    """
+    Combine tracks from several albums: distinct names, sorted.
+
+    When every album is a TrackList of the same table, the result holds
+    the ID of each name's first occurrence rather than the names.
+    """
+    tables = {id(tracks.table) for tracks in track_lists if isinstance(tracks, TrackList)}
+    if len(tables) != 1 or not all(isinstance(tracks, TrackList) for tracks in track_lists):
+        return sorted({track for tracks in track_lists for track in tracks})
+
+    table = track_lists[0].table
+    first_id = {}
+    for tracks in track_lists:
+        for track_id in tracks.ids:
+            first_id.setdefault(table.encoded(track_id), track_id)
+    ordered = sorted(first_id.items(), key=lambda item: item[0].decode('utf-8', 'surrogateescape'))
+    return TrackList(table, array('I', (track_id for _, track_id in ordered)))
@@ -0,0 +1,247 @@
+"""Parallel file moves, including cross-device copies."""
+
+import errno
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional
+
+# Cross-device moves are copies over the network; a few in flight hide the
+# per-file latency without saturating the link.
+DEFAULT_MOVE_WORKERS = 4
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# errnos meaning "this in-kernel copy isn't supported here", not a real failure
+FAST_COPY_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+# renameat2() flag and errnos meaning "this filesystem can't honor it"
+RENAME_NOREPLACE = 1
+AT_FDCWD = -100
+NOREPLACE_FALLBACK_ERRNOS = {errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+_renameat2 = None
+
+
+def get_renameat2():
+    """Return libc's renameat2 (glibc 2.28+) through ctypes, or None where it is missing."""
+    global _renameat2
+    if _renameat2 is None:
+        _renameat2 = False
+        if sys.platform.startswith('linux'):
+            try:
+                import ctypes
+                function = ctypes.CDLL(None, use_errno=True).renameat2
+            except (ImportError, OSError, AttributeError):
+                return None
+            function.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+            function.restype = ctypes.c_int
+            _renameat2 = function
+    return _renameat2 or None
+
+
+def rename_no_replace(source: Path, target: Path):
+    """
+    Rename source to target, raising FileExistsError if target exists.
+
+    Target names are checked when the moves are planned, but a file can
+    appear there afterwards (another run, a sync client), and os.rename
+    would silently replace it. On Linux, renameat2(RENAME_NOREPLACE) makes
+    the check and the rename one atomic step. Where that isn't available
+    (other systems, filesystems that reject the flag) target is lstat'ed
+    right before os.rename instead.
+    """
+    renameat2 = get_renameat2()
+    if renameat2:
+        import ctypes
+        if renameat2(AT_FDCWD, os.fsencode(source), AT_FDCWD, os.fsencode(target), RENAME_NOREPLACE) == 0:
+            return
+        code = ctypes.get_errno()
+        if code not in NOREPLACE_FALLBACK_ERRNOS:
+            raise OSError(code, os.strerror(code), str(source), None, str(target))
+
+    if os.path.lexists(target):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(target))
+    os.rename(source, target)
+
+
+def copy_file_data(src_fd: int, dst_fd: int, size: int):
+    """
+    Copy size bytes between file descriptors, in-kernel where possible.
+
+    Tries os.copy_file_range, then os.sendfile (Linux only accepts a regular
+    file as the destination), then falls back to a plain read/write loop.
+    """
+    offset = 0
+
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while offset < size:
+                copied = os.copy_file_range(src_fd, dst_fd, size - offset)
+                if not copied:
+                    break
+                offset += copied
+        except OSError as e:
+            if e.errno not in FAST_COPY_FALLBACK_ERRNOS:
+                raise
+
+    if offset < size and sys.platform.startswith('linux'):
+        os.lseek(dst_fd, offset, os.SEEK_SET)
+        try:
+            while offset < size:
+                copied = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                if not copied:
+                    break
+                offset += copied
+        except OSError as e:
+            if e.errno not in FAST_COPY_FALLBACK_ERRNOS:
+                raise
+
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while True:
+        chunk = os.read(src_fd, COPY_CHUNK_BYTES)
+        if not chunk:
+            break
+        # os.write may write less than asked (signals, network filesystems)
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view):]
+
+
+def cross_device_move(source: Path, target: Path, size: int):
+    """
+    Move a file to another filesystem.
+
+    The data is copied to a hidden temporary file next to the target, fsynced
+    and renamed into place, and only then is the source unlinked, so an
+    interrupted move never leaves a truncated track under the real name.
+    An existing target is never replaced (see rename_no_replace).
+    """
+    import shutil
+
+    if os.path.lexists(target):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(target))
+    temp = target.with_name(f'.{target.name}.partial')
+    try:
+        with open(source, 'rb') as src, open(temp, 'wb') as dst:
+            copy_file_data(src.fileno(), dst.fileno(), size)
+            os.fsync(dst.fileno())
+        shutil.copystat(source, temp)
+        rename_no_replace(temp, target)
+    except BaseException:
+        try:
+            os.unlink(temp)
+        except OSError:
+            pass
+        raise
+    os.unlink(source)
+
+
+def move_files(moves: List[Tuple[Path, Path]], workers: int = DEFAULT_MOVE_WORKERS,
+               stats: Optional[Dict] = None) -> List[Tuple[Path, Path, Optional[OSError]]]:
+    """
+    Move a batch of files, renaming where possible.
+
+    Pairs whose source and target directory are on the same device are moved
+    with a single rename each. The rest are copied on a bounded thread
+    pool (see cross_device_move). A target that exists by the time its file
+    is moved is left alone and reported as a FileExistsError.
+
+    Args:
+        moves: (source_file, target_file) pairs; target directories must exist
+        workers: Maximum number of cross-device copies in flight
+        stats: Optional dict accumulating 'files', 'bytes', 'renamed',
+               'copied' and 'seconds'
+
+    Returns:
+        (source_file, target_file, error) for every pair, in input order;
+        error is None on success
+    """
+    started = time.perf_counter()
+    results = {}
+    renames = []
+    copies = []
+    target_devices = {}
+
+    for source, target in moves:
+        try:
+            source_stat = os.stat(source)
+            if target.parent not in target_devices:
+                target_devices[target.parent] = os.stat(target.parent).st_dev
+        except OSError as e:
+            results[(source, target)] = e
+            continue
+
+        if source_stat.st_dev == target_devices[target.parent]:
+            renames.append((source, target, source_stat.st_size))
+        else:
+            copies.append((source, target, source_stat.st_size))
+
+    moved_bytes = 0
+    renamed = 0
+
+    for source, target, size in renames:
+        try:
+            rename_no_replace(source, target)
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                # Same st_dev but a different mount (e.g. bind mounts)
+                copies.append((source, target, size))
+            else:
+                results[(source, target)] = e
+            continue
+        results[(source, target)] = None
+        moved_bytes += size
+        renamed += 1
+
+    def copy(move: Tuple[Path, Path, int]) -> Optional[OSError]:
+        try:
+            cross_device_move(*move)
+        except OSError as e:
+            return e
+        return None
+
+    copied = 0
+    if copies:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for (source, target, size), error in zip(copies, pool.map(copy, copies)):
+                results[(source, target)] = error
+                if error is None:
+                    moved_bytes += size
+                    copied += 1
+
+    if stats is not None:
+        stats['files'] = stats.get('files', 0) + renamed + copied
+        stats['bytes'] = stats.get('bytes', 0) + moved_bytes
+        stats['renamed'] = stats.get('renamed', 0) + renamed
+        stats['copied'] = stats.get('copied', 0) + copied
+        stats['seconds'] = stats.get('seconds', 0.0) + time.perf_counter() - started
+
+    return [(source, target, results[(source, target)]) for source, target in moves]
+
+
+def print_move_throughput(stats: Dict):
+    """Print files/s and MB/s for the moves performed in this run."""
+    files = stats.get('files', 0)
+    seconds = stats.get('seconds', 0.0)
+    megabytes = stats.get('bytes', 0) / (1024 * 1024)
+
+    print(f"📊 Moved {files} file(s), {megabytes:.1f} MB in {seconds:.2f}s "
+          f"({stats.get('renamed', 0)} renamed, {stats.get('copied', 0)} copied across devices)")
+    if seconds > 0:
+        print(f"   Throughput: {files / seconds:.1f} files/s, {megabytes / seconds:.1f} MB/s")
+
+
+def print_move_results(results: List[Tuple[Path, Path, Optional[OSError]]], indent: str = '  '):
+    """Print one line per attempted move."""
+    for source_file, _, error in results:
+        if error is None:
+            print(f"{indent}✅ Moved {source_file.name}")
+        elif isinstance(error, FileNotFoundError) and error.filename == str(source_file):
+            print(f"{indent}⚠️  {source_file.name} not found in source")
+        elif isinstance(error, FileExistsError):
+            print(f"{indent}⚠️  Skipping {source_file.name} - appeared in target since planning")
+        else:
+            print(f"{indent}❌ Failed to move {source_file.name}: {error}")
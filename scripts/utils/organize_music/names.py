@@ -0,0 +1,260 @@
+"""Artist and album name splitting, normalization and fuzzy matching."""
+
+import math
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterator, List, Set, Optional, Tuple
+
+# Multi-artist format: "Artist1 & Artist2" or "Artist1, Artist2 & Artist3"
+ARTIST_SEPARATOR_RE = re.compile(r'[,&]')
+
+# Name normalization for --fuzzy matching
+PUNCTUATION_RE = re.compile(r'[^\w\s]|_')
+NUMBER_RE = re.compile(r'\d+')
+FEATURING_RE = re.compile(r'\s+(?:feat\.?|ft\.?|featuring)\s+', re.IGNORECASE)
+EDITION_WORDS = (r'deluxe|edition|remaster(?:ed)?|expanded|anniversary|bonus tracks?|special|'
+                 r'explicit|clean|version|reissue|mono|stereo|super deluxe|collector\'?s')
+EDITION_SUFFIX_RE = re.compile(
+    rf'\s*[(\[{{][^)\]}}]*\b(?:{EDITION_WORDS})\b[^)\]}}]*[)\]}}]|\s+-\s+[^-]*\b(?:{EDITION_WORDS})\b[^-]*$',
+    re.IGNORECASE
+)
+DEFAULT_FUZZY_THRESHOLD = 0.9
+# Slack for float rounding in the similarity bounds, so they never exclude
+# a pair whose score lands exactly on the threshold
+SCORE_EPSILON = 1e-9
+
+
+def tag_key(value: str) -> str:
+    """Case- and whitespace-insensitive form of a tag value, for grouping."""
+    return ' '.join(value.casefold().split())
+
+
+def fold_text(text: str) -> str:
+    """Unicode-, case- and punctuation-insensitive form of a name ('Beyoncé & Jay-Z' -> 'beyonce and jay z')."""
+    text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    text = text.casefold().replace('&', ' and ')
+    return ' '.join(PUNCTUATION_RE.sub(' ', text).split())
+
+
+def normalize_album_name(name: str) -> str:
+    """Fold an album name and drop edition suffixes ('Album (Deluxe Edition)' -> 'album')."""
+    stripped = EDITION_SUFFIX_RE.sub(' ', unicodedata.normalize('NFC', name))
+    return fold_text(stripped) or fold_text(name)
+
+
+def split_normalized_artists(name: str) -> List[str]:
+    """Split an artist folder name on ',', '&' and 'feat.'/'ft.'/'featuring', folding each part."""
+    parts = [fold_text(part) for part in ARTIST_SEPARATOR_RE.split(FEATURING_RE.sub('&', name))]
+    return [part for part in parts if part]
+
+
+def name_similarity(a: str, b: str) -> float:
+    """
+    Score two normalized names between 0 and 1.
+
+    The score is the better of the plain and the sorted-token
+    difflib ratio. Names with different numbers ('Vol. 1' / 'Vol. 2') always
+    score 0. difflib's ratio depends on argument order, so the names are
+    compared in sorted order and the score is symmetric.
+    """
+    if a == b:
+        return 1.0
+    if a > b:
+        a, b = b, a
+    if NUMBER_RE.findall(a) != NUMBER_RE.findall(b):
+        return 0.0
+    return max(SequenceMatcher(None, a, b, autojunk=False).ratio(),
+               SequenceMatcher(None, ' '.join(sorted(a.split())), ' '.join(sorted(b.split())),
+                               autojunk=False).ratio())
+
+
+def numbered_grams(string: str, q: int) -> Set[str]:
+    """
+    The q-grams of string numbered by occurrence ('aaa', 1 -> {'a1', 'a2', 'a3'}).
+
+    Set intersections of numbered grams count repeated grams, and plain
+    strings (unlike tuples) cache their hash across intersections.
+    """
+    seen = {}
+    grams = set()
+    for k in range(len(string) - q + 1):
+        gram = string[k:k + q]
+        seen[gram] = count = seen.get(gram, 0) + 1
+        grams.add(f'{gram}{count}')
+    return grams
+
+
+def similar_candidates(strings: List[str], threshold: float) -> Iterator[Tuple[int, int]]:
+    """
+    Yield index pairs of strings that may have a difflib ratio >= threshold.
+
+    Every pair whose ratio (autojunk=False) reaches the threshold is yielded,
+    most others are not. The bounds follow from ratio = 2*M/T, where M is
+    the number of matched characters and T the combined length:
+
+    - M can't exceed the shorter string, which bounds the partner lengths.
+    - The two strings share at least M characters (difflib's quick_ratio).
+    - Padded with a space on each side, they match in M + 2 characters.
+      Consecutive matching blocks are separated by at least one unmatched
+      character, so there are at most T - 2*M + 1 blocks, and a block of n
+      characters holds n - 2 trigrams. The strings therefore share at least
+      5*M - 2*T trigrams.
+
+    Candidates come from prefix filtering on those overlaps: each string is
+    indexed under its rarest trigrams (or characters, when the trigram
+    bound is zero for some admissible partner: short strings, and every
+    string below a threshold of 0.8), enough of them that two strings
+    sharing the minimum overlap share an indexed one. All counts include
+    repeats. Strings are visited shortest first, so the postings are sorted
+    by length and strings too short to reach the threshold are skipped with
+    a bisect.
+    """
+    grams = [numbered_grams(f' {string} ', 3) for string in strings]
+    characters = [numbered_grams(string, 1) for string in strings]
+    gram_frequency = Counter(gram for string_grams in grams for gram in string_grams)
+    character_frequency = Counter(character for string_characters in characters
+                                  for character in string_characters)
+
+    def matched_needed(total: int) -> int:
+        return math.ceil(threshold * total / 2 - SCORE_EPSILON)
+
+    def may_match(i: int, j: int) -> bool:
+        total = len(strings[i]) + len(strings[j])
+        matched = matched_needed(total)
+        return (min(len(strings[i]), len(strings[j])) >= matched
+                and len(grams[i] & grams[j]) >= 5 * matched - 2 * total
+                and len(characters[i] & characters[j]) >= matched)
+
+    def shortest_partner(length: int) -> float:
+        return threshold * length / (2 - threshold) - SCORE_EPSILON
+
+    def prefix(tokens: Set, frequency: Counter, overlap: int) -> List:
+        return sorted(tokens, key=lambda token: (frequency[token], token))[:len(tokens) - overlap + 1]
+
+    def probe(index, tokens: List, shortest: float) -> Set[int]:
+        candidates = set()
+        for token in tokens:
+            postings, lengths = index[token]
+            candidates.update(postings[bisect_left(lengths, shortest):])
+        return candidates
+
+    def add(index, tokens: List, i: int):
+        for token in tokens:
+            postings, lengths = index[token]
+            postings.append(i)
+            lengths.append(len(strings[i]))
+
+    gram_index = defaultdict(lambda: ([], []))
+    character_index = defaultdict(lambda: ([], []))
+    # Strings indexed only by characters, which trigram-indexed strings look up
+    character_only_index = defaultdict(lambda: ([], []))
+    for i in sorted(range(len(strings)), key=lambda i: len(strings[i])):
+        length = len(strings[i])
+        shortest = shortest_partner(length)
+        totals = range(length + max(0, math.ceil(shortest)),
+                       length + math.floor(length * (2 - threshold) / threshold + SCORE_EPSILON) + 1)
+        gram_overlap = min((5 * matched_needed(total) - 2 * total for total in totals), default=0)
+        character_prefix = prefix(characters[i], character_frequency,
+                                  matched_needed(totals.start) if totals else 0)
+
+        if gram_overlap >= 1:
+            gram_prefix = prefix(grams[i], gram_frequency, gram_overlap)
+            candidates = (probe(gram_index, gram_prefix, shortest)
+                          | probe(character_only_index, character_prefix, shortest))
+            add(gram_index, gram_prefix, i)
+        else:
+            candidates = probe(character_index, character_prefix, shortest)
+            add(character_only_index, character_prefix, i)
+        add(character_index, character_prefix, i)
+
+        for j in candidates:
+            if may_match(i, j):
+                yield i, j
+
+
+def fuzzy_name_clusters(names: Set[str], threshold: float,
+                        normalize=normalize_album_name) -> Dict[str, str]:
+    """
+    Group names that are equal after normalization or score >= threshold.
+
+    Candidate pairs come from similar_candidates instead of comparing every
+    pair, run on the normalized names and on their sorted tokens, the two
+    strings name_similarity scores. Neither misses a pair that reaches the
+    threshold, so the clusters are the same as from scoring all pairs.
+
+    Returns:
+        {name: cluster_key} where names in one cluster share a key
+    """
+    by_normalized = defaultdict(list)
+    for name in names:
+        by_normalized[normalize(name)].append(name)
+    normalized = list(by_normalized)
+
+    parent = list(range(len(normalized)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int):
+        i, j = find(i), find(j)
+        if i != j:
+            parent[max(i, j)] = min(i, j)
+
+    sorted_tokens = [' '.join(sorted(name.split())) for name in normalized]
+    by_tokens = {}
+    for i, token_key in enumerate(sorted_tokens):
+        if token_key in by_tokens:
+            union(by_tokens[token_key], i)
+        else:
+            by_tokens[token_key] = i
+
+    forms = [normalized] if sorted_tokens == normalized else [normalized, sorted_tokens]
+    for strings in forms:
+        for i, j in similar_candidates(strings, threshold):
+            if find(i) != find(j) and name_similarity(normalized[i], normalized[j]) >= threshold:
+                union(i, j)
+
+    return {name: normalized[find(i)] for i, key in enumerate(normalized) for name in by_normalized[key]}
+
+
+def split_artists(multi_artist: str) -> List[str]:
+    """Split a multi-artist folder name into its individual artist names."""
+    return [p.strip() for p in ARTIST_SEPARATOR_RE.split(multi_artist)]
+
+
+def is_multi_artist(artist: str) -> bool:
+    """Check if an artist folder name credits more than one artist."""
+    return '&' in artist or ',' in artist
+
+
+def is_main_artist(main_artist: str, multi_artist: str) -> bool:
+    """
+    Check if main_artist is the primary artist in multi_artist.
+
+    Example:
+        is_main_artist("Tweaker", "Tweaker & David Sylvian") -> True
+        is_main_artist("David Sylvian", "Tweaker & David Sylvian") -> False
+    """
+    parts = split_artists(multi_artist)
+    return main_artist in parts and parts[0] == main_artist
+
+
+def find_main_artist(multi_artist: str, all_artists: Set[str]) -> Optional[str]:
+    """
+    Find the main artist folder for a multi-artist folder.
+
+    Returns the single-artist folder name if it exists, None otherwise.
+    """
+    parts = split_artists(multi_artist)
+
+    # Check if first part exists as a standalone artist
+    if parts[0] in all_artists:
+        return parts[0]
+
+    return None
@@ -0,0 +1,211 @@
+"""Pipelined mode (--pipeline): moves start while the rest of the library is still being scanned."""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Optional
+
+from .defaults import DEFAULT_PIPELINE_DEPTH
+from .execute import AudioFileCounts, cleanup_emptied_directories, expand_operations, run_move_batches
+from .journal import OperationJournal
+from .library import Library
+from .moves import DEFAULT_MOVE_WORKERS, print_move_throughput
+from .plan import Operation, build_main_artist_index, iter_consolidations
+from .profiling import RunProfile, profile_phase
+from .report import print_operation_summary
+from .scan import DEFAULT_SCAN_WORKERS, scan_artist_dir
+
+
+def iter_artist_scans(music_dir: Path, artist_names: List[str], workers: int = DEFAULT_SCAN_WORKERS,
+                      depth: int = DEFAULT_PIPELINE_DEPTH,
+                      stats: Optional[Dict] = None) -> Iterator[Tuple[str, Optional[Dict[str, List[str]]]]]:
+    """
+    Scan artist folders on a thread pool, yielding them as each one finishes.
+
+    At most workers + depth folders are being scanned or waiting to be
+    consumed at any time, so a slow consumer holds back the scan instead of
+    letting results pile up.
+
+    Yields:
+        (artist, {album: [tracks]}), with None for folders without audio albums
+    """
+    names = iter(artist_names)
+    dirs_read = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        in_flight = {}
+
+        def submit_next():
+            for name in names:
+                in_flight[pool.submit(scan_artist_dir, os.path.join(music_dir, name))] = name
+                return
+
+        for _ in range(max(1, workers) + depth):
+            submit_next()
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                artist = in_flight.pop(future)
+                submit_next()
+                entry, artist_dirs_read = future.result()
+                dirs_read += artist_dirs_read
+                albums = None
+                if entry is not None:
+                    albums = {album: album_entry['tracks']
+                              for album, album_entry in entry['albums'].items() if album_entry['tracks']}
+                yield artist, albums or None
+
+    if stats is not None:
+        stats['directories_read'] = dirs_read + 1
+
+
+def run_pipeline(music_dir: Path, dry_run: bool = True, scan_workers: int = DEFAULT_SCAN_WORKERS,
+                 move_workers: int = DEFAULT_MOVE_WORKERS, journal_path: Optional[Path] = None,
+                 depth: int = DEFAULT_PIPELINE_DEPTH, stats: Optional[Dict] = None,
+                 profile: Optional[RunProfile] = None) -> Tuple[Dict[str, Dict[str, List[str]]], List[Operation]]:
+    """
+    Scan, plan and execute with the three stages overlapped.
+
+    The top-level listing names every artist folder up front, so each main
+    artist's group (its folder plus its multi-artist folders, see
+    build_main_artist_index) is known before any album is listed. As soon as
+    every folder of a group has been scanned, its merge_to_main operations are
+    planned and handed to a mover thread through a bounded queue, so network
+    moves overlap the rest of the scan.
+
+    Compilations need the whole library, so the full scan is kept in memory
+    (peak memory is that of a regular run, not bounded by depth) and
+    merge_to_various operations are planned from it as a final stage, along with any
+    merge_to_main the group stage could not see. Every operation is planned
+    from the scanned (pre-move) state, as plan_consolidations would.
+
+    Args:
+        stats: Optional dict that receives 'seconds' (scan and group
+               planning), 'directories_read' and 'directories_cached'
+
+    Returns:
+        (structure, operations) - the scanned library and every operation
+        planned, for --watch to continue from
+    """
+    started = time.perf_counter()
+    with os.scandir(music_dir) as it:
+        artist_names = [entry.name for entry in it if entry.is_dir() and not entry.name.startswith('.')]
+
+    groups = build_main_artist_index(dict.fromkeys(artist_names))
+    group_of = {}
+    for main_artist, multi_artists in groups.items():
+        for artist in [main_artist, *multi_artists]:
+            group_of[artist] = main_artist
+    waiting = {main_artist: 1 + len(multi_artists) for main_artist, multi_artists in groups.items()}
+
+    structure = Library()
+    operations = []
+    planned_main_merges = set()
+    audio_counts = AudioFileCounts(music_dir)
+
+    journal = None
+    if not dry_run and journal_path is not None:
+        journal = OperationJournal(journal_path, music_dir)
+        journal.start([])
+
+    move_stats = {}
+    errors = []
+    work = queue.Queue(maxsize=max(1, depth))
+
+    def mover():
+        while True:
+            ops = work.get()
+            if ops is None:
+                return
+            if errors:
+                # Keep draining so the planner never blocks on a dead mover
+                continue
+            try:
+                batches = expand_operations(music_dir, ops)
+                move_ids = None
+                if journal is not None:
+                    move_ids = journal.plan([move for batch in batches for move in batch['moves']])
+                run_move_batches(music_dir, batches, journal, audio_counts, move_workers, move_stats,
+                                 move_ids=move_ids)
+            except BaseException as e:
+                errors.append(e)
+
+    def dispatch(ops: List[Operation]):
+        operations.extend(ops)
+        if ops and not dry_run:
+            work.put(ops)
+
+    if dry_run:
+        print("\n🔍 DRY RUN MODE - No files will be moved\n")
+    else:
+        print("\n🚀 EXECUTING OPERATIONS (pipelined)\n")
+        mover_thread = threading.Thread(target=mover, name='organize-music-mover', daemon=True)
+        mover_thread.start()
+
+    with profile_phase(profile, 'pipeline') as phase:
+        try:
+            for artist, albums in iter_artist_scans(music_dir, artist_names, workers=scan_workers,
+                                                    depth=depth, stats=stats):
+                if albums is not None:
+                    albums = structure.add_artist(artist, albums)
+                    audio_counts.add_artist(artist, albums)
+
+                main_artist = group_of.get(artist)
+                if main_artist is None:
+                    continue
+                waiting[main_artist] -= 1
+                if waiting[main_artist]:
+                    continue
+
+                # Every folder of this group is scanned: plan its merges now
+                members = [main_artist, *groups[main_artist]]
+                group_structure = {name: structure[name] for name in members if name in structure}
+                ops = [op for op in iter_consolidations(music_dir, group_structure)
+                       if op.type == 'merge_to_main']
+                planned_main_merges.update((op.source_artist, op.source_album) for op in ops)
+                dispatch(ops)
+
+            scan_seconds = time.perf_counter() - started
+            print(f"✅ Scanned {len(structure)} artist(s) with albums in {scan_seconds:.2f}s; "
+                  f"planning compilations")
+
+            # Final stage: compilations, planned from the whole library in listing order
+            ordered = Library(structure.tracks)
+            ordered.update((name, structure[name]) for name in artist_names if name in structure)
+            structure = ordered
+            dispatch([op for op in iter_consolidations(music_dir, structure)
+                      if op.type != 'merge_to_main'
+                      or (op.source_artist, op.source_album) not in planned_main_merges])
+        finally:
+            if not dry_run:
+                work.put(None)
+                mover_thread.join()
+        phase['bytes_moved'] = phase.get('bytes_moved', 0) + move_stats.get('bytes', 0)
+
+    if errors:
+        raise errors[0]
+
+    if stats is not None:
+        stats['seconds'] = scan_seconds
+        stats['directories_cached'] = 0
+
+    if dry_run:
+        print_operation_summary(operations, dry_run=True)
+        return structure, operations
+
+    # Remove directories the moves left without audio files
+    with profile_phase(profile, 'cleanup'):
+        cleanup_emptied_directories(audio_counts)
+
+    if journal is not None:
+        journal.append({'event': 'end'})
+        journal.close()
+
+    print()
+    print_move_throughput(move_stats)
+    print("\n✅ Consolidation complete!")
+    return structure, operations
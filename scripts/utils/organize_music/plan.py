@@ -0,0 +1,461 @@
+"""Consolidation planning: find split albums and describe the moves."""
+
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import ClassVar, Dict, Iterator, List, Sequence, Set, Tuple, Optional, Union
+
+from .content import DEFAULT_HASH_WORKERS, content_identities, group_tracks_by_content, match_tracks_by_content
+from .names import find_main_artist, fold_text, fuzzy_name_clusters, is_multi_artist, name_similarity, normalize_album_name, split_normalized_artists, tag_key
+from .library import take_tracks, track_numbers, unique_tracks
+
+
+@dataclass(slots=True)
+class MergeToMain:
+    """Move the tracks a main artist's album is missing out of a multi-artist folder."""
+    type: ClassVar[str] = 'merge_to_main'
+
+    source_artist: str
+    source_album: str
+    target_artist: str
+    target_album: str
+    tracks_to_move: Sequence[str]
+    source_tracks: Sequence[str]
+    target_tracks: Sequence[str]
+    will_be_complete: bool
+    track_numbers: Set
+    missing_tracks: List
+    # Groups of identical copies, [(artist, album, track), ...] (--content-hash)
+    duplicate_tracks: List[List[Tuple[str, str, str]]] = field(default_factory=list)
+    # track -> (disc, track number) across source and target (--tags)
+    track_positions: Optional[Dict[str, Tuple[int, int]]] = None
+    # Similarity of the source and target album names (--fuzzy)
+    match_score: Optional[float] = None
+
+    @property
+    def combined_tracks(self) -> List[str]:
+        """Tracks the target album will hold after the move."""
+        return sorted(set(self.target_tracks).union(self.tracks_to_move))
+
+
+@dataclass(slots=True)
+class MergeToVarious:
+    """Gather an album split across unrelated artists into one folder."""
+    type: ClassVar[str] = 'merge_to_various'
+
+    source_locations: List[Tuple[str, str]]
+    target_artist: str
+    target_album: str
+    all_tracks: Sequence[str]
+    will_be_complete: bool
+    track_numbers: Set
+    missing_tracks: List
+    duplicate_tracks: List[List[Tuple[str, str, str]]] = field(default_factory=list)
+    track_positions: Optional[Dict[str, Tuple[int, int]]] = None
+    # Lowest similarity of any source album name to the target's (--fuzzy)
+    match_score: Optional[float] = None
+
+
+Operation = Union[MergeToMain, MergeToVarious]
+
+
+def build_main_artist_index(structure: Dict[str, Dict[str, List[str]]],
+                            normalize: bool = False) -> Dict[str, List[str]]:
+    """
+    Index multi-artist folders by the main artist folder they belong to.
+
+    With normalize, artist names are compared after fold_text, 'feat.' and
+    'ft.' count as separators, and folders that only differ in case, accents
+    or Unicode normalization (NFC vs NFD from macOS) are indexed under the
+    spelling with the most albums.
+
+    Returns:
+        {main_artist: [multi_artist, ...]} for every multi-artist folder
+        whose leading artist also has a folder of its own
+    """
+    index = defaultdict(list)
+    if not normalize:
+        for artist in structure:
+            if is_multi_artist(artist):
+                main_artist = find_main_artist(artist, structure.keys())
+                if main_artist:
+                    index[main_artist].append(artist)
+        return dict(index)
+
+    spellings = defaultdict(list)
+    for artist in structure:
+        spellings[fold_text(artist)].append(artist)
+    canonical = {key: max(artists, key=lambda a: (len(structure[a]), a == unicodedata.normalize('NFC', a), a))
+                 for key, artists in spellings.items()}
+
+    for artist in structure:
+        parts = split_normalized_artists(artist)
+        if len(parts) > 1 and parts[0] in canonical:
+            index[canonical[parts[0]]].append(artist)
+        elif canonical[fold_text(artist)] != artist:
+            index[canonical[fold_text(artist)]].append(artist)
+    return dict(index)
+
+
+def build_album_index(structure: Dict[str, Dict[str, List[str]]]) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Index every album by name.
+
+    Returns:
+        {album_name: [(artist1, album_path), (artist2, album_path), ...]}
+    """
+    album_locations = defaultdict(list)
+
+    for artist, albums in structure.items():
+        for album_name in albums:
+            album_locations[album_name].append((artist, album_name))
+
+    return dict(album_locations)
+
+
+def build_album_identity_index(structure: Dict[str, Dict[str, List[str]]],
+                               album_identities: Dict[Tuple[str, str], Dict]) -> Dict[Tuple[str, Optional[str]], List[Tuple[str, str]]]:
+    """
+    Index every album folder by (album title, album artist) from its identity.
+
+    Folders whose titles match are one album unless their album artist tags
+    disagree (two different "Greatest Hits"); folders without an album
+    artist tag then stay on their own.
+
+    Returns:
+        {(title_key, album_artist_key or None): [(artist, album_folder), ...]}
+    """
+    by_title = defaultdict(list)
+    for artist, albums in structure.items():
+        for album in albums:
+            by_title[album_identities[(artist, album)]['title_key']].append((artist, album))
+
+    album_locations = {}
+    for title_key, locations in by_title.items():
+        album_artists = {tag_key(album_identities[location]['album_artist']) for location in locations
+                         if album_identities[location]['album_artist']}
+        if len(album_artists) <= 1:
+            album_locations[(title_key, next(iter(album_artists), None))] = locations
+            continue
+        for location in locations:
+            album_artist = album_identities[location]['album_artist']
+            key = (title_key, tag_key(album_artist) if album_artist else None)
+            album_locations.setdefault(key, []).append(location)
+
+    return album_locations
+
+
+def get_track_numbers(tracks: Sequence[str]) -> Set[int]:
+    """Extract all track numbers from a list of track filenames."""
+    return {num for num in track_numbers(tracks) if num is not None}
+
+
+def analyze_album_completeness(tracks: Sequence[str],
+                               positions: Optional[Dict[str, Tuple[int, int]]] = None) -> Tuple[bool, Set, List]:
+    """
+    Analyze if an album appears complete based on track numbering.
+
+    With positions ({track: (disc, track_number)}, from tags), gaps are
+    checked per disc, and missing tracks of a multi-disc album are reported
+    as 'disc-track' strings such as '2-05'.
+
+    Returns:
+        (is_complete, track_numbers_set, missing_tracks_list)
+    """
+    if positions is not None:
+        discs = defaultdict(set)
+        for track in tracks:
+            if track in positions:
+                disc, number = positions[track]
+                discs[disc].add(number)
+
+        if len(discs) > 1:
+            missing = [f"{disc}-{number:02d}" for disc in sorted(discs)
+                       for number in range(min(discs[disc]), max(discs[disc]) + 1)
+                       if number not in discs[disc]]
+            track_positions = {(disc, number) for disc, numbers in discs.items() for number in numbers}
+            return not missing, track_positions, missing
+
+        track_nums = next(iter(discs.values()), set())
+    else:
+        track_nums = get_track_numbers(tracks)
+
+    if not track_nums:
+        # No numbered tracks - assume complete
+        return True, track_nums, []
+
+    min_track = min(track_nums)
+    max_track = max(track_nums)
+
+    # Check for gaps
+    expected = set(range(min_track, max_track + 1))
+    missing = sorted(expected - track_nums)
+
+    # Consider complete if no gaps or only small gaps (might be intentional)
+    is_complete = len(missing) == 0
+
+    return is_complete, track_nums, missing
+
+
+def find_duplicate_albums(structure: Dict[str, Dict[str, List[str]]],
+                          album_index: Optional[Dict[str, List[Tuple[str, str]]]] = None) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Find albums that appear under multiple artists.
+
+    Returns:
+        {album_name: [(artist1, album_path), (artist2, album_path), ...]}
+    """
+    if album_index is None:
+        album_index = build_album_index(structure)
+
+    # Filter to only albums appearing under multiple artists
+    duplicates = {album: locations for album, locations in album_index.items()
+                  if len({artist for artist, _ in locations}) > 1}
+
+    return duplicates
+
+
+def plan_consolidations(music_dir: Path, structure: Dict[str, Dict[str, List[str]]],
+                        content_hash: bool = False, hash_workers: int = DEFAULT_HASH_WORKERS,
+                        hash_stats: Optional[Dict] = None,
+                        tags: Optional[Dict[Tuple[str, str, str], Dict]] = None,
+                        fuzzy_threshold: Optional[float] = None) -> List[Operation]:
+    """Plan what consolidations need to happen; see iter_consolidations."""
+    return list(iter_consolidations(music_dir, structure, content_hash=content_hash,
+                                    hash_workers=hash_workers, hash_stats=hash_stats, tags=tags,
+                                    fuzzy_threshold=fuzzy_threshold))
+
+
+def iter_consolidations(music_dir: Path, structure: Dict[str, Dict[str, List[str]]],
+                        content_hash: bool = False, hash_workers: int = DEFAULT_HASH_WORKERS,
+                        hash_stats: Optional[Dict] = None,
+                        tags: Optional[Dict[Tuple[str, str, str], Dict]] = None,
+                        fuzzy_threshold: Optional[float] = None) -> Iterator[Operation]:
+    """
+    Yield the consolidations that need to happen, one operation at a time.
+
+    By default a track counts as already present in the target when its
+    leading track number (or, for unnumbered tracks, its filename) matches.
+    With content_hash, tracks are compared by content instead, and identical
+    files are reported in each operation's duplicate_tracks.
+
+    With tags (see read_library_tags), album folders are matched by their
+    tagged album title rather than folder name, compilations are grouped by
+    (album artist, album) and go to the album artist's folder when it
+    exists, and tracks are compared and checked for completeness by
+    (disc, track number). Such operations carry track_positions.
+
+    With fuzzy_threshold, album titles are matched after normalization
+    (Unicode, case, punctuation, edition suffixes) and by similarity score
+    (see fuzzy_name_clusters), artist folders are matched as in
+    build_main_artist_index(normalize=True), and every operation carries the
+    match_score of its source and target album names.
+
+    Planning works from precomputed indexes (album name -> locations, main
+    artist -> multi-artist folders, albums already handled by a main-artist
+    merge), so it is roughly linear in the size of the library. All
+    merge_to_main operations for one main artist are yielded consecutively.
+
+    Yields MergeToMain / MergeToVarious operations, e.g.
+        MergeToMain(source_artist='Tweaker & David Sylvian',
+                    source_album='2 AM Wakeup Call',
+                    target_artist='Tweaker', target_album='2 AM Wakeup Call',
+                    tracks_to_move=['06 Pure Genius.flac'], ...)
+    """
+    album_identities = None
+    if tags is not None:
+        from .tags import album_tag_identities, album_track_positions
+        album_identities = album_tag_identities(structure, tags)
+    elif fuzzy_threshold is not None:
+        album_identities = {(artist, album): {'title': album, 'title_key': album, 'album_artist': None}
+                            for artist, albums in structure.items() for album in albums}
+
+    if fuzzy_threshold is not None:
+        clusters = fuzzy_name_clusters({identity['title'] for identity in album_identities.values()},
+                                       fuzzy_threshold)
+        for identity in album_identities.values():
+            identity['title_key'] = clusters[identity['title']]
+
+    if album_identities is None:
+        album_index = build_album_index(structure)
+    else:
+        album_index = build_album_identity_index(structure, album_identities)
+    main_artist_index = build_main_artist_index(structure, normalize=fuzzy_threshold is not None)
+    duplicate_albums = find_duplicate_albums(structure, album_index)
+
+    def album_title(artist: str, album: str) -> str:
+        return album if album_identities is None else album_identities[(artist, album)]['title_key']
+
+    def match_score(title: str, other_title: str) -> float:
+        return round(name_similarity(normalize_album_name(title), normalize_album_name(other_title)), 3)
+
+    def track_positions(artist: str, album: str, tracks: List[str]) -> Optional[Dict[str, Tuple[int, int]]]:
+        return None if tags is None else album_track_positions(tags, artist, album, tracks)
+
+    identities = None
+    if content_hash:
+        # Only albums present under more than one artist can be merged, so
+        # those are the only files that need a content identity.
+        groups = [[music_dir / artist / album / track
+                   for artist, album in locations for track in structure[artist][album]]
+                  for locations in duplicate_albums.values()]
+        identities = content_identities(groups, workers=hash_workers, stats=hash_stats)
+
+    # Album names merged by Case 1, so Case 2 can skip them in O(1)
+    handled_albums = set()
+    merged_artists = {artist for artists in main_artist_index.values() for artist in artists}
+
+    # Case 1: Multi-artist folders that have a main artist
+    for main_artist, multi_artists in main_artist_index.items():
+        main_albums = structure[main_artist]
+        main_album_by_title = {album_title(main_artist, album): album for album in main_albums}
+
+        for multi_artist in multi_artists:
+            # Check for overlapping albums
+            overlapping = [(album, main_album_by_title[album_title(multi_artist, album)])
+                           for album in structure[multi_artist]
+                           if album_title(multi_artist, album) in main_album_by_title]
+
+            for album_name, main_album in overlapping:
+                multi_tracks = structure[multi_artist][album_name]
+                main_tracks = main_albums[main_album]
+                main_positions = track_positions(main_artist, main_album, main_tracks)
+                multi_positions = track_positions(multi_artist, album_name, multi_tracks)
+
+                duplicate_tracks = []
+                if identities is not None:
+                    tracks_to_move, duplicate_tracks = match_tracks_by_content(
+                        music_dir, identities,
+                        multi_artist, album_name, multi_tracks, main_artist, main_album, main_tracks
+                    )
+                elif multi_positions is not None:
+                    # Compare (disc, track number) from tags; unnumbered tracks by filename
+                    taken = set(main_positions.values())
+                    tracks_to_move = [track for track in multi_tracks
+                                      if (multi_positions[track] not in taken if track in multi_positions
+                                          else track not in main_tracks)]
+                else:
+                    # Get track numbers
+                    main_nums = get_track_numbers(main_tracks)
+
+                    # Find tracks in multi-artist that aren't in main; unnumbered
+                    # tracks are checked by filename
+                    tracks_to_move = take_tracks(multi_tracks, [
+                        index for index, track_num in enumerate(track_numbers(multi_tracks))
+                        if (track_num not in main_nums if track_num else multi_tracks[index] not in main_tracks)
+                    ])
+
+                if tracks_to_move:
+                    # Check if result will be complete
+                    positions = None
+                    if main_positions is not None:
+                        positions = dict(main_positions)
+                        positions.update((track, multi_positions[track])
+                                         for track in tracks_to_move if track in multi_positions)
+                    will_be_complete, track_nums, missing_tracks = analyze_album_completeness(
+                        main_tracks + tracks_to_move, positions)
+
+                    score = None
+                    if fuzzy_threshold is not None:
+                        score = match_score(album_identities[(multi_artist, album_name)]['title'],
+                                            album_identities[(main_artist, main_album)]['title'])
+                    yield MergeToMain(
+                        source_artist=multi_artist,
+                        source_album=album_name,
+                        target_artist=main_artist,
+                        target_album=main_album,
+                        tracks_to_move=tracks_to_move,
+                        source_tracks=multi_tracks,
+                        target_tracks=main_tracks,
+                        will_be_complete=will_be_complete,
+                        track_numbers=track_nums,
+                        missing_tracks=missing_tracks,
+                        duplicate_tracks=duplicate_tracks,
+                        track_positions=positions,
+                        match_score=score
+                    )
+                    handled_albums.add(album_title(main_artist, main_album))
+
+    artist_by_key = {tag_key(artist): artist for artist in structure} if tags is not None else {}
+
+    # Case 2: Compilation albums (same album under multiple unrelated artists)
+    for album_key, locations in duplicate_albums.items():
+        album_name = album_key if album_identities is None else album_key[0]
+
+        # Skip if we already handled this in Case 1
+        if album_name in handled_albums and any(is_multi_artist(artist) or artist in merged_artists
+                                                for artist, _ in locations):
+            continue
+
+        # This is a compilation - consolidate to Various Artists
+        target_artist = 'Various Artists'
+        source_locations = [(loc[0], loc[1]) for loc in locations]
+        all_locations = source_locations
+
+        if album_identities is not None:
+            # Tagged with an album artist who has a folder: the album belongs there
+            album_artist = next((album_identities[location]['album_artist'] for location in locations
+                                 if album_identities[location]['album_artist']), None)
+            if album_artist and tag_key(album_artist) != tag_key(target_artist):
+                target_artist = artist_by_key.get(tag_key(album_artist), target_artist)
+
+            in_target = [location for location in locations if location[0] == target_artist]
+            if in_target:
+                album_name = in_target[0][1]
+            else:
+                # The folder name most locations (then most tracks) already use
+                folder_counts = Counter(album for _, album in locations)
+                track_counts = Counter()
+                for artist, album in locations:
+                    track_counts[album] += len(structure[artist][album])
+                album_name = min(folder_counts, key=lambda a: (-folder_counts[a], -track_counts[a], a))
+            source_locations = [location for location in locations if location[0] != target_artist]
+            all_locations = in_target + source_locations
+
+        duplicate_tracks = []
+        if identities is not None:
+            all_tracks, duplicate_tracks = group_tracks_by_content(
+                music_dir, identities, structure, all_locations
+            )
+        else:
+            # Collect all tracks from all locations
+            all_tracks = unique_tracks([structure[artist][album] for artist, album in all_locations])
+
+        positions = None
+        if tags is not None:
+            positions = {}
+            for artist, album in reversed(all_locations):
+                positions.update(track_positions(artist, album, structure[artist][album]))
+
+        will_be_complete, track_nums, missing_tracks = analyze_album_completeness(all_tracks, positions)
+
+        score = None
+        if fuzzy_threshold is not None:
+            target_title = album_identities[all_locations[0]]['title'] if in_target else album_name
+            score = min(match_score(album_identities[location]['title'], target_title)
+                        for location in all_locations)
+        yield MergeToVarious(
+            source_locations=source_locations,
+            target_artist=target_artist,
+            target_album=album_name,
+            all_tracks=all_tracks,
+            will_be_complete=will_be_complete,
+            track_numbers=track_nums,
+            missing_tracks=missing_tracks,
+            duplicate_tracks=duplicate_tracks,
+            track_positions=positions,
+            match_score=score
+        )
+
+
+def operation_artists(operations: List[Operation]) -> Set[str]:
+    """Return every artist folder an operation moves tracks out of or into."""
+    artists = set()
+    for op in operations:
+        artists.add(op.target_artist)
+        if op.type == 'merge_to_main':
+            artists.add(op.source_artist)
+        else:
+            artists.update(artist for artist, _ in op.source_locations)
+    return artists
@@ -0,0 +1,168 @@
+"""Per-phase wall/CPU time, filesystem call counts and bytes moved (--profile)."""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, Optional
+
+# Filesystem entry points counted during each phase. Calls made through
+# pathlib end up here too (Path.iterdir is os.listdir); stat calls made
+# internally by os.DirEntry do not.
+COUNTED_OS_CALLS = ['scandir', 'listdir', 'stat', 'lstat', 'rename', 'replace',
+                    'mkdir', 'rmdir', 'unlink', 'copy_file_range', 'sendfile']
+
+# Columns of the human-readable table: heading -> os calls summed into it
+TABLE_CALL_COLUMNS = {
+    'listdir': ('scandir', 'listdir'),
+    'stat': ('stat', 'lstat'),
+    'rename': ('rename', 'replace'),
+    'rmdir': ('rmdir',)
+}
+
+
+class FsCallCounter:
+    """Count calls to filesystem functions in the os module while active."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+        self.originals = {}
+        self.renameat2 = None
+
+    def install(self):
+        """Replace the counted os functions with counting wrappers."""
+        if self.originals:
+            return
+        self.originals = {name: getattr(os, name) for name in COUNTED_OS_CALLS if hasattr(os, name)}
+
+        def wrap(name, func):
+            def counted(*args, **kwargs):
+                with self.lock:
+                    self.counts[name] += 1
+                return func(*args, **kwargs)
+            return counted
+
+        for name, func in self.originals.items():
+            setattr(os, name, wrap(name, func))
+
+        # No-clobber renames call libc's renameat2 through ctypes, not os
+        from . import moves
+        self.renameat2 = moves.get_renameat2()
+        if self.renameat2:
+            moves._renameat2 = wrap('rename', self.renameat2)
+
+    def uninstall(self):
+        for name, func in self.originals.items():
+            setattr(os, name, func)
+        self.originals = {}
+        if self.renameat2:
+            from . import moves
+            moves._renameat2 = self.renameat2
+            self.renameat2 = None
+
+    @contextmanager
+    def active(self) -> Iterator[Counter]:
+        self.install()
+        try:
+            yield self.counts
+        finally:
+            self.uninstall()
+
+
+def cpu_seconds() -> float:
+    """CPU time of this process and its reaped children (the --content-hash pool)."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class RunProfile:
+    """
+    Accumulates timings for the phases of one run.
+
+    Filesystem calls are only counted between start() and stop(); phases
+    entered more than once add up.
+    """
+
+    def __init__(self):
+        self.counter = FsCallCounter()
+        self.phases = {}
+
+    def start(self):
+        self.counter.install()
+
+    def stop(self):
+        self.counter.uninstall()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[Dict]:
+        entry = self.phases.setdefault(name, {
+            'wall_seconds': 0.0,
+            'cpu_seconds': 0.0,
+            'fs_calls': {},
+            'bytes_moved': 0
+        })
+        with self.counter.lock:
+            calls_before = Counter(self.counter.counts)
+        cpu_started = cpu_seconds()
+        wall_started = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry['wall_seconds'] = round(entry['wall_seconds'] + time.perf_counter() - wall_started, 4)
+            entry['cpu_seconds'] = round(entry['cpu_seconds'] + cpu_seconds() - cpu_started, 4)
+            with self.counter.lock:
+                calls = self.counter.counts - calls_before
+            merged = Counter(entry['fs_calls'])
+            merged.update(calls)
+            entry['fs_calls'] = dict(sorted(merged.items()))
+
+    def to_json(self) -> Dict:
+        totals = Counter()
+        for entry in self.phases.values():
+            totals.update(entry['fs_calls'])
+        return {
+            'phases': self.phases,
+            'wall_seconds': round(sum(entry['wall_seconds'] for entry in self.phases.values()), 4),
+            'cpu_seconds': round(sum(entry['cpu_seconds'] for entry in self.phases.values()), 4),
+            'fs_calls': dict(sorted(totals.items())),
+            'bytes_moved': sum(entry['bytes_moved'] for entry in self.phases.values())
+        }
+
+    def print_table(self, out=None):
+        """Print one line per phase: times, the main filesystem calls and MB moved."""
+        out = out or sys.stdout
+        print("\n⏱️  Profile:", file=out)
+        header = f"   {'phase':<10} {'wall s':>8} {'cpu s':>8}"
+        header += ''.join(f" {column:>8}" for column in TABLE_CALL_COLUMNS)
+        print(header + f" {'MB moved':>9}", file=out)
+        for name, entry in self.phases.items():
+            line = f"   {name:<10} {entry['wall_seconds']:>8.3f} {entry['cpu_seconds']:>8.3f}"
+            line += ''.join(f" {sum(entry['fs_calls'].get(call, 0) for call in calls):>8}"
+                            for calls in TABLE_CALL_COLUMNS.values())
+            print(line + f" {entry['bytes_moved'] / (1024 * 1024):>9.1f}", file=out)
+
+
+def profile_phase(profile: Optional[RunProfile], name: str):
+    """profile.phase(name), or a no-op context when not profiling."""
+    return nullcontext({}) if profile is None else profile.phase(name)
+
+
+@contextmanager
+def cprofile_to(path: Optional[str]) -> Iterator[None]:
+    """Run the block under cProfile and dump the stats to path (a no-op when path is None)."""
+    if path is None:
+        yield
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
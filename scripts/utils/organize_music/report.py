@@ -0,0 +1,256 @@
+"""Human-readable and JSON/NDJSON rendering of a consolidation plan."""
+
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Optional
+
+from .plan import MergeToVarious, Operation, analyze_album_completeness
+
+
+def merged_track_positions(ops: List[Operation]) -> Optional[Dict[str, Tuple[int, int]]]:
+    """Combine the tag track positions of merge_to_main operations into one target album."""
+    if not any(op.track_positions is not None for op in ops):
+        return None
+    positions = {}
+    for op in ops:
+        positions.update(op.track_positions or {})
+    return positions
+
+
+def format_missing_tracks(missing_tracks: List) -> str:
+    """Format missing track numbers (ints, or 'disc-track' strings for multi-disc albums)."""
+    return ', '.join(f'{n:02d}' if isinstance(n, int) else n for n in missing_tracks)
+
+
+def print_operation_summary(operations: List[Operation], dry_run: bool = True):
+    """Print a concise summary with resulting file structure and missing tracks."""
+    if not operations:
+        print("✅ No consolidations needed - music library is already organized!")
+        return
+
+    print(f"\n{'DRY RUN - ' if dry_run else ''}Consolidation Plan ({len(operations)} operation(s)):\n")
+
+    merge_to_main = [op for op in operations if op.type == 'merge_to_main']
+    merge_to_various = [op for op in operations if op.type == 'merge_to_various']
+
+    # Group merge_to_main by target album
+    albums_by_target = defaultdict(list)
+    for op in merge_to_main:
+        key = (op.target_artist, op.target_album)
+        albums_by_target[key].append(op)
+
+    # Print main artist consolidations
+    if merge_to_main:
+        for (target_artist, target_album), ops in albums_by_target.items():
+            # Collect all tracks that will be in final album
+            all_final_tracks = set()
+            sources = []
+            duplicate_count = 0
+            for op in ops:
+                all_final_tracks.update(op.target_tracks)
+                all_final_tracks.update(op.tracks_to_move)
+                sources.append(f"{op.source_artist} ({len(op.tracks_to_move)} track(s))")
+                duplicate_count += len(op.duplicate_tracks)
+
+            # Recalculate completeness for the combined final album
+            final_tracks = sorted(all_final_tracks)
+            will_be_complete, _, missing_tracks = analyze_album_completeness(final_tracks,
+                                                                             merged_track_positions(ops))
+
+            print(f"{target_artist}/{target_album}")
+            print(f"  Sources: {', '.join(sources)}")
+            print(f"  Result: {len(final_tracks)} track(s)")
+            if duplicate_count:
+                print(f"  🔁 Identical content already in target: {duplicate_count} track(s)")
+            for op in ops:
+                if op.match_score is not None and op.source_album != target_album:
+                    print(f"  ≈ Matched {op.source_artist}/{op.source_album} (score {op.match_score:.2f})")
+
+            if missing_tracks:
+                print(f"  ⚠️  Missing tracks: {format_missing_tracks(missing_tracks)}")
+            elif will_be_complete:
+                print(f"  ✅ Complete")
+            print()
+
+    # Print compilation consolidations
+    if merge_to_various:
+        for op in merge_to_various:
+            source_artists = [loc[0] for loc in op.source_locations]
+            print(f"{op.target_artist}/{op.target_album}")
+            print(f"  Sources: {len(source_artists)} artist(s) ({', '.join(source_artists[:3])}{'...' if len(source_artists) > 3 else ''})")
+            print(f"  Result: {len(op.all_tracks)} track(s)")
+            if op.duplicate_tracks:
+                print(f"  🔁 Identical content in multiple sources: {len(op.duplicate_tracks)} track(s)")
+            renamed = sorted({album for _, album in op.source_locations if album != op.target_album})
+            if op.match_score is not None and renamed:
+                print(f"  ≈ Matched {', '.join(renamed)} (lowest score {op.match_score:.2f})")
+
+            if op.missing_tracks:
+                print(f"  ⚠️  Missing tracks: {format_missing_tracks(op.missing_tracks)}")
+            elif op.will_be_complete:
+                print(f"  ✅ Complete")
+            print()
+
+
+def duplicate_tracks_to_json(duplicate_tracks: List[List[Tuple[str, str, str]]]) -> List[List[str]]:
+    """Convert duplicate track groups to lists of 'artist/album/track' paths."""
+    return [['/'.join(copy) for copy in copies] for copies in duplicate_tracks]
+
+
+def main_artist_consolidation_to_json(target_artist: str, target_album: str, ops: List[Operation],
+                                      content_hash: bool = False) -> Dict:
+    """
+    Convert the merge_to_main operations into one target album to a JSON record.
+
+    duplicate_tracks is only included with content_hash, the only mode that finds them.
+    """
+    all_final_tracks = set()
+    sources = []
+    duplicate_tracks = []
+    for op in ops:
+        all_final_tracks.update(op.target_tracks)
+        all_final_tracks.update(op.tracks_to_move)
+        duplicate_tracks.extend(duplicate_tracks_to_json(op.duplicate_tracks))
+        source = {
+            'artist': op.source_artist,
+            'album': op.source_album,
+            'tracks_count': len(op.tracks_to_move),
+            'tracks': list(op.tracks_to_move)
+        }
+        if op.match_score is not None:
+            source['match_score'] = op.match_score
+        sources.append(source)
+
+    final_tracks = sorted(all_final_tracks)
+    will_be_complete, _, missing_tracks = analyze_album_completeness(final_tracks, merged_track_positions(ops))
+
+    record = {
+        'target_artist': target_artist,
+        'target_album': target_album,
+        'sources': sources,
+        'result_track_count': len(final_tracks),
+        'result_tracks': final_tracks,
+        'complete': will_be_complete,
+        'missing_tracks': missing_tracks
+    }
+    if content_hash:
+        record['duplicate_tracks'] = duplicate_tracks
+    return record
+
+
+def compilation_consolidation_to_json(op: MergeToVarious, content_hash: bool = False) -> Dict:
+    """Convert a merge_to_various operation to a JSON record (duplicate_tracks only with content_hash)."""
+    record = {
+        'target_artist': op.target_artist,
+        'target_album': op.target_album,
+        'sources': [{'artist': loc[0], 'album': loc[1]} for loc in op.source_locations],
+        'result_track_count': len(op.all_tracks),
+        'result_tracks': list(op.all_tracks),
+        'complete': op.will_be_complete,
+        'missing_tracks': op.missing_tracks
+    }
+    if content_hash:
+        record['duplicate_tracks'] = duplicate_tracks_to_json(op.duplicate_tracks)
+    if op.match_score is not None:
+        record['match_score'] = op.match_score
+    return record
+
+
+def operations_to_json(operations: List[Operation], music_dir: Path, content_hash: bool = False) -> Dict:
+    """
+    Convert operations to JSON-serializable format.
+
+    duplicate_tracks and their count are only reported with content_hash.
+
+    Returns:
+        Dictionary with operations, summary, and metadata
+    """
+    # Group merge_to_main by target album
+    albums_by_target = defaultdict(list)
+    for op in operations:
+        if op.type == 'merge_to_main':
+            albums_by_target[(op.target_artist, op.target_album)].append(op)
+
+    main_artist_ops = [main_artist_consolidation_to_json(target_artist, target_album, ops, content_hash)
+                       for (target_artist, target_album), ops in albums_by_target.items()]
+    compilation_ops = [compilation_consolidation_to_json(op, content_hash)
+                       for op in operations if op.type == 'merge_to_various']
+
+    result = {
+        'music_directory': str(music_dir),
+        'total_operations': len(operations),
+        'main_artist_consolidations': main_artist_ops,
+        'compilation_consolidations': compilation_ops
+    }
+    summary = {
+        'main_artist_count': len(main_artist_ops),
+        'compilation_count': len(compilation_ops),
+        'total_albums_affected': len(main_artist_ops) + len(compilation_ops)
+    }
+    if content_hash:
+        duplicate_tracks = [copies for consolidation in main_artist_ops + compilation_ops
+                            for copies in consolidation['duplicate_tracks']]
+        result['duplicate_tracks'] = duplicate_tracks
+        summary['duplicate_track_count'] = len(duplicate_tracks)
+    result['summary'] = summary
+    return result
+
+
+def write_ndjson_plan(operations: Iterator[Operation], music_dir: Path, out=None,
+                      content_hash: bool = False) -> Dict:
+    """
+    Write consolidations as newline-delimited JSON while they are planned.
+
+    Each consolidation is written (and flushed) as one
+    {"record": "main_artist_consolidation" | "compilation_consolidation", ...}
+    line with the same fields as the --json output. Only the operations of
+    the main artist currently being planned are held in memory, since
+    iter_consolidations yields those consecutively.
+
+    Returns:
+        Summary dictionary, for the caller to write as the final record
+    """
+    import json
+
+    out = out or sys.stdout
+    summary = {
+        'total_operations': 0,
+        'main_artist_count': 0,
+        'compilation_count': 0,
+        'total_albums_affected': 0
+    }
+    if content_hash:
+        summary['duplicate_track_count'] = 0
+
+    def emit(kind: str, consolidation: Dict):
+        summary[f'{kind}_count'] += 1
+        summary['total_albums_affected'] += 1
+        if content_hash:
+            summary['duplicate_track_count'] += len(consolidation['duplicate_tracks'])
+        out.write(json.dumps({'record': f'{kind}_consolidation', **consolidation}) + '\n')
+        out.flush()
+
+    # merge_to_main operations of the current main artist, by target album
+    pending_artist = None
+    pending = {}
+
+    def flush_pending():
+        for target_album, ops in pending.items():
+            emit('main_artist', main_artist_consolidation_to_json(pending_artist, target_album, ops,
+                                                                  content_hash))
+        pending.clear()
+
+    for op in operations:
+        summary['total_operations'] += 1
+        if op.type == 'merge_to_main':
+            if op.target_artist != pending_artist:
+                flush_pending()
+                pending_artist = op.target_artist
+            pending.setdefault(op.target_album, []).append(op)
+        else:
+            flush_pending()
+            emit('compilation', compilation_consolidation_to_json(op, content_hash))
+    flush_pending()
+
+    return {'music_directory': str(music_dir), **summary}
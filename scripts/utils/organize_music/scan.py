@@ -0,0 +1,177 @@
+"""Library scanning: walk the artist/album/track tree into a structure dict."""
+
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional
+
+
+AUDIO_EXTENSIONS = {'.flac', '.mp3', '.m4a', '.aac', '.wav'}
+
+TRACK_NUMBER_RE = re.compile(r'^(\d+)')
+
+# Directory listings on the NAS are latency-bound, so a modest pool of
+# threads keeps several round-trips in flight without hammering the share.
+DEFAULT_SCAN_WORKERS = 8
+
+
+def extract_track_number(filename: str) -> Optional[int]:
+    """Extract track number from filename (e.g., '01 Track.flac' -> 1)."""
+    match = TRACK_NUMBER_RE.match(filename)
+    if match:
+        return int(match.group(1))
+    return None
+
+
+def is_audio_file(filename: str) -> bool:
+    """Check if a filename has one of the supported audio extensions."""
+    return os.path.splitext(filename)[1].lower() in AUDIO_EXTENSIONS
+
+
+def scan_artist_dir(artist_path: str, cached: Optional[Dict] = None,
+                    track_mtimes: bool = False) -> Tuple[Optional[Dict], int]:
+    """
+    Scan a single artist directory with os.scandir.
+
+    DirEntry caches the file type reported by the directory listing, so
+    is_dir()/is_file() don't cost an extra stat round-trip per entry. When
+    track_mtimes is set, each directory is stat'ed and only re-listed if its
+    mtime differs from the cached index entry.
+
+    Args:
+        artist_path: Path to the artist directory
+        cached: Previous index entry for this artist (see load_library_index)
+        track_mtimes: Record directory mtimes for the library index
+
+    Returns:
+        (artist_entry, dirs_read) where artist_entry is
+        {'mtime': ns, 'albums': {album: {'mtime': ns, 'tracks': [...]}}},
+        or None if the directory disappeared during the scan
+    """
+    try:
+        mtime = os.stat(artist_path).st_mtime_ns if track_mtimes else None
+    except FileNotFoundError:
+        return None, 0
+
+    dirs_read = 0
+    cached_albums = cached['albums'] if cached else {}
+
+    if cached is not None and cached['mtime'] == mtime:
+        album_names = list(cached_albums)
+    else:
+        with os.scandir(artist_path) as it:
+            album_names = [entry.name for entry in it if entry.is_dir()]
+        dirs_read += 1
+
+    albums = {}
+    for album_name in album_names:
+        album_path = os.path.join(artist_path, album_name)
+        previous = cached_albums.get(album_name)
+
+        try:
+            album_mtime = os.stat(album_path).st_mtime_ns if track_mtimes else None
+            if previous is not None and previous['mtime'] == album_mtime:
+                tracks = previous['tracks']
+            else:
+                with os.scandir(album_path) as it:
+                    tracks = sorted(entry.name for entry in it
+                                    if entry.is_file() and is_audio_file(entry.name))
+                dirs_read += 1
+        except FileNotFoundError:
+            continue
+
+        albums[album_name] = {'mtime': album_mtime, 'tracks': tracks}
+
+    return {'mtime': mtime, 'albums': albums}, dirs_read
+
+
+def cache_file_path(music_dir: Path, suffix: str) -> Path:
+    """Return a per-library file under the user's cache dir (~/.cache/organize-music/)."""
+    cache_root = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache'))
+    digest = hashlib.sha1(os.fsencode(music_dir.resolve())).hexdigest()[:16]
+    return cache_root / 'organize-music' / f'{digest}{suffix}'
+
+
+def get_artists_and_albums(music_dir: Path, workers: int = DEFAULT_SCAN_WORKERS,
+                           stats: Optional[Dict] = None, index_path: Optional[Path] = None,
+                           rebuild_index: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Scan music directory and return structure: {artist: {album: [tracks]}}
+
+    Artist directories are scanned concurrently on a bounded thread pool. If
+    index_path is given, directories whose mtime matches the persistent index
+    are not re-listed and their contents come from the index instead.
+
+    Args:
+        music_dir: Root music directory
+        workers: Maximum number of artist directories scanned in parallel
+        stats: Optional dict that receives 'seconds', 'directories_read'
+               and 'directories_cached'
+        index_path: SQLite library index to read and update (None disables it)
+        rebuild_index: Ignore the existing index contents and rescan everything
+
+    Returns:
+        Library (a dict) mapping artist names to their albums and tracks
+    """
+    started = time.perf_counter()
+    use_index = index_path is not None
+
+    conn = None
+    previous = {'root_mtime': None, 'artists': {}}
+    if use_index:
+        from .index import load_library_index, open_library_index, save_library_index
+        conn = open_library_index(index_path)
+        if not rebuild_index:
+            previous = load_library_index(conn, music_dir)
+
+    root_mtime = os.stat(music_dir).st_mtime_ns if use_index else None
+    dirs_read = 0
+
+    if use_index and previous['root_mtime'] == root_mtime:
+        artist_names = list(previous['artists'])
+    else:
+        with os.scandir(music_dir) as it:
+            artist_names = [entry.name for entry in it
+                            if entry.is_dir() and not entry.name.startswith('.')]
+        dirs_read += 1
+
+    snapshot = {'root_mtime': root_mtime, 'artists': {}}
+    changed_artists = set()
+
+    def scan(artist_name: str) -> Tuple[Optional[Dict], int]:
+        return scan_artist_dir(os.path.join(music_dir, artist_name),
+                               previous['artists'].get(artist_name), use_index)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for artist_name, (entry, artist_dirs_read) in zip(artist_names, pool.map(scan, artist_names)):
+            if entry is None:
+                continue
+            snapshot['artists'][artist_name] = entry
+            dirs_read += artist_dirs_read
+            if artist_dirs_read or artist_name not in previous['artists']:
+                changed_artists.add(artist_name)
+
+    if conn is not None:
+        removed_artists = set(previous['artists']) - set(snapshot['artists'])
+        save_library_index(conn, music_dir, snapshot, changed_artists, removed_artists, rebuild=rebuild_index)
+        conn.close()
+
+    from .library import Library
+    structure = Library()
+    dirs_total = 1
+    for artist_name, entry in snapshot['artists'].items():
+        dirs_total += 1 + len(entry['albums'])
+        albums = {album: album_entry['tracks']
+                  for album, album_entry in entry['albums'].items() if album_entry['tracks']}
+        if albums:
+            structure.add_artist(artist_name, albums)
+
+    if stats is not None:
+        stats['seconds'] = time.perf_counter() - started
+        stats['directories_read'] = dirs_read
+        stats['directories_cached'] = max(0, dirs_total - dirs_read)
+
+    return structure
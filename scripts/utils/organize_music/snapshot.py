@@ -0,0 +1,115 @@
+"""Compressed library index written on the file server and planned from elsewhere."""
+
+import gzip
+import json
+import os
+import platform
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional
+
+from .library import Library
+
+SNAPSHOT_FORMAT = 'organize-music-index'
+SNAPSHOT_VERSION = 1
+
+
+def write_library_snapshot(path: str, music_dir: Path, structure: Dict[str, Dict[str, List[str]]],
+                           tags: Optional[Dict[Tuple[str, str, str], Dict]] = None) -> int:
+    """
+    Write the scanned structure (and tags, if read) as a gzip-compressed index.
+
+    Meant to run on the machine that hosts the library (--write-index), so one
+    local directory walk replaces the thousands of round-trips a client would
+    make over SMB/NFS. The payload is compact JSON, so `zcat FILE | jq` works.
+
+    Args:
+        path: File to write, or '-' for stdout
+        music_dir: Library root the structure was scanned from
+        structure: {artist: {album: [tracks]}} from get_artists_and_albums
+        tags: {(artist, album, track): tags} from read_library_tags
+
+    Returns:
+        Compressed size in bytes
+    """
+    snapshot = {
+        'format': SNAPSHOT_FORMAT,
+        'version': SNAPSHOT_VERSION,
+        'music_dir': str(music_dir),
+        'host': platform.node(),
+        'created': int(time.time()),
+        'structure': structure
+    }
+    if tags is not None:
+        nested_tags = {}
+        for (artist, album, track), track_tags in tags.items():
+            nested_tags.setdefault(artist, {}).setdefault(album, {})[track] = track_tags
+        snapshot['tags'] = nested_tags
+
+    # default=list writes the TrackList albums of a Library as arrays; ASCII
+    # escapes keep surrogate-escaped (non-UTF-8) names intact for json.loads
+    payload = json.dumps(snapshot, separators=(',', ':'), default=list).encode('ascii')
+    data = gzip.compress(payload, mtime=0)
+
+    if path == '-':
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+    else:
+        # Write next to the target and rename, so a reader never sees half an index
+        target = Path(path)
+        temp = target.with_name(f'.{target.name}.partial')
+        temp.write_bytes(data)
+        os.replace(temp, target)
+    return len(data)
+
+
+def read_library_snapshot(path: str) -> Dict:
+    """
+    Load an index written by write_library_snapshot, exiting with an error if it isn't one.
+
+    Args:
+        path: File to read, or '-' for stdin
+
+    Returns:
+        {'structure': {artist: {album: [tracks]}},
+         'tags': {(artist, album, track): tags} or None,
+         'music_dir': str, 'host': str, 'created': int}
+    """
+    try:
+        data = sys.stdin.buffer.read() if path == '-' else Path(path).read_bytes()
+    except OSError as e:
+        print(f"❌ Error: Cannot read index {path}: {e.strerror}")
+        sys.exit(1)
+
+    try:
+        snapshot = json.loads(gzip.decompress(data))
+    except (OSError, EOFError, ValueError, zlib.error):
+        snapshot = None
+    if not isinstance(snapshot, dict) or snapshot.get('format') != SNAPSHOT_FORMAT:
+        print(f"❌ Error: {path} is not an organize-music index (write one with --write-index)")
+        sys.exit(1)
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        print(f"❌ Error: Index {path} has version {snapshot.get('version')}, "
+              f"expected {SNAPSHOT_VERSION}; rewrite it with this version of organize-music")
+        sys.exit(1)
+
+    tags = None
+    if 'tags' in snapshot:
+        tags = {(artist, album, track): track_tags
+                for artist, albums in snapshot['tags'].items()
+                for album, tracks in albums.items()
+                for track, track_tags in tracks.items()}
+
+    structure = Library()
+    for artist, albums in snapshot.pop('structure').items():
+        structure.add_artist(artist, albums)
+
+    return {
+        'structure': structure,
+        'tags': tags,
+        'music_dir': snapshot['music_dir'],
+        'host': snapshot['host'],
+        'created': snapshot['created']
+    }
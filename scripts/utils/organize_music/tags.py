@@ -0,0 +1,358 @@
+"""Minimal FLAC/MP3/M4A tag readers and tag-based album identity."""
+
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Optional
+
+from .names import tag_key
+from .scan import DEFAULT_SCAN_WORKERS, TRACK_NUMBER_RE, extract_track_number
+
+# Tag headers are read in small pieces; frames or blocks bigger than these
+# (embedded artwork, lyrics) are skipped rather than read.
+TAG_FRAME_LIMIT = 64 * 1024
+TAG_BLOCK_LIMIT = 1024 * 1024
+# Read buffer for tag files. The default is st_blksize, often 1 MiB on
+# CIFS/NFS mounts, which would pull far more than the tag header
+TAG_READ_BUFFER = 8 * 1024
+VORBIS_TAG_FIELDS = {'ALBUM': 'album', 'ALBUMARTIST': 'album_artist', 'ALBUM ARTIST': 'album_artist',
+                     'ARTIST': 'artist', 'DISCNUMBER': 'disc', 'TRACKNUMBER': 'track'}
+ID3_TAG_FRAMES = {b'TALB': 'album', b'TPE2': 'album_artist', b'TPE1': 'artist', b'TPOS': 'disc', b'TRCK': 'track'}
+ID3V22_TAG_FRAMES = {b'TAL': 'album', b'TP2': 'album_artist', b'TP1': 'artist', b'TPA': 'disc', b'TRK': 'track'}
+ID3_TEXT_ENCODINGS = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}
+MP4_TAG_ATOMS = {b'\xa9alb': 'album', b'aART': 'album_artist', b'\xa9ART': 'artist', b'disk': 'disc', b'trkn': 'track'}
+
+
+def parse_tag_number(value: Optional[str]) -> Optional[int]:
+    """Parse a track or disc number tag such as '3' or '3/12'."""
+    if not value:
+        return None
+    match = TRACK_NUMBER_RE.match(value.strip())
+    return int(match.group(1)) if match else None
+
+
+def normalize_tags(fields: Dict[str, str]) -> Dict:
+    """Turn raw album/album_artist/artist/disc/track strings into the tag dict used by the planner."""
+    tags = {key: fields[key].strip() for key in ('album', 'album_artist', 'artist')
+            if fields.get(key, '').strip()}
+    for key in ('disc', 'track'):
+        number = parse_tag_number(fields.get(key))
+        if number is not None:
+            tags[key] = number
+    return tags
+
+
+def read_flac_tags(f) -> Optional[Dict[str, str]]:
+    """Read the VORBIS_COMMENT block of a FLAC file, seeking past every other block."""
+    if f.read(4) != b'fLaC':
+        return None
+
+    while True:
+        header = f.read(4)
+        if len(header) < 4:
+            return None
+        is_last = header[0] & 0x80
+        block_type = header[0] & 0x7F
+        length = int.from_bytes(header[1:4], 'big')
+
+        if block_type == 4:
+            if length > TAG_BLOCK_LIMIT:
+                return None
+            data = f.read(length)
+            break
+        if is_last:
+            return {}
+        f.seek(length, os.SEEK_CUR)
+
+    fields = {}
+    pos = 4 + int.from_bytes(data[0:4], 'little')
+    count = int.from_bytes(data[pos:pos + 4], 'little')
+    pos += 4
+    for _ in range(count):
+        # A truncated block can claim more comments than it holds
+        if pos + 4 > len(data):
+            break
+        length = int.from_bytes(data[pos:pos + 4], 'little')
+        pos += 4
+        key, sep, value = data[pos:pos + length].decode('utf-8', 'replace').partition('=')
+        pos += length
+        field = VORBIS_TAG_FIELDS.get(key.upper())
+        if sep and field:
+            fields.setdefault(field, value)
+    return fields
+
+
+def decode_id3_text(data: bytes) -> str:
+    """Decode an ID3v2 text frame, keeping only the first value."""
+    encoding = ID3_TEXT_ENCODINGS.get(data[0], 'latin-1') if data else 'latin-1'
+    return data[1:].decode(encoding, 'replace').split('\0')[0]
+
+
+def read_id3_tags(f) -> Optional[Dict[str, str]]:
+    """Read text frames from an ID3v2.2/2.3/2.4 tag, seeking past pictures and other frames."""
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b'ID3' or header[3] not in (2, 3, 4):
+        return None
+
+    def syncsafe(data: bytes) -> int:
+        return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+    major = header[3]
+    end = 10 + syncsafe(header[6:10])
+
+    if header[5] & 0x40 and major >= 3:
+        # Extended header: v2.4 counts its own size field, v2.3 doesn't
+        ext = f.read(4)
+        f.seek(syncsafe(ext) - 4 if major == 4 else int.from_bytes(ext, 'big'), os.SEEK_CUR)
+
+    frame_ids = ID3V22_TAG_FRAMES if major == 2 else ID3_TAG_FRAMES
+    header_size = 6 if major == 2 else 10
+    fields = {}
+
+    while f.tell() + header_size <= end and len(fields) < len(frame_ids):
+        frame = f.read(header_size)
+        if len(frame) < header_size:
+            # The file ends before the size the tag header declares
+            break
+        if major == 2:
+            frame_id, size, skip = frame[:3], int.from_bytes(frame[3:6], 'big'), False
+        else:
+            frame_id = frame[:4]
+            size = syncsafe(frame[4:8]) if major == 4 else int.from_bytes(frame[4:8], 'big')
+            # Compressed or encrypted frames aren't worth decoding for a few text fields
+            skip = bool(frame[9] & (0x0D if major == 4 else 0xC0))
+
+        if not frame_id.strip(b'\0') or size <= 0 or f.tell() + size > end:
+            break
+
+        field = frame_ids.get(frame_id)
+        if field and not skip and size <= TAG_FRAME_LIMIT:
+            fields.setdefault(field, decode_id3_text(f.read(size)))
+        else:
+            f.seek(size, os.SEEK_CUR)
+
+    return fields
+
+
+def iter_mp4_atoms(f, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (type, data_start, atom_end) for the atoms between start and end."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size = int.from_bytes(header[:4], 'big')
+        header_size = 8
+        if size == 1:
+            size = int.from_bytes(f.read(8), 'big')
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size or pos + size > end:
+            # Corrupt, or overflowing its parent (a truncated file)
+            return
+        yield header[4:8], pos + header_size, pos + size
+        pos += size
+
+
+def read_mp4_tags(f) -> Optional[Dict[str, str]]:
+    """Read iTunes metadata from moov/udta/meta/ilst, seeking past mdat and sample tables."""
+    start, end = 0, os.fstat(f.fileno()).st_size
+
+    for path_atom in (b'moov', b'udta', b'meta', b'ilst'):
+        for atom_type, data_start, atom_end in iter_mp4_atoms(f, start, end):
+            if atom_type == path_atom:
+                # meta is a "full" atom with 4 bytes of version and flags
+                start, end = (data_start + 4 if atom_type == b'meta' else data_start), atom_end
+                break
+        else:
+            return None if path_atom == b'moov' else {}
+
+    fields = {}
+    for item_type, item_start, item_end in iter_mp4_atoms(f, start, end):
+        field = MP4_TAG_ATOMS.get(item_type)
+        if not field or item_end - item_start > TAG_FRAME_LIMIT:
+            continue
+        f.seek(item_start)
+        data = f.read(item_end - item_start)
+        if data[4:8] != b'data':
+            continue
+        value = data[16:int.from_bytes(data[:4], 'big')]
+        if field in ('track', 'disc'):
+            # trkn/disk: 2 reserved bytes, number, total
+            fields[field] = str(int.from_bytes(value[2:4], 'big')) if len(value) >= 4 else ''
+        else:
+            fields[field] = value.decode('utf-8', 'replace')
+    return fields
+
+
+def read_track_tags(path: str) -> Optional[Dict]:
+    """
+    Read album, album artist, artist, disc and track number from a file's tag header.
+
+    Only the tag header is read, with small bounded reads (through a
+    TAG_READ_BUFFER-sized buffer) that seek past audio data and embedded
+    artwork.
+
+    Returns:
+        {'album': str, 'album_artist': str, 'artist': str, 'disc': int, 'track': int}
+        with missing fields left out, or None if the file has no readable tags
+    """
+    reader = TAG_READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        return None
+    try:
+        with open(path, 'rb', buffering=TAG_READ_BUFFER) as f:
+            fields = reader(f)
+    except (OSError, ValueError, IndexError):
+        return None
+    if fields is None:
+        return None
+    return normalize_tags(fields) or None
+
+
+TAG_READERS = {'.flac': read_flac_tags, '.mp3': read_id3_tags, '.aac': read_id3_tags, '.m4a': read_mp4_tags}
+
+
+def read_library_tags(music_dir: Path, structure: Dict[str, Dict[str, List[str]]],
+                      workers: int = DEFAULT_SCAN_WORKERS, index_path: Optional[Path] = None,
+                      rebuild_index: bool = False, prune: bool = True,
+                      stats: Optional[Dict] = None) -> Dict[Tuple[str, str, str], Dict]:
+    """
+    Read the tags of every track in structure on a bounded thread pool.
+
+    Tags are cached in the library index by (inode, size, mtime), so later
+    runs only stat each file, and files moved by a rename keep their entry.
+
+    Args:
+        prune: Drop cached entries for files not in structure (only correct
+               when structure is the whole library)
+        stats: Optional dict that receives 'seconds', 'files', 'cached',
+               'read' and 'tagged'
+
+    Returns:
+        {(artist, album, track): tags} for every track with readable tags
+    """
+    started = time.perf_counter()
+
+    conn = None
+    cached = {}
+    if index_path is not None:
+        from .index import open_library_index
+        conn = open_library_index(index_path)
+        if rebuild_index:
+            with conn:
+                conn.execute('DELETE FROM track_tags')
+        for inode, size, mtime_ns, tags in conn.execute(
+                'SELECT inode, size, mtime_ns, tags FROM track_tags'):
+            cached[(inode, size, mtime_ns)] = json.loads(tags)
+
+    tracks = [(artist, album, track) for artist, albums in structure.items()
+              for album, album_tracks in albums.items() for track in album_tracks]
+
+    def read(location: Tuple[str, str, str]) -> Tuple[Optional[Tuple[int, int, int]], Optional[Dict], bool]:
+        path = os.path.join(music_dir, *location)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None, None, False
+        key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if key in cached:
+            return key, cached[key], False
+        return key, read_track_tags(path), True
+
+    library_tags = {}
+    new_rows = []
+    seen = set()
+    read_count = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for location, (key, tags, was_read) in zip(tracks, pool.map(read, tracks)):
+            if key is None:
+                continue
+            seen.add(key)
+            if was_read:
+                read_count += 1
+                new_rows.append((*key, json.dumps(tags)))
+            if tags:
+                library_tags[location] = tags
+
+    if conn is not None:
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO track_tags (inode, size, mtime_ns, tags) VALUES (?, ?, ?, ?)',
+                             new_rows)
+            if prune:
+                conn.executemany('DELETE FROM track_tags WHERE inode = ? AND size = ? AND mtime_ns = ?',
+                                 [key for key in cached if key not in seen])
+        conn.close()
+
+    if stats is not None:
+        stats['seconds'] = time.perf_counter() - started
+        stats['files'] = len(tracks)
+        stats['cached'] = len(tracks) - read_count
+        stats['read'] = read_count
+        stats['tagged'] = len(library_tags)
+
+    return library_tags
+
+
+def majority_value(counts: Counter, total: int) -> Optional[str]:
+    """Return the most common value if more than half of total agree on it."""
+    if counts:
+        value, count = counts.most_common(1)[0]
+        if count * 2 > total:
+            return value
+    return None
+
+
+def album_tag_identities(structure: Dict[str, Dict[str, List[str]]],
+                         tags: Dict[Tuple[str, str, str], Dict]) -> Dict[Tuple[str, str], Dict]:
+    """
+    Work out what album each album folder holds, according to its tracks' tags.
+
+    An album folder takes the album title and album artist that most of its
+    tracks agree on; a folder without a majority title keeps its folder name.
+
+    Returns:
+        {(artist, album_folder): {'title': str, 'title_key': str, 'album_artist': str or None}}
+    """
+    identities = {}
+    for artist, albums in structure.items():
+        for album, tracks in albums.items():
+            titles = Counter()
+            album_artists = Counter()
+            for track in tracks:
+                track_tags = tags.get((artist, album, track))
+                if track_tags:
+                    if 'album' in track_tags:
+                        titles[track_tags['album']] += 1
+                    if 'album_artist' in track_tags:
+                        album_artists[track_tags['album_artist']] += 1
+
+            title = majority_value(titles, len(tracks)) or album
+            identities[(artist, album)] = {
+                'title': title,
+                'title_key': tag_key(title),
+                'album_artist': majority_value(album_artists, len(tracks))
+            }
+    return identities
+
+
+def album_track_positions(tags: Dict[Tuple[str, str, str], Dict], artist: str, album: str,
+                          tracks: List[str]) -> Dict[str, Tuple[int, int]]:
+    """
+    Map each numbered track to its (disc, track) position.
+
+    The tag numbers are used when present; otherwise the track number comes
+    from the filename and the disc defaults to 1.
+    """
+    positions = {}
+    for track in tracks:
+        track_tags = tags.get((artist, album, track), {})
+        number = track_tags.get('track') or extract_track_number(track)
+        if number:
+            positions[track] = (track_tags.get('disc') or 1, number)
+    return positions
@@ -0,0 +1,403 @@
+"""Watch mode: inotify or polling watchers and incremental replanning."""
+
+import os
+import select
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Set, Optional
+
+from .content import DEFAULT_HASH_WORKERS
+from .defaults import DEFAULT_POLL_INTERVAL, DEFAULT_WATCH_DEBOUNCE
+from .execute import execute_operations
+from .journal import OperationJournal, read_journal
+from .library import Library
+from .moves import DEFAULT_MOVE_WORKERS
+from .plan import operation_artists, plan_consolidations
+from .scan import DEFAULT_SCAN_WORKERS, scan_artist_dir
+
+# After an artist folder changes, the polling watcher also stats its album
+# folders for this long, to catch tracks still arriving in existing albums.
+HOT_ALBUM_SECONDS = 600
+NETWORK_FILESYSTEMS = {'cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'afpfs', 'fuse.sshfs', 'webdav'}
+
+
+class InotifyWatcher:
+    """
+    Report changed artist folders using Linux inotify (via ctypes).
+
+    inotify isn't recursive, so the root, every artist folder and every album
+    folder get a watch; folders created later are added as they appear.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR)
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, music_dir: Path):
+        import ctypes.util
+
+        self.music_dir = music_dir
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}
+        self.add_tree(music_dir)
+
+    def add_watch(self, directory: Path):
+        import ctypes
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {directory}')
+        self.watches[wd] = directory
+
+    def add_tree(self, directory: Path):
+        """Watch directory and its subfolders down to album depth."""
+        depth = len(directory.relative_to(self.music_dir).parts)
+        self.add_watch(directory)
+        if depth >= 2:
+            return
+        try:
+            with os.scandir(directory) as it:
+                subdirs = [Path(entry.path) for entry in it
+                           if entry.is_dir() and not entry.name.startswith('.')]
+        except FileNotFoundError:
+            return
+        for subdir in subdirs:
+            self.add_tree(subdir)
+
+    def all_artists(self) -> Set[str]:
+        with os.scandir(self.music_dir) as it:
+            return {entry.name for entry in it if entry.is_dir() and not entry.name.startswith('.')}
+
+    def poll(self, timeout: float) -> Set[str]:
+        """Wait up to timeout seconds and return the artist folders that changed."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(buffer, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                # Events were dropped; treat every artist as changed
+                return self.all_artists()
+            if mask & self.IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            path = directory / name if name else directory
+            parts = path.relative_to(self.music_dir).parts
+            if not parts or parts[0].startswith('.'):
+                continue
+            changed.add(parts[0])
+
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO) and len(parts) <= 2:
+                try:
+                    self.add_tree(path)
+                except OSError:
+                    pass
+
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Report changed artist folders by polling directory mtimes.
+
+    Each poll stats the root and every artist folder. Adding or removing an
+    album changes its artist folder's mtime; tracks arriving in an existing
+    album only change the album's mtime, so albums of recently changed
+    artists stay on the stat list for HOT_ALBUM_SECONDS.
+    """
+
+    def __init__(self, music_dir: Path, interval: float = DEFAULT_POLL_INTERVAL,
+                 workers: int = DEFAULT_SCAN_WORKERS):
+        self.music_dir = music_dir
+        self.interval = interval
+        self.workers = workers
+        self.root_mtime = None
+        self.artist_mtimes = {}
+        self.hot_albums = {}
+        self.next_poll = time.monotonic() + interval
+        self.check()
+
+    @staticmethod
+    def mtime(path: Path) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def list_artists(self) -> Set[str]:
+        with os.scandir(self.music_dir) as it:
+            return {entry.name for entry in it if entry.is_dir() and not entry.name.startswith('.')}
+
+    def heat_albums(self, artist: str):
+        """Start watching the album folders of an artist that just changed."""
+        expires = time.monotonic() + HOT_ALBUM_SECONDS
+        try:
+            with os.scandir(self.music_dir / artist) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        album_dir = Path(entry.path)
+                        self.hot_albums[album_dir] = (self.mtime(album_dir), expires)
+        except OSError:
+            pass
+
+    def check(self) -> Set[str]:
+        changed = set()
+
+        root_mtime = self.mtime(self.music_dir)
+        if root_mtime != self.root_mtime:
+            artists = self.list_artists()
+            changed |= (artists ^ set(self.artist_mtimes)) if self.root_mtime is not None else set()
+            for artist in set(self.artist_mtimes) - artists:
+                del self.artist_mtimes[artist]
+            for artist in artists - set(self.artist_mtimes):
+                self.artist_mtimes[artist] = None
+            self.root_mtime = root_mtime
+
+        now = time.monotonic()
+        for album_dir in [d for d, (_, expires) in self.hot_albums.items() if expires < now]:
+            del self.hot_albums[album_dir]
+
+        artists = list(self.artist_mtimes)
+        hot_albums = list(self.hot_albums)
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            artist_mtimes = list(pool.map(lambda a: self.mtime(self.music_dir / a), artists))
+            album_mtimes = list(pool.map(self.mtime, hot_albums))
+
+        for artist, mtime in zip(artists, artist_mtimes):
+            previous = self.artist_mtimes[artist]
+            self.artist_mtimes[artist] = mtime
+            if previous is not None and mtime != previous:
+                changed.add(artist)
+
+        for album_dir, mtime in zip(hot_albums, album_mtimes):
+            previous, expires = self.hot_albums[album_dir]
+            self.hot_albums[album_dir] = (mtime, expires)
+            if mtime != previous:
+                changed.add(album_dir.parent.name)
+
+        for artist in changed:
+            self.heat_albums(artist)
+
+        return changed
+
+    def poll(self, timeout: float) -> Set[str]:
+        """Wait up to timeout seconds and return the artist folders that changed."""
+        wait = self.next_poll - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        if wait > 0:
+            time.sleep(wait)
+        self.next_poll = time.monotonic() + self.interval
+        return self.check()
+
+    def close(self):
+        pass
+
+
+def is_network_mount(path: Path) -> bool:
+    """Best-effort check (Linux /proc/mounts) whether path lives on a network filesystem."""
+    try:
+        with open('/proc/mounts') as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return False
+
+    resolved = str(path.resolve())
+    best, fstype = '', None
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        if (resolved == mount_point or resolved.startswith(mount_point.rstrip('/') + '/')) \
+                and len(mount_point) > len(best):
+            best, fstype = mount_point, mount_type
+    return fstype in NETWORK_FILESYSTEMS
+
+
+def refresh_artists(music_dir: Path, structure: Dict[str, Dict[str, List[str]]],
+                    album_artists: Dict[str, Set[str]], artists: Set[str],
+                    workers: int = DEFAULT_SCAN_WORKERS) -> Set[str]:
+    """
+    Rescan the given artist folders and update structure and album_artists in place.
+
+    Returns:
+        Names of every album that was or is now under one of those artists
+    """
+    def scan(artist: str) -> Optional[Dict]:
+        if artist.startswith('.') or not (music_dir / artist).is_dir():
+            return None
+        try:
+            return scan_artist_dir(str(music_dir / artist))[0]
+        except FileNotFoundError:
+            return None
+
+    artists = sorted(artists)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        entries = list(pool.map(scan, artists))
+
+    affected = set()
+    for artist, entry in zip(artists, entries):
+        for album in structure.pop(artist, {}):
+            affected.add(album)
+            album_artists[album].discard(artist)
+            if not album_artists[album]:
+                del album_artists[album]
+
+        albums = {album: album_entry['tracks'] for album, album_entry in (entry or {'albums': {}})['albums'].items()
+                  if album_entry['tracks']}
+        if albums:
+            if isinstance(structure, Library):
+                albums = structure.add_artist(artist, albums)
+            else:
+                structure[artist] = albums
+        for album in albums:
+            affected.add(album)
+            album_artists.setdefault(album, set()).add(artist)
+
+    return affected
+
+
+def watch_library(music_dir: Path, structure: Dict[str, Dict[str, List[str]]], dry_run: bool = True,
+                  use_polling: bool = False, debounce: float = DEFAULT_WATCH_DEBOUNCE,
+                  poll_interval: float = DEFAULT_POLL_INTERVAL, scan_workers: int = DEFAULT_SCAN_WORKERS,
+                  move_workers: int = DEFAULT_MOVE_WORKERS, journal_path: Optional[Path] = None,
+                  content_hash: bool = False, hash_workers: int = DEFAULT_HASH_WORKERS,
+                  tags: bool = False, index_path: Optional[Path] = None,
+                  fuzzy_threshold: Optional[float] = None, journal_started: bool = False):
+    """
+    Watch the library and consolidate albums as they land.
+
+    structure is kept in memory. When events stop arriving for `debounce`
+    seconds, only the changed artist folders are rescanned, and planning runs
+    only over the albums those folders hold (plus every other location of
+    the same album names), never the full tree.
+
+    With tags or fuzzy_threshold, albums are matched by tagged or
+    normalized title, which folder names can't predict, so the whole
+    in-memory structure is replanned (still without rescanning it). Tags
+    are kept in memory too and reread only for the changed folders.
+
+    Every batch is appended to one journal at journal_path, so --undo
+    reverses the whole session. With journal_started, it already holds the
+    initial run's moves and the batches continue it.
+    """
+    album_artists = {}
+    for artist, albums in structure.items():
+        for album in albums:
+            album_artists.setdefault(album, set()).add(artist)
+
+    watcher = None
+    if not use_polling and sys.platform.startswith('linux') and not is_network_mount(music_dir):
+        try:
+            watcher = InotifyWatcher(music_dir)
+            print(f"👀 Watching {music_dir} with inotify ({len(watcher.watches)} folder(s))")
+        except (OSError, AttributeError) as e:
+            print(f"⚠️  inotify unavailable ({e}); falling back to polling")
+    if watcher is None:
+        watcher = PollingWatcher(music_dir, interval=poll_interval, workers=scan_workers)
+        print(f"👀 Watching {music_dir} by polling every {poll_interval:g}s")
+    print(f"   Changes are processed after {debounce:g}s without new events. Press Ctrl-C to stop.\n")
+
+    # Folder names identify albums only without --tags and --fuzzy
+    replan_all = tags or fuzzy_threshold is not None
+    library_tags = None
+    if tags:
+        from .tags import read_library_tags
+        library_tags = read_library_tags(music_dir, structure, workers=scan_workers,
+                                         index_path=index_path, prune=False)
+
+    def reread_tags(artists: Set[str]):
+        nonlocal library_tags
+        library_tags = {key: value for key, value in library_tags.items() if key[0] not in artists}
+        changed = {artist: structure[artist] for artist in artists if artist in structure}
+        library_tags.update(read_library_tags(music_dir, changed, workers=scan_workers,
+                                              index_path=index_path, prune=False))
+
+    pending = set()
+    last_event = 0.0
+    # One journal for the whole session, so --undo reverses every batch
+    journal = None
+
+    try:
+        while True:
+            timeout = debounce if not pending else max(0.0, last_event + debounce - time.monotonic())
+            changed = watcher.poll(max(timeout, 0.1))
+            if changed:
+                pending |= changed
+                last_event = time.monotonic()
+                continue
+            if not pending or time.monotonic() - last_event < debounce:
+                continue
+
+            artists, pending = pending, set()
+            affected = refresh_artists(music_dir, structure, album_artists, artists, workers=scan_workers)
+
+            if replan_all:
+                sub_structure = structure
+            else:
+                # Planning only needs the affected album names, wherever they live
+                sub_structure = {}
+                for album in affected:
+                    for artist in album_artists.get(album, ()):
+                        sub_structure.setdefault(artist, {})[album] = structure[artist][album]
+
+            if tags:
+                reread_tags(artists)
+            operations = plan_consolidations(music_dir, sub_structure, content_hash=content_hash,
+                                             hash_workers=hash_workers, tags=library_tags,
+                                             fuzzy_threshold=fuzzy_threshold)
+            replanned = sum(len(albums) for albums in structure.values()) if replan_all else len(affected)
+            print(f"🔔 {time.strftime('%H:%M:%S')} {len(artists)} artist folder(s) changed, "
+                  f"{replanned} album(s) replanned, {len(operations)} operation(s)")
+            if operations:
+                if journal is None and journal_path is not None and not dry_run:
+                    journal = OperationJournal(journal_path, music_dir)
+                    if journal_started:
+                        journal.reopen(next_id=max(read_journal(journal_path)['moves'], default=-1) + 1)
+                    else:
+                        journal.start([])
+                execute_operations(music_dir, operations, dry_run=dry_run, move_workers=move_workers,
+                                   journal_path=journal_path, structure=sub_structure, journal=journal)
+                if not dry_run:
+                    moved_artists = operation_artists(operations)
+                    refresh_artists(music_dir, structure, album_artists, moved_artists, workers=scan_workers)
+                    if tags:
+                        reread_tags(moved_artists)
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching")
+    finally:
+        watcher.close()
+        if journal is not None:
+            journal.close()
@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+Checks for the Bitwarden duplicate scripts against local stubs.
+
+No real vault or `bw` install is needed: `bw list items` is a stub
+executable put first on PATH that streams a synthetic export in small
+pieces, and deletions go to a stub `bw serve` HTTP server on a free local
+port.
+
+Usage:
+    python3 -m unittest discover -s scripts/utils/tests
+    python3 scripts/utils/tests/test_bw_tools.py
+"""
+
+import copy
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+SCRIPTS = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRIPTS))
+
+import delete_bw_duplicates  # noqa: E402
+import find_bw_duplicates  # noqa: E402
+
+# Prints $STUB_EXPORT in pieces much smaller than the finder's read size, so
+# items and strings are split across pipe writes, then exits with $STUB_STATUS
+STUB_BW = textwrap.dedent(f"""\
+    #!{sys.executable}
+    import os, sys
+    with open(os.environ['STUB_EXPORT'], 'rb') as f:
+        while piece := f.read(997):
+            sys.stdout.buffer.write(piece)
+            sys.stdout.buffer.flush()
+    sys.exit(int(os.environ.get('STUB_STATUS', '0')))
+""")
+
+
+def synthetic_export(count: int = 400):
+    """A `bw list items` export with exact and near-duplicate logins, plus secure notes."""
+    items = []
+    for i in range(count):
+        item = {'id': f'id-{i}', 'type': 1, 'name': f'Site {i % 150}', 'notes': 'n' * 500,
+                'revisionDate': f'2024-01-01T00:00:{i % 60:02d}.000Z',
+                'login': {'username': f'user{i % 7}', 'password': f'pw{i % 3}',
+                          'uris': [{'uri': f'https://www.site{i % 120}.com/login'
+                                    if i % 2 else f'site{i % 120}.com:443'}]}}
+        if i % 10 == 0:
+            item = {'id': f'note-{i}', 'type': 2, 'name': f'Site {i % 150}', 'notes': 'secret'}
+        items.append(item)
+    return items
+
+
+class StubServe:
+    """A stub `bw serve` (GET /status, DELETE /object/item/<id>) that records every request path."""
+
+    def __init__(self, prefix: str = '', failures: int = 0):
+        self.requests = []
+        self.failures = failures
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status: int, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                stub.requests.append(('GET', self.path))
+                if self.path != f'{prefix}/status':
+                    return self.reply(404, {'success': False, 'message': 'Not found.'})
+                self.reply(200, {'success': True, 'data': {'object': 'template',
+                                                           'template': {'status': 'unlocked'}}})
+
+            def do_DELETE(self):
+                stub.requests.append(('DELETE', self.path))
+                if not self.path.startswith(f'{prefix}/object/item/'):
+                    return self.reply(404, {'success': False, 'message': 'Not found.'})
+                if stub.failures:
+                    stub.failures -= 1
+                    return self.reply(500, {'success': False, 'message': 'Internal error'})
+                self.reply(200, {'success': True})
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}{prefix}'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def report(*ids):
+    """A potential_duplicates.json report with every id marked for deletion."""
+    return [{'reason': 'test', 'items': [{'id': item_id, 'name': item_id, 'action': 'delete'}
+                                         for item_id in ids]}]
+
+
+class ServeBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, delete_bw_duplicates, 'RETRY_BACKOFF', delete_bw_duplicates.RETRY_BACKOFF)
+        delete_bw_duplicates.RETRY_BACKOFF = 0
+
+    def delete_all(self, url, ids, **kwargs):
+        backend = delete_bw_duplicates.ServeBackend(url, **kwargs)
+        self.assertTrue(backend.available())
+        return delete_bw_duplicates.process_deletions(report(*ids), backend.delete_item, workers=2)
+
+    def test_deletes_every_item(self):
+        with StubServe() as stub:
+            counts = self.delete_all(stub.url, ['a', 'b/c'])
+        self.assertEqual((counts['deleted'], counts['errors']), (2, 0))
+        self.assertEqual(sorted(path for method, path in stub.requests if method == 'DELETE'),
+                         ['/object/item/a', '/object/item/b%2Fc'])
+
+    def test_path_prefix(self):
+        with StubServe(prefix='/bw') as stub:
+            counts = self.delete_all(stub.url + '/', ['a'])
+        self.assertEqual(counts['deleted'], 1)
+        self.assertEqual(stub.requests, [('GET', '/bw/status'), ('DELETE', '/bw/object/item/a')])
+
+    def test_retries_server_errors(self):
+        with StubServe(failures=2) as stub:
+            counts = self.delete_all(stub.url, ['a'], retries=2)
+        self.assertEqual((counts['deleted'], counts['errors']), (1, 0))
+        self.assertEqual(len(stub.requests), 4)
+
+    def test_gives_up_after_retries(self):
+        with StubServe(failures=3) as stub:
+            counts = self.delete_all(stub.url, ['a'], retries=1)
+        self.assertEqual(counts['errors'], 1)
+        self.assertEqual(counts['error_classes'], {'server': 1})
+
+    def test_rejects_other_schemes(self):
+        for url in ('https://localhost:8087', 'localhost:8087', 'ftp://localhost'):
+            with self.subTest(url=url), self.assertRaises(ValueError):
+                delete_bw_duplicates.ServeBackend(url)
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.path = Path(temp.name) / 'dupes.json.checkpoint'
+
+    def run_deletions(self, ids, errors=None, **kwargs):
+        # errors: id -> message returned by the stub delete; returns (counts, attempted ids)
+        attempted = []
+
+        def delete(item_id):
+            attempted.append(item_id)
+            return (errors or {}).get(item_id)
+
+        checkpoint = delete_bw_duplicates.Checkpoint(str(self.path), batch=2)
+        try:
+            counts = delete_bw_duplicates.process_deletions(report(*ids), delete, checkpoint=checkpoint, **kwargs)
+        finally:
+            checkpoint.close()
+        return counts, attempted
+
+    def test_skips_lines_that_are_not_records(self):
+        self.path.write_text('null\n[]\n"a"\n{"id": 1, "status": "deleted"}\n{"status": "deleted"}\n'
+                             '{"id": "a", "status": "deleted"}\n{"id": "b", "sta')
+        checkpoint = delete_bw_duplicates.Checkpoint(str(self.path))
+        self.assertEqual(checkpoint.status, {'a': 'deleted'})
+        checkpoint.record('c', 'gone')
+        checkpoint.close()
+
+        # The torn line stays on its own, so the new record still parses
+        self.assertEqual(self.path.read_text().splitlines()[-2:], ['{"id": "b", "sta', json.dumps(
+            {'id': 'c', 'status': 'gone', 'error': None})])
+        checkpoint = delete_bw_duplicates.Checkpoint(str(self.path))
+        checkpoint.close()
+        self.assertEqual(checkpoint.status, {'a': 'deleted', 'c': 'gone'})
+
+    def test_rerun_skips_finished_items(self):
+        errors = {'b': 'HTTP 500: Internal error', 'c': 'HTTP 404: Not found.'}
+        counts, attempted = self.run_deletions(['a', 'b', 'c'], errors)
+        self.assertEqual((counts['deleted'], counts['gone'], counts['errors']), (1, 1, 1))
+
+        counts, attempted = self.run_deletions(['a', 'b', 'c', 'd'], errors)
+        self.assertEqual(attempted, ['b', 'd'])
+        self.assertEqual(counts['skipped'], 2)
+
+    def test_retry_failed_tries_only_failed_items(self):
+        self.run_deletions(['a', 'b'], {'b': 'HTTP 500: Internal error'})
+        counts, attempted = self.run_deletions(['a', 'b', 'c'], retry_failed=True)
+        self.assertEqual(attempted, ['b'])
+        self.assertEqual((counts['deleted'], counts['skipped']), (1, 2))
+
+        counts, attempted = self.run_deletions(['a', 'b', 'c'], retry_failed=True)
+        self.assertEqual(attempted, [])
+
+    def test_session_error_stops_without_recording(self):
+        counts, attempted = self.run_deletions(['a', 'b', 'c'], {'a': 'You are not logged in.'})
+        self.assertEqual(attempted, ['a'])
+        self.assertEqual((counts['stopped'], counts['remaining'], counts['errors']), ('session', 3, 0))
+
+        counts, attempted = self.run_deletions(['a', 'b', 'c'])
+        self.assertEqual(attempted, ['a', 'b', 'c'])
+        self.assertEqual((counts['deleted'], counts['stopped']), (3, None))
+
+
+def login(item_id, name, username=None, uris=(), password='pw', revision='2024-01-01T00:00:00.000Z'):
+    """A slim login item as load_items returns it."""
+    return {'id': item_id, 'name': name, 'username': username, 'uris': list(uris),
+            'password_digest': password, 'password_preview': None, 'revisionDate': revision}
+
+
+class GroupingTest(unittest.TestCase):
+
+    def clusters(self, items, match='host'):
+        return sorted((sorted(item['id'] for item in members), sorted(rule for rule, _ in reasons))
+                      for reasons, members in find_bw_duplicates.find_clusters(items, match))
+
+    def test_transitive_merges(self):
+        # a-b share a name, b-c a login, c-d a name: one cluster; e stays alone
+        items = [login('a', 'Mail'), login('b', 'Mail', 'me', ['https://mail.example.com']),
+                 login('c', 'Webmail', 'me', ['mail.example.com:443']), login('d', 'Webmail'),
+                 login('e', 'Other', 'me', ['https://other.example.com'])]
+        self.assertEqual(self.clusters(items), [(['a', 'b', 'c', 'd'], ['name', 'name', 'normalized-host'])])
+
+    def test_merge_through_later_item(self):
+        # a and b only meet through c, which comes last
+        items = [login('a', 'A', 'me', ['https://one.example.com']), login('b', 'B', 'you', ['two.example.com']),
+                 login('c', 'A', 'you', ['https://two.example.com'])]
+        self.assertEqual(self.clusters(items), [(['a', 'b', 'c'], ['name', 'normalized-host'])])
+
+    def test_match_levels(self):
+        items = [login('a', 'A', 'me', ['https://login.example.com']),
+                 login('b', 'B', 'me', ['https://www.login.example.com']),
+                 login('c', 'C', 'me', ['https://example.com']),
+                 login('d', 'D', 'me', ['androidapp://com.example.app'])]
+        self.assertEqual(self.clusters(items, 'exact'), [])
+        self.assertEqual(self.clusters(items, 'host'), [(['a', 'b'], ['normalized-host'])])
+        self.assertEqual(self.clusters(items, 'domain'), [(['a', 'b', 'c', 'd'], ['android-app'])])
+
+    def test_needs_username(self):
+        items = [login('a', 'A', None, ['https://example.com']), login('b', 'B', '', ['https://example.com'])]
+        self.assertEqual(self.clusters(items), [])
+
+    def actions(self, items):
+        return {item['id']: item['action'] for item in find_bw_duplicates.process_group(items)}
+
+    def test_deletes_older_copies_of_each_credential(self):
+        uris = ['https://example.com']
+        items = [login('old-a', 'X', 'me', uris, 'pw1', '2024-01-01T00:00:00.000Z'),
+                 login('new-a', 'X', 'me', uris, 'pw1', '2024-03-01T00:00:00.000Z'),
+                 login('old-b', 'X', 'me', uris, 'pw2', '2024-01-02T00:00:00.000Z'),
+                 login('new-b', 'X', 'me', uris, 'pw2', '2024-02-01T00:00:00.000Z'),
+                 login('newest', 'X', 'me', uris, 'pw3', '2024-04-01T00:00:00.000Z')]
+        # Comparing with the newest item alone deleted neither older copy
+        self.assertEqual(self.actions(items), {'newest': 'keep', 'new-a': 'keep', 'new-b': 'keep',
+                                               'old-a': 'delete', 'old-b': 'delete'})
+
+    def test_keeps_items_that_differ(self):
+        items = [login('a', 'X', 'me', ['https://a.example.com'], revision='2024-02-01T00:00:00.000Z'),
+                 login('b', 'X', 'me', ['https://b.example.com']),
+                 login('c', 'X', 'you', ['https://a.example.com']),
+                 login('d', 'X', 'me', ['https://a.example.com'], password='other')]
+        self.assertEqual(set(self.actions(items).values()), {'keep'})
+
+    def test_empty_items_are_kept(self):
+        items = [login('a', 'X', password=None, revision='2024-02-01T00:00:00.000Z'),
+                 login('b', 'X', password=None)]
+        self.assertEqual(self.actions(items), {'a': 'keep', 'b': 'keep'})
+
+    def test_uri_order_does_not_matter(self):
+        items = [login('a', 'X', 'me', ['https://a.example.com', 'https://b.example.com'],
+                       revision='2024-02-01T00:00:00.000Z'),
+                 login('b', 'X', 'me', ['https://b.example.com', 'https://a.example.com'])]
+        self.assertEqual(self.actions(items), {'a': 'keep', 'b': 'delete'})
+
+
+# URI -> (host, domain, app) from canonicalize_uri, or None
+CANONICAL_URIS = [
+    ('https://www.Example.com:443/login', ('example.com', 'example.com', False)),
+    ('http://example.com:80', ('example.com', 'example.com', False)),
+    ('https://user:pw@example.com/', ('example.com', 'example.com', False)),
+    ('https://example.com./', ('example.com', 'example.com', False)),
+    ('https://www.com', ('www.com', 'www.com', False)),
+    ('https://login.example.co.uk', ('login.example.co.uk', 'example.co.uk', False)),
+    ('https://a.github.io', ('a.github.io', 'a.github.io', False)),
+    # Schemeless
+    ('example.com/login', ('example.com', 'example.com', False)),
+    ('www.example.com:8443', ('example.com:8443', 'example.com:8443', False)),
+    ('nas.home.lan', ('nas.home.lan', 'nas.home.lan', False)),
+    ('localhost:5000', ('localhost:5000', 'localhost:5000', False)),
+    # Ports other than 80/443 count
+    ('https://vault.example.com:8443', ('vault.example.com:8443', 'example.com:8443', False)),
+    # Wildcard (*.kawasaki.jp, *.ck) and exception (!city.kawasaki.jp, !www.ck) rules
+    ('https://foo.bar.kawasaki.jp', ('foo.bar.kawasaki.jp', 'foo.bar.kawasaki.jp', False)),
+    ('https://a.foo.bar.kawasaki.jp', ('a.foo.bar.kawasaki.jp', 'foo.bar.kawasaki.jp', False)),
+    ('https://www.city.kawasaki.jp', ('city.kawasaki.jp', 'city.kawasaki.jp', False)),
+    ('https://a.b.c.ck', ('a.b.c.ck', 'b.c.ck', False)),
+    ('https://x.www.ck', ('x.www.ck', 'www.ck', False)),
+    # IDNA hosts meet their punycode spelling; the list writes suffixes in Unicode
+    ('https://Bücher.de/x', ('bücher.de', 'bücher.de', False)),
+    ('https://www.xn--bcher-kva.de', ('bücher.de', 'bücher.de', False)),
+    ('https://shop.例え.jp', ('shop.例え.jp', '例え.jp', False)),
+    ('https://a.b.xn--55qx5d.cn', ('a.b.公司.cn', 'b.公司.cn', False)),
+    ('https://xn--zz.example.com', ('xn--zz.example.com', 'example.com', False)),
+    # IPs are kept whole
+    ('https://192.168.1.10:8080/', ('192.168.1.10:8080', '192.168.1.10:8080', False)),
+    ('http://10.0.0.1', ('10.0.0.1', '10.0.0.1', False)),
+    ('https://[::1]/', ('::1', '::1', False)),
+    ('https://[2001:db8::1]:8443', ('[2001:db8::1]:8443', '[2001:db8::1]:8443', False)),
+    # Android apps map to the domain of the reversed package name
+    ('androidapp://com.example.app', ('androidapp://com.example.app', 'example.com', True)),
+    ('AndroidApp://com.Example.App/extra', ('androidapp://com.example.app', 'example.com', True)),
+    ('androidapp://uk.co.bank.mobile', ('androidapp://uk.co.bank.mobile', 'bank.co.uk', True)),
+    # No host
+    ('androidapp://', None),
+    ('https://', None),
+    ('', None),
+    ('mailto:someone', None),
+    ('http://example.com:99999', None),
+]
+
+# host -> registrable domain
+REGISTRABLE_DOMAINS = [
+    ('example.com', 'example.com'),
+    ('a.b.example.com', 'example.com'),
+    ('com', 'com'),
+    ('co.uk', 'co.uk'),
+    ('example.co.uk', 'example.co.uk'),
+    ('a.github.io', 'a.github.io'),
+    ('github.io', 'github.io'),
+    ('bar.kawasaki.jp', 'bar.kawasaki.jp'),
+    ('foo.bar.kawasaki.jp', 'foo.bar.kawasaki.jp'),
+    ('city.kawasaki.jp', 'city.kawasaki.jp'),
+    ('a.city.kawasaki.jp', 'city.kawasaki.jp'),
+    ('www.ck', 'www.ck'),
+    ('a.www.ck', 'www.ck'),
+    ('b.c.ck', 'b.c.ck'),
+    ('公司.cn', '公司.cn'),
+    ('a.b.公司.cn', 'b.公司.cn'),
+    # No rule matches: the host is kept whole
+    ('nas.home.lan', 'nas.home.lan'),
+    ('localhost', 'localhost'),
+]
+
+
+class UriCanonicalizationTest(unittest.TestCase):
+
+    def test_canonicalize_uri(self):
+        for uri, expected in CANONICAL_URIS:
+            with self.subTest(uri=uri):
+                self.assertEqual(find_bw_duplicates.canonicalize_uri(uri), expected)
+
+    def test_registrable_domain(self):
+        for host, expected in REGISTRABLE_DOMAINS:
+            with self.subTest(host=host):
+                self.assertEqual(find_bw_duplicates.registrable_domain(host), expected)
+
+    def test_public_suffixes(self):
+        rules, wildcards, exceptions = find_bw_duplicates.public_suffixes()
+        for suffix, table, expected in [
+            ('com', rules, True), ('co.uk', rules, True), ('github.io', rules, True),
+            ('公司.cn', rules, True), ('xn--55qx5d.cn', rules, False),
+            ('kawasaki.jp', wildcards, True), ('ck', wildcards, True), ('kawasaki.jp', rules, False),
+            ('city.kawasaki.jp', exceptions, True), ('www.ck', exceptions, True),
+        ]:
+            with self.subTest(suffix=suffix):
+                self.assertEqual(suffix in table, expected)
+        # Comments and rule markers never end up in a table
+        for rule in rules | wildcards | exceptions:
+            self.assertFalse(rule.startswith(('//', '*', '!')) or rule != rule.lower(), rule)
+
+
+class FromBwTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.workdir = Path(temp.name)
+        bin_dir = self.workdir / 'bin'
+        bin_dir.mkdir()
+        self.bw = bin_dir / 'bw'
+        self.bw.write_text(STUB_BW)
+        self.bw.chmod(0o755)
+        export = self.workdir / 'bw_items.json'
+        export.write_text(json.dumps(synthetic_export(), indent=2))
+        self.env = dict(os.environ, PATH=f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+                        STUB_EXPORT=str(export))
+
+    def run_finder(self, *args):
+        result = subprocess.run([sys.executable, str(SCRIPTS / 'find_bw_duplicates.py'), *args],
+                                cwd=self.workdir, env=self.env, capture_output=True, text=True)
+        report = self.workdir / 'potential_duplicates.json'
+        if not report.exists():
+            return result, None
+        dupes = json.loads(report.read_text())
+        report.unlink()
+        return result, dupes
+
+    def test_same_groups_as_export_file(self):
+        result, from_file = self.run_finder()
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertGreater(len(from_file), 10)
+
+        result, from_bw = self.run_finder('--from-bw')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(from_bw, from_file)
+
+    def test_failing_bw_writes_no_report(self):
+        self.env['STUB_STATUS'] = '1'
+        result, dupes = self.run_finder('--from-bw')
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('Error reading items from bw', result.stdout)
+        self.assertIsNone(dupes)
+
+    def test_malformed_json_writes_no_report(self):
+        bad = self.workdir / 'bad.json'
+        bad.write_text('[{"id": "a", "type": 1, "name": ')
+        self.env['STUB_EXPORT'] = str(bad)
+        result, dupes = self.run_finder('--from-bw')
+        self.assertEqual(result.returncode, 1, result.stderr)
+        self.assertIn('Error reading items from bw', result.stdout)
+        self.assertNotIn('Traceback', result.stderr)
+        self.assertIsNone(dupes)
+
+        (self.workdir / 'bw_items.json').write_text('{"items": [nul')
+        result, dupes = self.run_finder()
+        self.assertEqual(result.returncode, 1, result.stderr)
+        self.assertIn('Error reading items from bw_items.json', result.stdout)
+        self.assertIsNone(dupes)
+
+    def test_iter_bw_items_raises_on_failure(self):
+        os.environ['STUB_EXPORT'] = self.env['STUB_EXPORT']
+        os.environ['STUB_STATUS'] = '2'
+        self.addCleanup(os.environ.pop, 'STUB_EXPORT')
+        self.addCleanup(os.environ.pop, 'STUB_STATUS')
+        with self.assertRaisesRegex(RuntimeError, 'exited with status 2'):
+            list(find_bw_duplicates.iter_bw_items(str(self.bw)))
+
+    def test_corrupt_state_starts_empty(self):
+        state = self.workdir / 'state.json'
+        result, from_file = self.run_finder()
+        state.write_text('{"version": 1, "items": {"id-1": ')
+
+        result, dupes = self.run_finder('--state', str(state))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('not a valid state file', result.stderr)
+        self.assertEqual(len(dupes), len(from_file))
+        self.assertEqual({group['status'] for group in dupes}, {'new'})
+
+        result, dupes = self.run_finder('--state', str(state))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual((result.stderr, dupes), ('', []))
+
+    def write_export(self, items):
+        (self.workdir / 'bw_items.json').write_text(json.dumps(items, indent=2))
+
+    def test_rerun_reports_unchanged_only_with_all(self):
+        state = str(self.workdir / 'state.json')
+        result, first = self.run_finder('--state', state)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertGreater(len(first), 10)
+
+        result, dupes = self.run_finder('--state', state)
+        self.assertEqual(dupes, [])
+        self.assertIn(f'0 new, 0 changed, {len(first)} unchanged', result.stdout)
+
+        result, dupes = self.run_finder('--state', state, '--all')
+        self.assertEqual({group['status'] for group in dupes}, {'unchanged'})
+        self.assertEqual([group['items'] for group in dupes], [group['items'] for group in first])
+
+    def test_edit_or_delete_marks_group_changed(self):
+        state = str(self.workdir / 'state.json')
+        items = synthetic_export()
+        result, first = self.run_finder('--state', state)
+        groups = [{member['id'] for member in group['items']} for group in first]
+
+        for edit in ('rename', 'revision', 'delete'):
+            with self.subTest(edit=edit):
+                group = next(ids for ids in groups if len(ids) > 2)
+                groups.remove(group)
+                target = next(item for item in items if item['id'] in group)
+                if edit == 'delete':
+                    items.remove(target)
+                else:
+                    target['revisionDate'] = '2025-01-01T00:00:00.000Z'
+                if edit == 'rename':
+                    target['name'] = f"Renamed {target['id']}"
+                self.write_export(items)
+
+                result, dupes = self.run_finder('--state', state)
+                self.assertEqual(result.returncode, 0, result.stderr)
+                self.assertEqual([group['status'] for group in dupes], ['changed'])
+                self.assertEqual({member['id'] for member in dupes[0]['items']},
+                                 group - {target['id']} if edit != 'revision' else group)
+
+    def test_same_as_full_regroup(self):
+        # Random edits, additions and deletions: the incremental run must
+        # report the same groups and save the same state as regrouping all
+        random_state = random.Random(7)
+        export = synthetic_export(300)
+        state = None
+        for round_number in range(12):
+            for item in random_state.sample(export, 8):
+                if item['type'] != 1:
+                    continue
+                item['revisionDate'] = f'2025-01-01T00:00:{round_number:02d}.000Z'
+                change = random_state.randrange(4)
+                if change == 0:
+                    item['name'] = f'Site {random_state.randrange(150)}'
+                elif change == 1:
+                    item['login']['username'] = f'user{random_state.randrange(7)}'
+                elif change == 2:
+                    item['login']['uris'] = [{'uri': f'https://site{random_state.randrange(120)}.com'}]
+                else:
+                    export.remove(item)
+            export.append({'id': f'new-{round_number}', 'type': 1, 'name': f'Site {round_number}',
+                           'revisionDate': '2025-02-01T00:00:00.000Z',
+                           'login': {'username': 'user1', 'password': 'pw',
+                                     'uris': [{'uri': f'site{round_number}.com'}]}})
+            items = list(find_bw_duplicates.iter_login_items(io.StringIO(json.dumps(export))))
+
+            expected, expected_state, expected_counts = find_bw_duplicates.find_changed_duplicates(
+                copy.deepcopy(items), state, include_unchanged=True)
+            dupes, state, counts = find_bw_duplicates.find_changed_duplicates(items, state)
+            with self.subTest(round=round_number):
+                self.assertEqual(dupes, [group for group in expected if group['status'] != 'unchanged'])
+                self.assertEqual(state, expected_state)
+                self.assertEqual(counts, expected_counts)
+
+
+if __name__ == '__main__':
+    unittest.main()
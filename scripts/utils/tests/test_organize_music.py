@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+"""
+End-to-end checks for organize-music.py on small fixture libraries.
+
+Each end-to-end test builds a library in a temporary directory and runs the real
+command (index and journal on, as by default, with the cache in the
+temporary directory too). The expected plans and trees are what the
+original single-file organize-music.py produced for the same fixtures,
+so any planner or executor change that alters the outcome fails here.
+Fuzzy name clustering is also checked directly against scoring all pairs,
+file moves against targets that appear after planning, --undo after a
+--watch session, the library index after --rebuild-index, and the tag
+readers against minimal hand-built FLAC, ID3 and MP4 headers.
+
+Usage:
+    python3 -m unittest discover -s scripts/utils/tests
+    python3 scripts/utils/tests/test_organize_music.py
+"""
+
+import contextlib
+import errno
+import io
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'organize-music.py'
+sys.path.insert(0, str(SCRIPT.parent))
+
+from organize_music import moves, tags  # noqa: E402
+from organize_music.names import fuzzy_name_clusters, name_similarity, normalize_album_name  # noqa: E402
+
+FIXTURE = [
+    'Tweaker/2 AM Wakeup Call/01 Ruby Ruby.flac',
+    'Tweaker/2 AM Wakeup Call/02 Happy Child.flac',
+    'Tweaker/2 AM Wakeup Call/04 Pure Genius.flac',
+    'Tweaker & David Sylvian/2 AM Wakeup Call/03 Linda Lovelace.flac',
+    'Tweaker & David Sylvian/2 AM Wakeup Call/04 Pure Genius.flac',
+    'Tweaker & David Sylvian/2 AM Wakeup Call/Bonus.mp3',
+    'Tweaker, Jarboe & Will Oldham/Call the Time Eternity/01 Intro.flac',
+    'Tweaker/Call the Time Eternity/02 Crude.flac',
+    'Foo/Now 10/01 First.mp3',
+    'Bar/Now 10/02 Second.MP3',
+    'Baz/Now 10/05 Fifth.mp3',
+    'Baz/Now 10/cover.jpg',
+    'Various Artists/Now 10/03 Third.mp3',
+    'Portishead/Third/01 Silence.flac',
+    'Portishead & Massive Attack/Third/05 Hunter.flac',
+    'Massive Attack/Third/07 Machine Gun.flac',
+    'Massive Attack/Mezzanine/01 Angel.wav',
+    'Solo/Album/01 Only.m4a',
+    'Solo/Album/folder.jpg',
+    'Solo & Guest/Unrelated/01 Track.aac',
+    'X & Y/Orphan/01 Lone.flac',
+    '.hidden/Now 10/04 Hidden.mp3',
+    'Empty/Nothing/readme.txt',
+    'Deep/Album/CD1/01 Nested.flac',
+    'Deep/Album/09 Top.flac',
+    'Deep & Friend/Album/10 Tail.flac',
+]
+
+# (target artist, target album, [(source artist, source album, tracks moved)],
+#  result tracks, complete, missing track numbers)
+EXPECTED_MAIN_ARTIST = [
+    ('Deep', 'Album', [('Deep & Friend', 'Album', ['10 Tail.flac'])],
+     ['09 Top.flac', '10 Tail.flac'], True, []),
+    ('Portishead', 'Third', [('Portishead & Massive Attack', 'Third', ['05 Hunter.flac'])],
+     ['01 Silence.flac', '05 Hunter.flac'], False, [2, 3, 4]),
+    ('Tweaker', '2 AM Wakeup Call', [('Tweaker & David Sylvian', '2 AM Wakeup Call',
+                                      ['03 Linda Lovelace.flac', 'Bonus.mp3'])],
+     ['01 Ruby Ruby.flac', '02 Happy Child.flac', '03 Linda Lovelace.flac', '04 Pure Genius.flac',
+      'Bonus.mp3'], True, []),
+    ('Tweaker', 'Call the Time Eternity', [('Tweaker, Jarboe & Will Oldham', 'Call the Time Eternity',
+                                            ['01 Intro.flac'])],
+     ['01 Intro.flac', '02 Crude.flac'], True, []),
+]
+EXPECTED_COMPILATIONS = [
+    ('Various Artists', 'Now 10', [('Bar', 'Now 10', []), ('Baz', 'Now 10', []), ('Foo', 'Now 10', []),
+                                   ('Various Artists', 'Now 10', [])],
+     ['01 First.mp3', '02 Second.MP3', '03 Third.mp3', '05 Fifth.mp3'], False, [4]),
+]
+
+EXPECTED_TREE = [
+    '.hidden/Now 10/04 Hidden.mp3',
+    'Baz/Now 10/cover.jpg',
+    'Deep/Album/09 Top.flac',
+    'Deep/Album/10 Tail.flac',
+    'Deep/Album/CD1/01 Nested.flac',
+    'Empty/Nothing/readme.txt',
+    'Massive Attack/Mezzanine/01 Angel.wav',
+    'Massive Attack/Third/07 Machine Gun.flac',
+    'Portishead/Third/01 Silence.flac',
+    'Portishead/Third/05 Hunter.flac',
+    'Solo & Guest/Unrelated/01 Track.aac',
+    'Solo/Album/01 Only.m4a',
+    'Solo/Album/folder.jpg',
+    'Tweaker & David Sylvian/2 AM Wakeup Call/04 Pure Genius.flac',
+    'Tweaker/2 AM Wakeup Call/01 Ruby Ruby.flac',
+    'Tweaker/2 AM Wakeup Call/02 Happy Child.flac',
+    'Tweaker/2 AM Wakeup Call/03 Linda Lovelace.flac',
+    'Tweaker/2 AM Wakeup Call/04 Pure Genius.flac',
+    'Tweaker/2 AM Wakeup Call/Bonus.mp3',
+    'Tweaker/Call the Time Eternity/01 Intro.flac',
+    'Tweaker/Call the Time Eternity/02 Crude.flac',
+    'Various Artists/Now 10/01 First.mp3',
+    'Various Artists/Now 10/02 Second.MP3',
+    'Various Artists/Now 10/03 Third.mp3',
+    'Various Artists/Now 10/05 Fifth.mp3',
+    'X & Y/Orphan/01 Lone.flac',
+]
+
+# Folder and track names that aren't valid UTF-8 (Latin-1 bytes from an old
+# rip); Python sees them as surrogate-escaped str
+NON_UTF8_FIXTURE = [
+    b'Caf\xe9 Band/Split \xff Album/01 Caf\xe9.flac',
+    b'Caf\xe9 Band & Guest/Split \xff Album/02 \xfe Two.flac',
+    b'Solo/Album/01 Only.flac',
+]
+NON_UTF8_TREE = [
+    b'Caf\xe9 Band/Split \xff Album/01 Caf\xe9.flac',
+    b'Caf\xe9 Band/Split \xff Album/02 \xfe Two.flac',
+    b'Solo/Album/01 Only.flac',
+]
+
+
+def build_library(root: Path, paths):
+    """Create every file in paths (str, or bytes for non-UTF-8 names) under root."""
+    for rel in paths:
+        path = os.path.join(os.fsencode(root), os.fsencode(rel))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(os.fsencode(rel))
+
+
+def library_files(root: Path):
+    """Every file under root, relative and sorted, with the same str/bytes type as root."""
+    return sorted(os.path.relpath(os.path.join(dirpath, name), root)
+                  for dirpath, _, names in os.walk(root) for name in names)
+
+
+def canonical_plan(plan):
+    """The parts of a --json plan the original script reported, independent of listing order."""
+    def consolidation(c):
+        sources = sorted((s['artist'], s['album'], s.get('tracks', [])) for s in c['sources'])
+        return (c['target_artist'], c['target_album'], sources, c['result_tracks'], c['complete'],
+                c['missing_tracks'])
+    return (sorted(map(consolidation, plan['main_artist_consolidations'])),
+            sorted(map(consolidation, plan['compilation_consolidations'])))
+
+
+class OrganizeMusicTestCase(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.music_dir = Path(temp.name) / 'Music'
+        self.music_dir.mkdir()
+        # Printed names may hold surrogates whatever the locale
+        self.env = dict(os.environ, XDG_CACHE_HOME=str(Path(temp.name) / 'cache'),
+                        PYTHONIOENCODING='utf-8:surrogateescape')
+
+    def run_cli(self, *args) -> str:
+        result = subprocess.run([sys.executable, str(SCRIPT), '--music-dir', str(self.music_dir), *args],
+                                env=self.env, capture_output=True, text=True, errors='surrogateescape')
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        return result.stdout
+
+    def plan(self, *args):
+        return json.loads(self.run_cli('--dry-run', '--json', *args))
+
+
+class PlanMatchesOriginalTest(OrganizeMusicTestCase):
+
+    def setUp(self):
+        super().setUp()
+        build_library(self.music_dir, FIXTURE)
+
+    def assertOriginalPlan(self, plan):
+        self.assertEqual(plan['total_operations'], 5)
+        main_artist, compilations = canonical_plan(plan)
+        expected = [(artist, album, sorted(sources), tracks, complete, missing)
+                    for artist, album, sources, tracks, complete, missing in EXPECTED_MAIN_ARTIST]
+        self.assertEqual(main_artist, sorted(expected))
+        self.assertEqual(compilations, sorted(EXPECTED_COMPILATIONS))
+
+    def test_dry_run_plan(self):
+        self.assertOriginalPlan(self.plan())
+
+    def test_plan_from_library_index(self):
+        self.assertOriginalPlan(self.plan())
+        plan = self.plan()
+        self.assertEqual(plan['scan']['directories_read'], 0)
+        self.assertOriginalPlan(plan)
+
+    def test_plan_without_index(self):
+        self.assertOriginalPlan(self.plan('--no-index'))
+
+    def test_duplicate_tracks_only_with_content_hash(self):
+        for args, expected in [((), False), (('--content-hash',), True)]:
+            with self.subTest(args=args):
+                plan = self.plan(*args)
+                self.assertOriginalPlan(plan)
+                consolidations = plan['main_artist_consolidations'] + plan['compilation_consolidations']
+                self.assertEqual({'duplicate_tracks' in c for c in [plan, *consolidations]}, {expected})
+                self.assertEqual('duplicate_track_count' in plan['summary'], expected)
+
+                records = [json.loads(line) for line in self.run_cli('--dry-run', '--ndjson', *args).splitlines()]
+                self.assertEqual({'duplicate_tracks' in record for record in records[:-1]}, {expected})
+                self.assertEqual('duplicate_track_count' in records[-1], expected)
+
+    def test_plan_from_snapshot(self):
+        snapshot = self.music_dir.parent / 'library.idx'
+        self.run_cli('--write-index', str(snapshot))
+        self.assertOriginalPlan(self.plan('--index', str(snapshot)))
+
+    def test_execute_and_undo(self):
+        self.run_cli()
+        self.assertEqual(library_files(self.music_dir), EXPECTED_TREE)
+
+        self.run_cli('--undo')
+        self.assertEqual(library_files(self.music_dir), sorted(FIXTURE))
+
+    def test_pipeline_tree(self):
+        self.run_cli('--pipeline')
+        self.assertEqual(library_files(self.music_dir), EXPECTED_TREE)
+
+
+class LibraryIndexTest(OrganizeMusicTestCase):
+
+    def indexed_artists(self):
+        from organize_music.index import default_index_path
+
+        with mock.patch.dict(os.environ, XDG_CACHE_HOME=self.env['XDG_CACHE_HOME']):
+            index_path = default_index_path(self.music_dir)
+        conn = sqlite3.connect(str(index_path))
+        try:
+            return (sorted(os.fsdecode(name) for name, in conn.execute('SELECT name FROM artists')),
+                    sorted(os.fsdecode(artist) for artist, in conn.execute('SELECT DISTINCT artist FROM albums')))
+        finally:
+            conn.close()
+
+    def test_rebuild_drops_removed_artists(self):
+        build_library(self.music_dir, FIXTURE)
+        self.plan()
+        shutil.rmtree(self.music_dir / 'Solo')
+
+        self.plan('--rebuild-index')
+        artists, album_artists = self.indexed_artists()
+        self.assertNotIn('Solo', artists)
+        self.assertNotIn('Solo', album_artists)
+        self.assertIn('Solo & Guest', artists)
+
+
+@unittest.skipUnless(sys.getfilesystemencoding() == 'utf-8' and sys.platform != 'darwin',
+                     'needs a filesystem that accepts names which are not valid UTF-8')
+class NonUtf8NamesTest(OrganizeMusicTestCase):
+
+    def setUp(self):
+        super().setUp()
+        build_library(self.music_dir, NON_UTF8_FIXTURE)
+
+    def assertSplitAlbumPlan(self, plan):
+        self.assertEqual(plan['total_operations'], 1)
+        (consolidation,) = plan['main_artist_consolidations']
+        self.assertEqual(consolidation['target_artist'], os.fsdecode(b'Caf\xe9 Band'))
+        self.assertEqual(consolidation['sources'][0]['tracks'], [os.fsdecode(b'02 \xfe Two.flac')])
+
+    def test_plan_from_library_index(self):
+        self.assertSplitAlbumPlan(self.plan())
+        plan = self.plan()
+        self.assertEqual(plan['scan']['directories_read'], 0)
+        self.assertSplitAlbumPlan(plan)
+
+    def test_plan_from_snapshot(self):
+        snapshot = self.music_dir.parent / 'library.idx'
+        self.run_cli('--write-index', str(snapshot), '--tags')
+        self.assertSplitAlbumPlan(self.plan('--index', str(snapshot)))
+
+    def test_execute_and_undo(self):
+        self.run_cli()
+        self.assertEqual(library_files(os.fsencode(self.music_dir)), NON_UTF8_TREE)
+
+        self.run_cli('--undo')
+        self.assertEqual(library_files(os.fsencode(self.music_dir)), sorted(NON_UTF8_FIXTURE))
+
+
+
+class ScriptedWatcher:
+    """Stands in for PollingWatcher: adds each batch of files, then stops the watch with Ctrl-C."""
+
+    def __init__(self, music_dir: Path, batches):
+        self.music_dir = music_dir
+        self.events = []
+        for paths in batches:
+            self.events += [paths, []]
+
+    def poll(self, timeout):
+        if not self.events:
+            raise KeyboardInterrupt
+        paths = self.events.pop(0)
+        build_library(self.music_dir, paths)
+        return {path.split('/')[0] for path in paths}
+
+    def close(self):
+        pass
+
+
+class WatchJournalTest(OrganizeMusicTestCase):
+
+    def test_undo_reverses_every_batch(self):
+        initial = ['A/One/01 a.flac', 'A & B/One/02 b.flac']
+        batches = [['C/Two/01 c.flac', 'C & D/Two/02 d.flac'], ['E/Three/01 e.flac', 'E & F/Three/02 f.flac']]
+        build_library(self.music_dir, initial)
+        self.run_cli()
+
+        from organize_music import watch
+        from organize_music.journal import default_journal_path
+        from organize_music.scan import get_artists_and_albums
+
+        with mock.patch.dict(os.environ, XDG_CACHE_HOME=self.env['XDG_CACHE_HOME']), \
+                mock.patch.object(watch, 'PollingWatcher', lambda *args, **kwargs: ScriptedWatcher(
+                    self.music_dir, batches)), contextlib.redirect_stdout(io.StringIO()):
+            watch.watch_library(self.music_dir, get_artists_and_albums(self.music_dir), dry_run=False,
+                                use_polling=True, debounce=0, journal_path=default_journal_path(self.music_dir),
+                                journal_started=True)
+        self.assertEqual(library_files(self.music_dir),
+                         ['A/One/01 a.flac', 'A/One/02 b.flac', 'C/Two/01 c.flac', 'C/Two/02 d.flac',
+                          'E/Three/01 e.flac', 'E/Three/02 f.flac'])
+
+        self.run_cli('--undo')
+        self.assertEqual(library_files(self.music_dir), sorted(initial + batches[0] + batches[1]))
+
+
+def all_pairs_clusters(names, threshold):
+    """fuzzy_name_clusters by scoring every pair, as sets of names."""
+    normalized = sorted({normalize_album_name(name) for name in names})
+    cluster = {key: {key} for key in normalized}
+    for i, a in enumerate(normalized):
+        for b in normalized[i + 1:]:
+            if cluster[a] is not cluster[b] and name_similarity(a, b) >= threshold:
+                merged = cluster[a] | cluster[b]
+                for key in merged:
+                    cluster[key] = merged
+    return partition({name: min(cluster[normalize_album_name(name)]) for name in names})
+
+
+def partition(clusters):
+    """{name: key} as a sorted list of the sorted name groups."""
+    groups = {}
+    for name, key in clusters.items():
+        groups.setdefault(key, []).append(name)
+    return sorted(sorted(group) for group in groups.values())
+
+
+def random_titles(rng, count=40):
+    """Album titles built from a few short words, each with a few typo'd variants."""
+    words = [''.join(rng.choice('aeinorst') for _ in range(rng.randint(1, 7))) for _ in range(10)]
+    titles = set()
+    for _ in range(count):
+        title = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+        titles.add(title)
+        for _ in range(rng.randint(0, 2)):
+            chars = list(title)
+            k = rng.randrange(len(chars) + 1)
+            edit = rng.randrange(3)
+            if edit == 0:
+                chars.insert(k, rng.choice('aeinorst'))
+            elif k < len(chars):
+                chars[k:k + 1] = [] if edit == 1 else [rng.choice('aeinorst')]
+            if ''.join(chars).strip():
+                titles.add(''.join(chars))
+    return titles
+
+
+class FuzzyNameClustersTest(unittest.TestCase):
+
+    def test_close_pair(self):
+        # One inserted letter: scores 0.909
+        self.assertEqual(partition(fuzzy_name_clusters({'night', 'nirght'}, 0.9)), [['night', 'nirght']])
+
+    def test_score_is_symmetric(self):
+        # difflib alone scores this pair 0.571 one way round and 0.286 the other
+        self.assertEqual(name_similarity('cab', 'bcba'), name_similarity('bcba', 'cab'))
+
+    def test_same_clusters_as_all_pairs(self):
+        for threshold in (0.6, 0.8, 0.85, 0.9, 0.95):
+            for seed in range(4):
+                with self.subTest(threshold=threshold, seed=seed):
+                    titles = random_titles(random.Random(seed))
+                    self.assertEqual(partition(fuzzy_name_clusters(titles, threshold)),
+                                     all_pairs_clusters(titles, threshold))
+
+
+
+class MoveFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.root = Path(temp.name)
+        self.source = self.root / 'source.flac'
+        self.target = self.root / 'album' / 'target.flac'
+        self.target.parent.mkdir()
+        self.source.write_bytes(b'moved')
+
+    def assertNotReplaced(self, error):
+        self.assertIsInstance(error, FileExistsError)
+        self.assertEqual(self.target.read_bytes(), b'already there')
+        self.assertEqual(self.source.read_bytes(), b'moved')
+        self.assertEqual(sorted(os.listdir(self.target.parent)), ['target.flac'])
+
+    def test_rename(self):
+        (result,) = moves.move_files([(self.source, self.target)])
+        self.assertIsNone(result[2])
+        self.assertEqual(self.target.read_bytes(), b'moved')
+        self.assertFalse(self.source.exists())
+
+    def test_rename_keeps_existing_target(self):
+        self.target.write_bytes(b'already there')
+        (result,) = moves.move_files([(self.source, self.target)])
+        self.assertNotReplaced(result[2])
+
+    def test_rename_without_renameat2_keeps_existing_target(self):
+        self.target.write_bytes(b'already there')
+        with mock.patch.object(moves, '_renameat2', False):
+            (result,) = moves.move_files([(self.source, self.target)])
+        self.assertNotReplaced(result[2])
+
+    def test_copy_keeps_existing_target(self):
+        self.target.write_bytes(b'already there')
+        with self.assertRaises(FileExistsError) as raised:
+            moves.cross_device_move(self.source, self.target, len(b'moved'))
+        self.assertNotReplaced(raised.exception)
+
+    def test_copy_keeps_target_created_during_copy(self):
+        def copy_and_race(src_fd, dst_fd, size):
+            os.write(dst_fd, os.read(src_fd, size))
+            self.target.write_bytes(b'already there')
+
+        with mock.patch.object(moves, 'copy_file_data', copy_and_race), self.assertRaises(FileExistsError) as raised:
+            moves.cross_device_move(self.source, self.target, len(b'moved'))
+        self.assertNotReplaced(raised.exception)
+
+    def test_copy_retries_short_writes(self):
+        data = bytes(range(256)) * 4096
+        self.source.write_bytes(data)
+        write = os.write
+        unsupported = OSError(errno.ENOSYS, 'not supported')
+        with mock.patch.object(os, 'copy_file_range', side_effect=unsupported, create=True), \
+                mock.patch.object(os, 'sendfile', side_effect=unsupported, create=True), \
+                mock.patch.object(os, 'write', lambda fd, chunk: write(fd, chunk[:1000])):
+            moves.cross_device_move(self.source, self.target, len(data))
+        self.assertEqual(self.target.read_bytes(), data)
+        self.assertFalse(self.source.exists())
+
+
+
+def flac_file(*blocks):
+    """A FLAC stream header followed by (block_type, data) metadata blocks, the last one flagged."""
+    out = b'fLaC'
+    for number, (block_type, data) in enumerate(blocks):
+        last = 0x80 if number == len(blocks) - 1 else 0
+        out += bytes([block_type | last]) + len(data).to_bytes(3, 'big') + data
+    return out + b'\xff\xf8 audio frames'
+
+
+def vorbis_comments(*comments, count=None):
+    """A VORBIS_COMMENT block body."""
+    out = (3).to_bytes(4, 'little') + b'ref' + (len(comments) if count is None else count).to_bytes(4, 'little')
+    for comment in comments:
+        out += len(comment).to_bytes(4, 'little') + comment
+    return out
+
+
+def syncsafe(value):
+    return bytes([(value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F])
+
+
+def id3_frame(major, frame_id, data):
+    if major == 2:
+        return frame_id + len(data).to_bytes(3, 'big') + data
+    size = syncsafe(len(data)) if major == 4 else len(data).to_bytes(4, 'big')
+    return frame_id + size + b'\0\0' + data
+
+
+def id3_file(major, *frames, tag_size=None):
+    """An ID3v2 tag holding frames, then some audio."""
+    body = b''.join(frames)
+    return b'ID3' + bytes([major, 0, 0]) + syncsafe(len(body) if tag_size is None else tag_size) + body + b'\xff\xfb'
+
+
+def mp4_atom(atom_type, payload, size=None):
+    return (8 + len(payload) if size is None else size).to_bytes(4, 'big') + atom_type + payload
+
+
+def mp4_item(atom_type, value):
+    return mp4_atom(atom_type, mp4_atom(b'data', b'\0\0\0\x01\0\0\0\0' + value))
+
+
+def mp4_file(*items, moov_size=None):
+    """An M4A file with moov/udta/meta/ilst holding items, after a large mdat."""
+    ilst = mp4_atom(b'ilst', b''.join(items))
+    meta = mp4_atom(b'meta', b'\0\0\0\0' + mp4_atom(b'hdlr', b'\0' * 25) + ilst)
+    moov = mp4_atom(b'moov', mp4_atom(b'udta', meta), size=moov_size)
+    return mp4_atom(b'ftyp', b'M4A \0\0\0\0') + mp4_atom(b'mdat', b'\0' * 100000) + moov
+
+
+class TagReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.root = Path(temp.name)
+
+    def read(self, data: bytes, extension: str):
+        path = self.root / f'track{extension}'
+        path.write_bytes(data)
+        return tags.read_track_tags(str(path))
+
+    def test_flac(self):
+        comments = vorbis_comments(b'ALBUM=Third', b'albumartist=Portishead', b'ARTIST=Portishead',
+                                   b'DISCNUMBER=1', b'TRACKNUMBER=5/11')
+        data = flac_file((0, b'\0' * 34), (6, b'\0' * 200000), (4, comments))
+        self.assertEqual(self.read(data, '.flac'), {'album': 'Third', 'album_artist': 'Portishead',
+                                                   'artist': 'Portishead', 'disc': 1, 'track': 5})
+
+    def test_flac_truncated_comments(self):
+        # Claims 2**32 - 1 comments and more bytes than the file holds
+        comments = vorbis_comments(b'ALBUM=Third', count=0xFFFFFFFF)
+        data = flac_file((0, b'\0' * 34), (4, comments))
+        data = data[:data.index(comments)] + comments
+        header_at = data.index(comments) - 3
+        data = data[:header_at] + (len(comments) + 1000).to_bytes(3, 'big') + data[header_at + 3:]
+        self.assertEqual(self.read(data, '.flac'), {'album': 'Third'})
+
+    def test_flac_oversized_block(self):
+        data = b'fLaC' + bytes([0x84]) + (tags.TAG_BLOCK_LIMIT + 1).to_bytes(3, 'big') + b'ALBUM=Third'
+        self.assertIsNone(self.read(data, '.flac'))
+
+    def test_flac_without_comments(self):
+        self.assertIsNone(self.read(flac_file((0, b'\0' * 34)), '.flac'))
+        self.assertIsNone(self.read(b'fLaC\x00\x00\x00\x22', '.flac'))
+        self.assertIsNone(self.read(b'ID3 not flac', '.flac'))
+
+    def test_id3(self):
+        expected = {'album': 'Café', 'album_artist': 'Various Artists', 'artist': 'Foo', 'disc': 2, 'track': 3}
+        for major, frame_ids in ((2, tags.ID3V22_TAG_FRAMES), (3, tags.ID3_TAG_FRAMES), (4, tags.ID3_TAG_FRAMES)):
+            ids = {field: frame_id for frame_id, field in frame_ids.items()}
+            frames = [
+                id3_frame(major, ids['album'], b'\x01' + 'Café'.encode('utf-16')),
+                id3_frame(major, b'PIC' if major == 2 else b'APIC', b'\0' * (tags.TAG_FRAME_LIMIT + 1)),
+                id3_frame(major, ids['album_artist'], b'\x03Various Artists\0'),
+                id3_frame(major, ids['artist'], b'\x00Foo\0Bar'),
+                id3_frame(major, ids['disc'], b'\x002/2'),
+                id3_frame(major, ids['track'], b'\x003/12'),
+            ]
+            with self.subTest(major=major):
+                self.assertEqual(self.read(id3_file(major, *frames), '.mp3'), expected)
+
+    def test_id3_frame_past_tag_end(self):
+        frames = [id3_frame(3, b'TALB', b'\x00Third'), id3_frame(3, b'TPE1', b'\x00Portishead')]
+        # The second frame runs 5 bytes past the declared tag size
+        data = id3_file(3, *frames, tag_size=len(b''.join(frames)) - 5)
+        self.assertEqual(self.read(data, '.mp3'), {'album': 'Third'})
+
+    def test_id3_oversized_frame_size(self):
+        frame = b'TALB' + (0x7FFFFFFF).to_bytes(4, 'big') + b'\0\0\x00Third'
+        self.assertIsNone(self.read(id3_file(3, frame), '.mp3'))
+
+    def test_id3_truncated_file(self):
+        frames = [id3_frame(4, b'TALB', b'\x03Third'), id3_frame(4, b'TPE1', b'\x03Portishead')]
+        data = id3_file(4, *frames, tag_size=4096)
+        # Cut inside the second frame's header
+        data = data[:10 + len(frames[0]) + 6]
+        self.assertEqual(self.read(data, '.mp3'), {'album': 'Third'})
+
+    def test_mp4(self):
+        items = [mp4_item(b'\xa9alb', 'Café'.encode()), mp4_item(b'aART', b'Portishead'),
+                 mp4_item(b'\xa9ART', b'Portishead'), mp4_item(b'disk', b'\0\0\0\x01\0\x01'),
+                 mp4_item(b'trkn', b'\0\0\0\x05\0\x0b\0\0'), mp4_item(b'covr', b'\0' * 100000)]
+        self.assertEqual(self.read(mp4_file(*items), '.m4a'), {'album': 'Café', 'album_artist': 'Portishead',
+                                                              'artist': 'Portishead', 'disc': 1, 'track': 5})
+
+    def test_mp4_oversized_atoms(self):
+        # moov claims to run past the end of the file
+        data = mp4_file(mp4_item(b'\xa9alb', b'Third'), moov_size=10 ** 9)
+        self.assertIsNone(self.read(data, '.m4a'))
+        # An item claims more bytes than its ilst holds
+        bad_item = mp4_atom(b'\xa9ART', b'', size=10 ** 6)
+        self.assertEqual(self.read(mp4_file(mp4_item(b'\xa9alb', b'Third'), bad_item), '.m4a'), {'album': 'Third'})
+
+    def test_mp4_truncated(self):
+        data = mp4_file(mp4_item(b'\xa9alb', b'Third'), mp4_item(b'\xa9ART', b'Portishead'))
+        self.assertIsNone(self.read(data[:-10], '.m4a'))
+        self.assertIsNone(self.read(data[:8], '.m4a'))
+
+
+if __name__ == '__main__':
+    unittest.main()